@@ -1,40 +1,103 @@
+import contextvars
 import json
-from openai import OpenAI
+import time
+from concurrent.futures import ThreadPoolExecutor
 
-from config import OPENAI_API_KEY, LLM_MINI_MODEL
+from config import LLM_MINI_MODEL
 from models.data_models import (
     Receipt,
     ReceiptItem,
     CategoryAnalysis,
     SpendingAnalysis,
 )
+from utils.deadline import budgeted, timeout_kwargs
 from utils.logger import get_logger
+from utils.openai_client import ClientMixin
+from utils.chunking import AdaptiveChunker
+from utils.prompt_budget import categorization_max_tokens
 
 logger = get_logger(__name__)
 
 # Spending thresholds (% of total) — applied to whatever categories AI creates
 OVERSPEND_THRESHOLD_PCT = 30.0   # flag any category that eats >30% of the bill
+DEFAULT_CATEGORY = "General Items"
+MAX_PARALLEL_CHUNKS = 4          # concurrent categorization calls per receipt
 
 
-class AnalysisAgent:
-    def __init__(self, api_key: str = None):
-        self.client = OpenAI(api_key=api_key or OPENAI_API_KEY)
+def _total_spending(receipt: Receipt) -> float:
+    total = round(sum(i.total_price for i in receipt.items), 2)
+    return total if total != 0 else receipt.total
+
+
+class AnalysisAgent(ClientMixin):
+    def __init__(
+        self,
+        api_key: str = None,
+        client=None,
+        baseline=None,
+        categorizer=None,
+        canonicalizer=None,
+    ):
+        self._init_client(api_key, client)
         self.model = LLM_MINI_MODEL
+        # Optional storage.price_baseline.PriceBaseline for history-aware anomalies
+        self.baseline = baseline
+        # Optional agents.local_categorizer.LocalCategorizer consulted before the LLM
+        self.categorizer = categorizer
+        # Optional agents.category_canonicalizer.CategoryCanonicalizer for near-duplicate labels
+        self.canonicalizer = canonicalizer
+        self.chunker = AdaptiveChunker()
+        self._executor: ThreadPoolExecutor | None = None
 
     def analyze(self, receipt: Receipt) -> SpendingAnalysis:
         logger.info("📊 Starting AI-driven analysis for %d items", len(receipt.items))
 
         # Let the AI decide categories entirely
         self._ai_categorize(receipt.items)
+        return self.summarize(receipt, self.price_anomalies(receipt))
+
+    # The pipeline runs analysis as separate stages: categorization (model
+    # calls) alongside the item price-history lookup, then price anomalies
+    # (which fall back to category history) and summarize.
+
+    def categorize(self, items: list[ReceiptItem]) -> list[ReceiptItem]:
+        """Categorized copies of ``items``; the originals are left untouched."""
+        copies = [item.model_copy() for item in items]
+        self._ai_categorize(copies)
+        return copies
 
-        total_spending = round(sum(i.total_price for i in receipt.items), 2)
-        if total_spending == 0:
-            total_spending = receipt.total
+    def categorize_locally(self, items: list[ReceiptItem]) -> list[ReceiptItem]:
+        """Like categorize, without model calls: DEFAULT_CATEGORY where the local model is unsure."""
+        copies = [item.model_copy() for item in items]
+        pending = self._local_categorize(copies) if self.categorizer is not None else copies
+        for item in pending:
+            item.category = DEFAULT_CATEGORY
+        return copies
+
+    def item_price_history(self, items: list[ReceiptItem]) -> dict | None:
+        """Price statistics of the items themselves; needs no categories. None without a baseline."""
+        if self.baseline is None or not items:
+            return None
+        try:
+            return self.baseline.stats_for(items, kinds=("item",))
+        except Exception as e:
+            logger.warning("⚠️ Price history lookup failed (%s) — retrying with the anomalies", e)
+            return None
 
+    def price_anomalies(self, receipt: Receipt, item_stats: dict | None = None) -> list[str]:
+        """Unusually priced items; run after categorization, since items
+        without history of their own are compared against their category.
+        ``item_stats`` from item_price_history saves part of the lookup.
+        """
+        return self._price_anomalies(receipt.items, _total_spending(receipt), item_stats)
+
+    def summarize(self, receipt: Receipt, price_anomalies: list[str]) -> SpendingAnalysis:
+        """Breakdown, overspending and anomalies for a receipt whose items are categorized."""
+        total_spending = _total_spending(receipt)
         category_breakdown = self._build_breakdown(receipt.items, total_spending)
         top_category = category_breakdown[0].category if category_breakdown else None
         overspending = self._detect_overspending(category_breakdown)
-        anomalies = self._find_anomalies(receipt.items, total_spending)
+        anomalies = price_anomalies + self._category_anomalies(receipt.items)
 
         analysis = SpendingAnalysis(
             total_spending=total_spending,
@@ -49,6 +112,56 @@ class AnalysisAgent:
         )
         return analysis
 
+    def update_summary(
+        self,
+        previous: SpendingAnalysis,
+        receipt: Receipt,
+        removed: list[ReceiptItem],
+        added: list[ReceiptItem],
+        price_anomalies: list[str],
+    ) -> SpendingAnalysis:
+        """``previous`` with ``removed`` items taken out of their categories and ``added`` put in.
+
+        Gives what summarize would for the edited ``receipt``, touching only
+        the categories the edit changed; percentages follow the new total.
+        """
+        buckets = {c.category: c.model_copy(update={"items": list(c.items)}) for c in previous.category_breakdown}
+        for item in removed:
+            bucket = buckets.get(item.category)
+            if bucket is None:
+                continue
+            bucket.total_spent = round(bucket.total_spent - item.total_price, 2)
+            bucket.item_count -= 1
+            if item.name in bucket.items:
+                bucket.items.remove(item.name)
+            if bucket.item_count <= 0:
+                del buckets[item.category]
+        for item in added:
+            bucket = buckets.setdefault(
+                item.category, CategoryAnalysis(category=item.category, total_spent=0, percentage=0, item_count=0)
+            )
+            bucket.total_spent = round(bucket.total_spent + item.total_price, 2)
+            bucket.item_count += 1
+            bucket.items.append(item.name)
+
+        total_spending = _total_spending(receipt)
+        for bucket in buckets.values():
+            bucket.percentage = round((bucket.total_spent / total_spending * 100) if total_spending > 0 else 0, 1)
+        category_breakdown = sorted(buckets.values(), key=lambda x: x.total_spent, reverse=True)
+
+        return SpendingAnalysis(
+            total_spending=total_spending,
+            category_breakdown=category_breakdown,
+            top_category=category_breakdown[0].category if category_breakdown else None,
+            overspending_categories=self._detect_overspending(category_breakdown),
+            anomalies=price_anomalies + self._category_anomalies(receipt.items),
+        )
+
+    def learn(self, items: list[ReceiptItem]) -> None:
+        """Teach the local categorizer categories the user picked."""
+        for item in items:
+            self._learn(item)
+
     # ------------------------------------------------------------------
     # AI-driven free-form categorization
     # ------------------------------------------------------------------
@@ -57,10 +170,69 @@ class AnalysisAgent:
         """Ask the AI to invent its own category names for these specific items."""
         if not items:
             return
+        if self.categorizer is not None:
+            items = self._local_categorize(items)
+            if not items:
+                return
+
+        # Each distinct name is sent once, numbered; the model answers with
+        # {category: [numbers]} so output tokens don't repeat the item names.
+        names = list(dict.fromkeys(item.name for item in items))
+        logger.info("🤖 AI is deciding categories for %d items...", len(names))
+        mapping = self._categorize_chunks(names)
+
+        assigned = 0
+        for item in items:
+            category = mapping.get(item.name)
+            if category:
+                assigned += 1
+            else:
+                # Fallback: ask AI to categorize just this one item
+                category = mapping[item.name] = self._single_item_category(item.name)
+            item.category = self._canonical(category)
+            self._learn(item)
+
+        logger.info("✅ AI assigned categories to %d/%d items", assigned, len(items))
+
+    def _categorize_chunks(self, names: list[str]) -> dict[str, str]:
+        """Categorize in bounded chunks, concurrently, merged in input order.
+
+        Output length (and so latency) grows with the item count, so large
+        receipts are split and wall-clock time tracks the largest chunk.
+        """
+        chunks = self.chunker.split(names)
+        if len(chunks) == 1:
+            return self._timed_request(chunks[0])
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=MAX_PARALLEL_CHUNKS, thread_name_prefix="categorize"
+            )
+        logger.info("🧩 Categorizing %d names in %d chunks", len(names), len(chunks))
+        # Each worker runs in a copy of this context so its log lines keep the request id
+        futures = [
+            self._executor.submit(contextvars.copy_context().run, self._timed_request, chunk)
+            for chunk in chunks
+        ]
+        mapping: dict[str, str] = {}
+        for future in futures:
+            mapping.update(future.result())
+        return mapping
 
-        item_list = "\n".join(f"- {item.name}" for item in items)
+    def _timed_request(self, names: list[str]) -> dict[str, str]:
+        start = time.perf_counter()
+        try:
+            mapping = self._request_categories(names)
+        except Exception as e:
+            logger.warning("⚠️ AI categorization failed (%s) — using single-item fallback", e)
+            return {}
+        self.chunker.observe(len(names), time.perf_counter() - start)
+        return mapping
+
+    def _request_categories(self, names: list[str]) -> dict[str, str]:
+        """One batched model call; returns {item name: category} for the names it covered."""
+        item_list = "\n".join(f"{n}. {name}" for n, name in enumerate(names, 1))
 
-        prompt = f"""You are analyzing a grocery receipt. Look at the items below and group them into logical spending categories.
+        prompt = f"""You are analyzing a grocery receipt. Look at the numbered items below and group them into logical spending categories.
 
 Rules:
 1. You decide the category names yourself — do NOT use a predefined list.
@@ -72,46 +244,65 @@ Rules:
 Items on the receipt:
 {item_list}
 
-Return ONLY a JSON object mapping each item name to your chosen category:
-{{"Whole Milk 1 Gal": "Dairy & Eggs", "Tide Pods 31ct": "Laundry & Cleaning", "Banana Bunch": "Fresh Produce"}}"""
+Return ONLY a JSON object mapping each category to the numbers of its items:
+{{"Dairy & Eggs": [1, 4], "Laundry & Cleaning": [2], "Fresh Produce": [3]}}"""
 
-        try:
-            logger.info("🤖 AI is deciding categories for %d items...", len(items))
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[{"role": "user", "content": prompt}],
-                max_tokens=600,
-                response_format={"type": "json_object"},
-            )
-            mapping: dict = json.loads(response.choices[0].message.content)
-
-            # Normalize keys to handle minor whitespace differences
-            normalized = {k.strip().lower(): v for k, v in mapping.items()}
-
-            assigned = 0
-            for item in items:
-                category = (
-                    mapping.get(item.name)
-                    or normalized.get(item.name.strip().lower())
-                )
-                if category and isinstance(category, str) and category.strip():
-                    item.category = category.strip()
-                    assigned += 1
-                else:
-                    # Fallback: ask AI to categorize just this one item
-                    item.category = self._single_item_category(item.name)
-
-            logger.info("✅ AI assigned categories to %d/%d items", assigned, len(items))
+        response = budgeted(self.client).chat.completions.create(
+            model=self.model,
+            messages=[{"role": "user", "content": prompt}],
+            max_tokens=categorization_max_tokens(len(names)),
+            response_format={"type": "json_object"},
+            **timeout_kwargs(),
+        )
+        data: dict = json.loads(response.choices[0].message.content)
 
-        except Exception as e:
-            logger.warning("⚠️ AI categorization failed (%s) — using single-item fallback", e)
-            for item in items:
-                item.category = self._single_item_category(item.name)
+        by_name = {name.strip().lower(): name for name in names}
+        mapping: dict[str, str] = {}
+        for key, value in data.items():
+            if isinstance(value, list) and isinstance(key, str) and key.strip():
+                for number in value:
+                    try:
+                        index = int(number) - 1
+                    except (TypeError, ValueError):
+                        continue
+                    if 0 <= index < len(names):
+                        mapping[names[index]] = key.strip()
+            elif isinstance(value, str) and value.strip():
+                # Tolerate the older {item name: category} shape
+                name = by_name.get(key.strip().lower())
+                if name:
+                    mapping[name] = value.strip()
+        return mapping
+
+    def _local_categorize(self, items: list[ReceiptItem]) -> list[ReceiptItem]:
+        """Assign confident local predictions; return the items still needing the LLM."""
+        pending = []
+        for item in items:
+            category, confidence = self.categorizer.predict(item.name)
+            if category:
+                item.category = category
+                item.confidence = min(item.confidence, confidence)
+            else:
+                pending.append(item)
+        logger.info(
+            "🧠 Local categorizer resolved %d/%d items", len(items) - len(pending), len(items)
+        )
+        return pending
+
+    def _canonical(self, label: str) -> str:
+        label = label.strip()
+        if self.canonicalizer is None or label == DEFAULT_CATEGORY:
+            return label
+        return self.canonicalizer.canonicalize(label)
+
+    def _learn(self, item: ReceiptItem) -> None:
+        if self.categorizer is not None and item.category not in (DEFAULT_CATEGORY, "Uncategorized"):
+            self.categorizer.learn(item.name, item.category)
 
     def _single_item_category(self, item_name: str) -> str:
         """Fallback: ask AI to categorize a single item when batch call fails."""
         try:
-            response = self.client.chat.completions.create(
+            response = budgeted(self.client).chat.completions.create(
                 model=self.model,
                 messages=[{
                     "role": "user",
@@ -121,11 +312,12 @@ Return ONLY a JSON object mapping each item name to your chosen category:
                     ),
                 }],
                 max_tokens=20,
+                **timeout_kwargs(),
             )
             cat = response.choices[0].message.content.strip().strip('"').strip("'")
-            return cat if cat else "General Items"
+            return cat if cat else DEFAULT_CATEGORY
         except Exception:
-            return "General Items"
+            return DEFAULT_CATEGORY
 
     # ------------------------------------------------------------------
     # Breakdown & analysis
@@ -159,18 +351,47 @@ Return ONLY a JSON object mapping each item name to your chosen category:
         ]
 
     def _find_anomalies(self, items: list[ReceiptItem], total: float) -> list[str]:
+        return self._price_anomalies(items, total) + self._category_anomalies(items)
+
+    def _price_anomalies(self, items: list[ReceiptItem], total: float, item_stats: dict | None = None) -> list[str]:
         if not items:
             return []
+        anomalies, covered = [], set()
+        if self.baseline is not None:
+            try:
+                anomalies, covered = self.baseline.find_anomalies(items, item_stats)
+            except Exception as e:
+                logger.warning("⚠️ Price baseline lookup failed (%s) — using per-receipt rule", e)
+
+        # Items without enough history fall back to the per-receipt mean rule
         avg = total / len(items)
-        anomalies = [
+        anomalies += [
             f"{item.name} is unusually expensive (${item.total_price:.2f})"
             for item in items
-            if item.total_price > avg * 2
+            if item.name not in covered and item.total_price > avg * 2
         ]
-        if len(set(i.category for i in items)) == 1 and len(items) > 3:
-            anomalies.append(f"All items fall under one category: {items[0].category}")
         return anomalies
 
-    # kept for /api/categorize-item endpoint
+    def _category_anomalies(self, items: list[ReceiptItem]) -> list[str]:
+        if len(set(i.category for i in items)) == 1 and len(items) > 3:
+            return [f"All items fall under one category: {items[0].category}"]
+        return []
+
+    # ------------------------------------------------------------------
+    # Bare item names (/api/categorize-item)
+    # ------------------------------------------------------------------
+
+    def categorize_names(self, names: list[str]) -> dict[str, str]:
+        """Categorize names: local/cached answers first, misses in one batched model call."""
+        items = [ReceiptItem(name=name, unit_price=0, total_price=0) for name in dict.fromkeys(names)]
+        self._ai_categorize(items)
+        return {item.name: item.category for item in items}
+
+    def cached_category(self, name: str) -> str | None:
+        """Category for ``name`` if the local categorizer already knows it confidently."""
+        if self.categorizer is None:
+            return None
+        return self.categorizer.predict(name)[0]
+
     def _categorize(self, item_name: str) -> str:
-        return self._single_item_category(item_name)
+        return self.categorize_names([item_name])[item_name]
@@ -0,0 +1,142 @@
+import re
+import threading
+from collections import OrderedDict
+
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Words that pad a label without changing what it groups
+GENERIC_TOKENS = {
+    "and", "the", "of", "misc", "miscellaneous", "other", "others",
+    "product", "products", "item", "items", "goods", "supplies", "essentials",
+    "fresh", "assorted", "general",
+}
+# Labels listing alternatives: "Dairy & Eggs", "Beer, Wine and Spirits"
+CONJUNCTION_RE = re.compile(r"\s*(?:&|\+|/|,|\band\b)\s*", re.IGNORECASE)
+MIN_JACCARD = 0.6            # more than half of the words shared
+MAX_CANONICAL = 500          # distinct categories the index will track
+MAX_SYNONYMS = 10_000        # raw label -> canonical cache (LRU)
+
+
+def _stem(token: str) -> str:
+    if len(token) > 4 and token.endswith("ies"):
+        return token[:-3] + "y"
+    if len(token) > 4 and token.endswith(("ches", "shes", "sses", "oes")):
+        return token[:-2]
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+
+def label_tokens(label: str) -> frozenset[str]:
+    """Normalized token set: lowercase, '&'/'and' dropped, plurals folded."""
+    words = re.findall(r"[a-z]+", label.lower())
+    return frozenset(_stem(w) for w in words if w not in GENERIC_TOKENS)
+
+
+def label_parts(label: str) -> frozenset[frozenset[str]]:
+    """Token sets of the alternatives a label lists ("Dairy & Eggs" -> {dairy}, {egg})."""
+    parts = (label_tokens(part) for part in CONJUNCTION_RE.split(label))
+    return frozenset(part for part in parts if part)
+
+
+class CategoryCanonicalizer:
+    """Maps free-form AI category labels onto a small set of canonical labels.
+
+    "Dairy", "Dairy Products" and "Dairy & Eggs" share a token set or one
+    names an alternative the other lists, so they collapse to whichever was
+    seen first. A single word contained in a longer label is otherwise kept
+    apart: "Pet Food" and "Frozen Foods" are narrower than "Food", not
+    synonyms of it.
+    Candidates come from an inverted token index, so each lookup only scores
+    canonicals that share a word with the new label.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._canonical: dict[str, frozenset[str]] = {}
+        self._parts: dict[str, frozenset[frozenset[str]]] = {}
+        self._by_token: dict[str, set[str]] = {}
+        self._synonyms: OrderedDict[str, str] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._canonical)
+
+    def canonicalize(self, label: str) -> str:
+        label = label.strip()
+        if not label:
+            return label
+        with self._lock:
+            cached = self._synonyms.get(label)
+            if cached is not None:
+                self._synonyms.move_to_end(label)
+                return cached
+
+            tokens = label_tokens(label)
+            parts = label_parts(label)
+            canonical = self._best_match(tokens, parts) if tokens else None
+            if canonical is None:
+                canonical = label
+                if len(self._canonical) < MAX_CANONICAL and tokens:
+                    self._canonical[label] = tokens
+                    self._parts[label] = parts
+                    for token in tokens:
+                        self._by_token.setdefault(token, set()).add(label)
+
+            self._synonyms[label] = canonical
+            if len(self._synonyms) > MAX_SYNONYMS:
+                self._synonyms.popitem(last=False)
+        if canonical != label:
+            logger.info("🏷️ Category '%s' → '%s'", label, canonical)
+        return canonical
+
+    def seed(self, labels) -> None:
+        """Register known labels in priority order (most established first)."""
+        for label in labels:
+            self.canonicalize(label)
+
+    def _best_match(self, tokens: frozenset[str], parts: frozenset[frozenset[str]]) -> str | None:
+        candidates = set()
+        for token in tokens:
+            candidates |= self._by_token.get(token, set())
+
+        best, best_score = None, 0.0
+        for candidate in candidates:
+            other = self._canonical[candidate]
+            if tokens == other:
+                return candidate
+            overlap = len(tokens & other)
+            # Containment counts when the smaller label is more than one word
+            # ("Snacks & Candy" in "Candy, Snacks & Sweets") or is one of the
+            # alternatives the larger lists ("Dairy" in "Dairy & Eggs"); a lone
+            # word inside a longer name ("Food" in "Pet Food") has to overlap
+            # like any other label.
+            if (tokens <= other or other <= tokens) and (
+                min(len(tokens), len(other)) >= 2 or tokens in self._parts[candidate] or other in parts
+            ):
+                score = 0.99 * overlap / min(len(tokens), len(other))
+            else:
+                score = overlap / len(tokens | other)
+                if score < MIN_JACCARD:
+                    continue
+            if score > best_score or (score == best_score and candidate < best):
+                best, best_score = candidate, score
+        return best
+
+    @classmethod
+    def from_store(cls, store) -> "CategoryCanonicalizer":
+        """Seed canonicals from stored history, most frequently used first."""
+        canonicalizer = cls()
+        try:
+            canonicalizer.seed(
+                row["category"]
+                for row in store.query(
+                    "SELECT category FROM categories GROUP BY category "
+                    "ORDER BY SUM(item_count) DESC, category"
+                )
+            )
+            logger.info("🏷️ Category index seeded with %d canonical labels", len(canonicalizer))
+        except Exception as e:
+            logger.warning("⚠️ Could not seed category index (%s)", e)
+        return canonicalizer
@@ -1,17 +1,18 @@
 import json
 
-from openai import OpenAI
-
-from config import OPENAI_API_KEY, LLM_MINI_MODEL
+from config import LLM_MINI_MODEL
 from models.data_models import Receipt, SpendingAnalysis, LLMInsight
+from utils.deadline import budgeted, timeout_kwargs
 from utils.logger import get_logger
+from utils.openai_client import ClientMixin
+from utils.prompt_budget import fit_breakdown_lines
 
 logger = get_logger(__name__)
 
 
-class LLMAgent:
-    def __init__(self, api_key: str = None):
-        self.client = OpenAI(api_key=api_key or OPENAI_API_KEY)
+class LLMAgent(ClientMixin):
+    def __init__(self, api_key: str = None, client=None):
+        self._init_client(api_key, client)
         self.model = LLM_MINI_MODEL
 
     def generate_insights(
@@ -21,7 +22,7 @@ class LLMAgent:
         logger.info("🤖 Generating LLM financial insights")
         try:
             prompt = self._build_prompt(spending_analysis, receipt, user_context)
-            response = self.client.chat.completions.create(
+            response = budgeted(self.client).chat.completions.create(
                 model=self.model,
                 messages=[
                     {
@@ -36,6 +37,7 @@ class LLMAgent:
                 ],
                 max_tokens=600,
                 response_format={"type": "json_object"},
+                **timeout_kwargs(),
             )
             raw = response.choices[0].message.content
             data = json.loads(raw)
@@ -52,21 +54,23 @@ class LLMAgent:
             return self._fallback_insights(spending_analysis)
 
     def _build_prompt(self, analysis: SpendingAnalysis, receipt: Receipt = None, user_context: str = None) -> str:
-        # Full item list with category and price
+        # Items are listed once, under their category, priciest first; long
+        # tails of small items are folded so large receipts stay within budget.
         if receipt and receipt.items:
-            items_lines = "\n".join(
-                f"  - {item.name} [{item.category}]: ${item.total_price:.2f}"
-                for item in receipt.items
-            )
             store_line = f"Store: {receipt.store_name or 'Unknown'} | Date: {receipt.date or 'Unknown'}"
+            by_category: dict[str, list] = {}
+            for item in receipt.items:
+                by_category.setdefault(item.category, []).append(item)
+            breakdown_lines = "\n".join(fit_breakdown_lines([
+                (f"{c.category}: ${c.total_spent:.2f} ({c.percentage:.1f}%)", by_category.get(c.category, []))
+                for c in analysis.category_breakdown
+            ]))
         else:
-            items_lines = "  (item details not available)"
             store_line = ""
-
-        breakdown_lines = "\n".join(
-            f"  - {c.category}: ${c.total_spent:.2f} ({c.percentage:.1f}%) — {', '.join(c.items)}"
-            for c in analysis.category_breakdown
-        )
+            breakdown_lines = "\n".join(
+                f"  - {c.category}: ${c.total_spent:.2f} ({c.percentage:.1f}%) — {', '.join(c.items)}"
+                for c in analysis.category_breakdown
+            )
         overspend_text = (
             "\n".join(f"  - {o}" for o in analysis.overspending_categories)
             if analysis.overspending_categories
@@ -84,10 +88,7 @@ class LLMAgent:
 {store_line}
 Total spent: ${analysis.total_spending:.2f}
 
-Every item purchased:
-{items_lines}
-
-Spending by category:
+Spending by category (items with prices):
 {breakdown_lines}
 
 Overspending alerts:
@@ -137,4 +138,5 @@ Return a JSON object with exactly these keys:
             recommendations=recommendations,
             budget_tips=budget_tips,
             savings_potential=savings,
+            source="fallback",
         )
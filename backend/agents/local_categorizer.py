@@ -0,0 +1,130 @@
+import math
+import re
+import threading
+import zlib
+from collections import Counter
+from typing import Optional
+
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+NGRAM = 3
+HASH_BUCKETS = 1 << 20
+TOP_K = 5
+MIN_SIMILARITY = 0.55        # nearest neighbour must look like the same product
+MIN_VOTE_SHARE = 0.6         # and the neighbours must mostly agree
+MAX_EXAMPLES = 50_000        # bounds memory; known names can still be relabeled past it
+MAX_POSTINGS = 2_000         # ignore n-grams so common they carry no signal
+
+
+def _normalize(name: str) -> str:
+    name = re.sub(r"\d+(?:\.\d+)?\s*(?:oz|lb|lbs|ct|pk|pack|gal|gallon|l|ml|g|kg)\b", " ", name.lower())
+    return re.sub(r"[^a-z&]+", " ", name).strip()
+
+
+def _features(name: str) -> dict[int, float]:
+    """Hashed character n-grams plus whole words, L2-normalized."""
+    text = _normalize(name)
+    counts: Counter = Counter()
+    for word in text.split():
+        counts[zlib.crc32(word.encode()) % HASH_BUCKETS] += 1.0
+        padded = f" {word} "
+        for i in range(len(padded) - NGRAM + 1):
+            counts[zlib.crc32(padded[i:i + NGRAM].encode()) % HASH_BUCKETS] += 1.0
+    norm = math.sqrt(sum(v * v for v in counts.values())) or 1.0
+    return {k: v / norm for k, v in counts.items()}
+
+
+class LocalCategorizer:
+    """Nearest-neighbour item categorizer learned from labels the LLM assigned.
+
+    Exact (normalized) names resolve from a dict; everything else goes through
+    an inverted index over hashed n-gram features and a weighted k-NN vote.
+    Predictions below the confidence bar return ``None`` so the caller can
+    escalate to the model.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._exact: dict[str, str] = {}
+        self._positions: dict[str, int] = {}
+        self._labels: list[str] = []
+        self._vectors: list[dict[int, float]] = []
+        self._postings: dict[int, list[int]] = {}
+
+    def __len__(self) -> int:
+        return len(self._exact)
+
+    def learn(self, name: str, category: str) -> None:
+        """Add (or relabel) one example. O(features) — safe to call per item."""
+        key = _normalize(name)
+        if not key or not category:
+            return
+        with self._lock:
+            if key in self._positions:
+                self._exact[key] = category
+                self._labels[self._positions[key]] = category
+                return
+            if len(self._labels) >= MAX_EXAMPLES:
+                return
+            self._exact[key] = category
+            idx = len(self._labels)
+            self._positions[key] = idx
+            vector = _features(name)
+            self._labels.append(category)
+            self._vectors.append(vector)
+            for feature in vector:
+                self._postings.setdefault(feature, []).append(idx)
+
+    def learn_many(self, pairs) -> None:
+        for name, category in pairs:
+            self.learn(name, category)
+
+    def predict(self, name: str) -> tuple[Optional[str], float]:
+        """Return ``(category, confidence)``; category is None when not confident."""
+        key = _normalize(name)
+        with self._lock:
+            exact = self._exact.get(key)
+            if exact is not None:
+                return exact, 1.0
+            if not self._labels:
+                return None, 0.0
+            query = _features(name)
+            scores: dict[int, float] = {}
+            for feature, weight in query.items():
+                postings = self._postings.get(feature)
+                if not postings or len(postings) > MAX_POSTINGS:
+                    continue
+                for idx in postings:
+                    scores[idx] = scores.get(idx, 0.0) + weight * self._vectors[idx][feature]
+            neighbours = sorted(scores.items(), key=lambda kv: kv[1], reverse=True)[:TOP_K]
+            votes: dict[str, float] = {}
+            for idx, sim in neighbours:
+                votes[self._labels[idx]] = votes.get(self._labels[idx], 0.0) + sim
+
+        if not neighbours:
+            return None, 0.0
+        best_category, best_votes = max(votes.items(), key=lambda kv: kv[1])
+        share = best_votes / sum(votes.values())
+        confidence = round(share * neighbours[0][1], 3)
+        if neighbours[0][1] < MIN_SIMILARITY or share < MIN_VOTE_SHARE:
+            return None, confidence
+        return best_category, confidence
+
+    def predict_many(self, names: list[str]) -> dict[str, tuple[Optional[str], float]]:
+        return {name: self.predict(name) for name in names}
+
+    @classmethod
+    def from_store(cls, store) -> "LocalCategorizer":
+        """Warm the index from every item category already stored in history."""
+        categorizer = cls()
+        try:
+            categorizer.learn_many(
+                (row["name"], row["category"])
+                for row in store.query("SELECT name, category FROM items ORDER BY id")
+            )
+            logger.info("🧠 Local categorizer warmed with %d labeled names", len(categorizer))
+        except Exception as e:
+            logger.warning("⚠️ Could not warm local categorizer (%s)", e)
+        return categorizer
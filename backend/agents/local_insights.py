@@ -0,0 +1,216 @@
+import threading
+from typing import Callable, Optional
+
+from agents.analysis_agent import OVERSPEND_THRESHOLD_PCT
+from config import INSIGHTS_LLM_MIN_ITEMS, INSIGHTS_LLM_MIN_TOTAL, INSIGHTS_MODE
+from models.data_models import LLMInsight, Receipt, ReceiptItem, SpendingAnalysis
+from storage.price_baseline import PRICE_ANOMALY_RE
+from utils.admission import track_model_call
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+INSIGHT_MODES = ("auto", "local", "llm")
+TRIPS_PER_MONTH = 4          # assumed when there is no history to measure monthly spend
+IN_LINE_PCT = 10.0           # basket within ±10% of the store average counts as usual
+
+GENERIC_RECOMMENDATIONS = [
+    "Compare prices across stores before your next shopping trip.",
+    "Plan meals in advance to avoid impulse purchases.",
+]
+GENERIC_TIPS = [
+    "Make a shopping list and stick to it to avoid unplanned spending.",
+    "Look for store-brand alternatives to save 15–30% on common items.",
+]
+
+
+class LocalInsightEngine:
+    """Templated, data-driven insights without a model call.
+
+    Works from the receipt's own ``SpendingAnalysis`` plus, when an
+    aggregator is available, the user's history: the usual basket at this
+    store, category shares over time and average monthly spend.
+    """
+
+    def __init__(self, aggregator=None):
+        self.aggregator = aggregator
+
+    def generate(self, analysis: SpendingAnalysis, receipt: Receipt = None) -> LLMInsight:
+        history = self._history(receipt)
+        items = receipt.items if receipt else []
+        by_category: dict[str, list[ReceiptItem]] = {}
+        for item in sorted(items, key=lambda i: i.total_price, reverse=True):
+            by_category.setdefault(item.category, []).append(item)
+
+        return LLMInsight(
+            summary=self._summary(analysis, receipt, by_category, history),
+            recommendations=self._recommendations(analysis, items, by_category, history),
+            budget_tips=self._budget_tips(analysis, history),
+            savings_potential=self._savings(analysis, history),
+            source="local",
+        )
+
+    def _history(self, receipt: Optional[Receipt]) -> dict:
+        if self.aggregator is None:
+            return {}
+        try:
+            history = {"shares": {
+                s.category.lower(): s.percentage for s in self.aggregator.category_shares("month")
+            }}
+            months = self.aggregator.trends("month", window=1)
+            if months:
+                history["monthly"] = sum(m.total_spent for m in months) / len(months)
+            if receipt and receipt.store_name:
+                for store in self.aggregator.store_comparison("month"):
+                    if (store.store_name or "").lower() == receipt.store_name.lower():
+                        history["store_avg"] = store.average_receipt
+                        history["store_visits"] = store.receipt_count
+            return history
+        except Exception as e:
+            logger.warning("⚠️ History unavailable for local insights (%s)", e)
+            return {}
+
+    def _summary(self, analysis, receipt, by_category, history) -> str:
+        total = analysis.total_spending
+        count = len(receipt.items) if receipt else 0
+        at_store = f" at {receipt.store_name}" if receipt and receipt.store_name else ""
+        sentences = [f"You spent ${total:.2f} on {count} item{'s' if count != 1 else ''}{at_store}."]
+
+        if analysis.category_breakdown:
+            top = analysis.category_breakdown[0]
+            lead = by_category.get(top.category)
+            led_by = f", led by {lead[0].name} (${lead[0].total_price:.2f})" if lead else ""
+            sentences.append(
+                f"{top.category} made up {top.percentage:.0f}% of the bill (${top.total_spent:.2f}){led_by}."
+            )
+
+        avg = history.get("store_avg")
+        if avg and history.get("store_visits", 0) >= 2:
+            diff = (total - avg) / avg * 100
+            if abs(diff) < IN_LINE_PCT:
+                sentences.append(f"That is in line with your usual ${avg:.2f} basket here.")
+            else:
+                direction = "above" if diff > 0 else "below"
+                sentences.append(f"That is {abs(diff):.0f}% {direction} your usual ${avg:.2f} basket here.")
+        return " ".join(sentences)
+
+    def _recommendations(self, analysis, items, by_category, history) -> list[str]:
+        recs = [
+            f"{a} — check whether a store brand or another store is cheaper."
+            for a in analysis.anomalies if PRICE_ANOMALY_RE.search(a)
+        ]
+
+        for category in analysis.category_breakdown:
+            if category.percentage <= OVERSPEND_THRESHOLD_PCT:
+                continue
+            names = [i.name for i in by_category.get(category.category, [])[:2]]
+            examples = f" — items like {' and '.join(names)} are where cuts count most" if names else ""
+            usual = history.get("shares", {}).get(category.category.lower())
+            versus = f" versus {usual:.0f}% of your usual spending" if usual is not None else ""
+            recs.append(f"{category.category} took {category.percentage:.0f}% of this receipt{versus}{examples}.")
+
+        if items:
+            priciest = max(items, key=lambda i: i.total_price)
+            recs.append(
+                f"{priciest.name} was the priciest item at ${priciest.total_price:.2f}; "
+                "look for it on sale or in a larger size."
+            )
+            multiples = [i for i in items if i.quantity > 1]
+            if multiples:
+                item = max(multiples, key=lambda i: i.total_price)
+                recs.append(
+                    f"You bought {item.quantity:g}× {item.name}; a multi-pack or bulk size "
+                    "could lower the unit price."
+                )
+
+        for generic in GENERIC_RECOMMENDATIONS:
+            if len(recs) >= 3:
+                break
+            recs.append(generic)
+        return recs[:3]
+
+    def _budget_tips(self, analysis, history) -> list[str]:
+        tips = []
+        monthly = history.get("monthly")
+        if monthly:
+            tips.append(
+                f"Your receipts average ${monthly:.0f}/month; a ${monthly * 0.9:.0f} monthly cap "
+                f"would save roughly ${monthly * 0.1:.0f}."
+            )
+        shares = history.get("shares", {})
+        rising = [
+            (c.percentage - shares[c.category.lower()], c.category)
+            for c in analysis.category_breakdown
+            if c.category.lower() in shares and c.percentage - shares[c.category.lower()] >= 15
+        ]
+        if rising:
+            jump, category = max(rising)
+            tips.append(f"{category} ran {jump:.0f} points above its usual share — plan it into the next list.")
+        return (tips + GENERIC_TIPS)[:2]
+
+    def _savings(self, analysis, history) -> str:
+        monthly = history.get("monthly") or analysis.total_spending * TRIPS_PER_MONTH
+        return f"${monthly * 0.08:.0f}–${monthly * 0.15:.0f}/month"
+
+
+class InsightRouter:
+    """Answers with the local engine and escalates to the LLM only when it pays off.
+
+    In ``auto`` mode the LLM is called for large receipts (many items or a
+    high total) and for receipts with a price jump against history; in
+    ``local`` mode never, in ``llm`` mode always. Counters are per process.
+    """
+
+    def __init__(self, engine: LocalInsightEngine, llm_agent: Callable):
+        self.engine = engine
+        self._llm_agent = llm_agent        # factory, so the LLM agent is built on first escalation
+        self.local_answers = 0
+        self.llm_calls = 0
+        self._lock = threading.Lock()
+
+    def escalation_reason(
+        self, analysis: SpendingAnalysis, receipt: Optional[Receipt], mode: str
+    ) -> Optional[str]:
+        if mode not in INSIGHT_MODES:
+            raise ValueError(f"insights mode must be one of {INSIGHT_MODES}, got '{mode}'")
+        if mode == "llm":
+            return "requested"
+        if mode == "local":
+            return None
+        if receipt and len(receipt.items) >= INSIGHTS_LLM_MIN_ITEMS:
+            return "many items"
+        if analysis.total_spending >= INSIGHTS_LLM_MIN_TOTAL:
+            return "large total"
+        if any(PRICE_ANOMALY_RE.search(a) for a in analysis.anomalies):
+            return "price anomaly"
+        return None
+
+    def generate(
+        self, analysis: SpendingAnalysis, receipt: Receipt = None, mode: str = None
+    ) -> LLMInsight:
+        reason = self.escalation_reason(analysis, receipt, mode or INSIGHTS_MODE)
+        if reason is None:
+            with self._lock:
+                self.local_answers += 1
+            logger.info("💡 Local insights (LLM call avoided)")
+            return self.engine.generate(analysis, receipt)
+
+        with self._lock:
+            self.llm_calls += 1
+        logger.info("🤖 Escalating insights to the LLM (%s)", reason)
+        with track_model_call():
+            insight = self._llm_agent().generate_insights(analysis, receipt=receipt)
+        if insight.source == "fallback":
+            # The model call failed; the local engine beats the generic fallback
+            return self.engine.generate(analysis, receipt)
+        return insight
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.local_answers + self.llm_calls
+            return {
+                "local_answers": self.local_answers,
+                "llm_calls": self.llm_calls,
+                "llm_calls_avoided": self.local_answers,
+                "avoided_pct": round(self.local_answers / total * 100, 1) if total else 0.0,
+            }
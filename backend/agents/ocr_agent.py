@@ -1,22 +1,23 @@
 import json
-from openai import OpenAI
 
-from config import OPENAI_API_KEY, OCR_MODEL
+from config import OCR_MODEL
+from utils.deadline import budgeted, timeout_kwargs
 from utils.logger import get_logger
+from utils.openai_client import ClientMixin
 
 logger = get_logger(__name__)
 
 
-class OCRAgent:
-    def __init__(self, api_key: str = None):
-        self.client = OpenAI(api_key=api_key or OPENAI_API_KEY)
+class OCRAgent(ClientMixin):
+    def __init__(self, api_key: str = None, client=None):
+        self._init_client(api_key, client)
         self.model = OCR_MODEL
 
     def extract_text(self, image_base64: str) -> dict:
         """Extract raw text from receipt image using GPT-4 Vision."""
         logger.info("🔍 Extracting text via GPT-4 Vision")
         try:
-            response = self.client.chat.completions.create(
+            response = budgeted(self.client).chat.completions.create(
                 model=self.model,
                 messages=[
                     {
@@ -40,6 +41,7 @@ class OCRAgent:
                     }
                 ],
                 max_tokens=2000,
+                **timeout_kwargs(),
             )
             extracted_text = response.choices[0].message.content
             logger.info("✅ Raw text extraction complete (%d chars)", len(extracted_text))
@@ -81,7 +83,7 @@ Rules:
 - Include all items, even if price seems unusual
 - Return ONLY the JSON, no extra text"""
 
-            response = self.client.chat.completions.create(
+            response = budgeted(self.client).chat.completions.create(
                 model=self.model,
                 messages=[
                     {
@@ -100,6 +102,7 @@ Rules:
                 ],
                 max_tokens=3000,
                 response_format={"type": "json_object"},
+                **timeout_kwargs(),
             )
             raw = response.choices[0].message.content
             structured = json.loads(raw)
@@ -1,6 +1,7 @@
 import re
 from typing import Optional
 
+from agents.store_templates import TemplateText
 from models.data_models import Receipt, ReceiptItem
 from utils.logger import get_logger
 
@@ -20,14 +21,69 @@ STORE_SKIP = re.compile(
     r"(?:receipt|invoice|total|subtotal|tax|item|qty|price|amount|date|time|thank|www\.|\.com)",
     re.IGNORECASE,
 )
+MISREAD_CONFIDENCE = 0.5
 
 
 class ParserAgent:
+    def __init__(self, templates=None):
+        # Optional agents.store_templates.StoreTemplates: per-store layouts learned
+        # from structured results, used to read raw text from known stores
+        self.templates = templates
+
     def parse(self, data: dict | str) -> Receipt:
-        """Parse OCR output (structured dict or raw text) into a Receipt object."""
+        """Parse OCR output (structured dict or raw text) into a Receipt object.
+
+        Text a store template already read (``TemplateText``) is not parsed again.
+        """
+        if isinstance(data, dict):
+            receipt = self._parse_structured(data)
+            if self.templates is not None:
+                self.templates.learn(receipt)
+        else:
+            receipt = self._parse_text(data)
+        if self.templates is not None:
+            self.templates.observe(receipt.store_name)
+        return receipt
+
+    def parse_page(self, data: dict | str) -> dict:
+        """Parse one page of a multi-page document into unvalidated Receipt fields.
+
+        Unlike ``parse`` nothing is derived yet (a page's subtotal is not its
+        own item sum), so ``merge_pages`` can tell printed totals from gaps.
+        """
         if isinstance(data, dict):
-            return self._parse_structured(data)
-        return self._parse_text(data)
+            try:
+                return self._structured_fields(data)
+            except Exception as e:
+                logger.error("❌ Structured page parsing failed: %s", e)
+                return {"items": [], "raw_ocr_text": str(data)}
+        return self._text_fields(data)
+
+    def merge_pages(self, pages: list[dict]) -> Receipt:
+        """Combine per-page fields of one document into a single Receipt.
+
+        Items are concatenated in page order. Store and date come from the
+        first page that has them; subtotal, tax and total from the last page
+        that prints them, since invoices put totals at the end.
+        """
+        items = [item for page in pages for item in page.get("items", [])]
+
+        def first(field: str):
+            return next((p[field] for p in pages if p.get(field)), None)
+
+        def last(field: str) -> float:
+            return next((p[field] for p in reversed(pages) if p.get(field)), 0.0)
+
+        logger.info("📑 Merged %d pages into %d items", len(pages), len(items))
+        return Receipt(
+            items=items,
+            subtotal=last("subtotal"),
+            tax=last("tax"),
+            total=last("total"),
+            store_name=first("store_name"),
+            date=first("date"),
+            raw_ocr_text="\n\f\n".join(p["raw_ocr_text"] for p in pages if p.get("raw_ocr_text")),
+        )
 
     # ------------------------------------------------------------------
     # Structured JSON path (from GPT-4 Vision direct extraction)
@@ -36,71 +92,79 @@ class ParserAgent:
     def _parse_structured(self, data: dict) -> Receipt:
         logger.info("📋 Parsing structured OCR data")
         try:
-            items = []
-            for raw_item in data.get("items", []):
-                name = raw_item.get("name", "Unknown Item").strip()
-                qty = float(raw_item.get("quantity", 1) or 1)
-                unit_price = float(raw_item.get("unit_price", 0) or 0)
-                total_price = float(raw_item.get("total_price", 0) or 0)
-
-                if total_price == 0 and unit_price > 0:
-                    total_price = round(qty * unit_price, 2)
-                if unit_price == 0 and total_price > 0:
-                    unit_price = round(total_price / qty, 2)
-
-                if unit_price > 0:
-                    items.append(
-                        ReceiptItem(
-                            name=name,
-                            quantity=qty,
-                            unit_price=unit_price,
-                            total_price=total_price,
-                            confidence=0.95,
-                        )
-                    )
-
-            receipt = Receipt(
-                items=items,
-                subtotal=float(data.get("subtotal", 0) or 0),
-                tax=float(data.get("tax", 0) or 0),
-                total=float(data.get("total", 0) or 0),
-                store_name=data.get("store_name") or None,
-                date=data.get("date") or None,
-                raw_ocr_text=data.get("raw_text", ""),
-            )
-            logger.info("✅ Parsed %d items from structured data", len(items))
+            receipt = Receipt(**self._structured_fields(data))
+            logger.info("✅ Parsed %d items from structured data", len(receipt.items))
             return receipt
         except Exception as e:
             logger.error("❌ Structured parsing failed: %s", e)
             return Receipt(raw_ocr_text=str(data))
 
+    def _structured_fields(self, data: dict) -> dict:
+        items = []
+        for raw_item in data.get("items", []):
+            name = raw_item.get("name", "Unknown Item").strip()
+            qty = float(raw_item.get("quantity", 1) or 1)
+            unit_price = float(raw_item.get("unit_price", 0) or 0)
+            total_price = float(raw_item.get("total_price", 0) or 0)
+
+            # A printed amount that isn't qty × unit price means one of them was misread
+            confidence = 0.95
+            if total_price > 0 and unit_price > 0 and abs(qty * unit_price - total_price) > 0.05:
+                confidence = MISREAD_CONFIDENCE
+            if total_price == 0 and unit_price > 0:
+                total_price = round(qty * unit_price, 2)
+            if unit_price == 0 and total_price > 0:
+                unit_price = round(total_price / qty, 2)
+
+            if unit_price > 0:
+                items.append(
+                    ReceiptItem(
+                        name=name,
+                        quantity=qty,
+                        unit_price=unit_price,
+                        total_price=total_price,
+                        confidence=confidence,
+                    )
+                )
+
+        return {
+            "items": items,
+            "subtotal": float(data.get("subtotal", 0) or 0),
+            "tax": float(data.get("tax", 0) or 0),
+            "total": float(data.get("total", 0) or 0),
+            "store_name": data.get("store_name") or None,
+            "date": data.get("date") or None,
+            "raw_ocr_text": data.get("raw_text", ""),
+        }
+
     # ------------------------------------------------------------------
     # Raw text regex fallback path
     # ------------------------------------------------------------------
 
     def _parse_text(self, text: str) -> Receipt:
         logger.info("📋 Parsing raw OCR text (%d chars)", len(text))
-        lines = [l.strip() for l in text.splitlines() if l.strip()]
-
-        store_name = self._extract_store_name(lines)
-        date = self._extract_date(text)
-        subtotal = self._extract_value(SUBTOTAL_RE, text)
-        tax = self._extract_value(TAX_RE, text)
-        total = self._extract_value(TOTAL_RE, text)
-        items = self._extract_items(lines)
-
-        receipt = Receipt(
-            items=items,
-            subtotal=subtotal,
-            tax=tax,
-            total=total,
-            store_name=store_name,
-            date=date,
-            raw_ocr_text=text,
-        )
-        logger.info("✅ Parsed %d items from raw text", len(items))
+        receipt = Receipt(**self._text_fields(text))
+        logger.info("✅ Parsed %d items from raw text", len(receipt.items))
         return receipt
 
+    def _text_fields(self, text: str) -> dict:
+        if isinstance(text, TemplateText):
+            fields = text.fields
+        else:
+            fields = self.templates.parse(text) if self.templates is not None else None
+        if fields is not None:
+            return {**fields, "date": self._extract_date(text)}
+        lines = [l.strip() for l in text.splitlines() if l.strip()]
+        return {
+            "items": self._extract_items(lines),
+            "subtotal": self._extract_value(SUBTOTAL_RE, text),
+            "tax": self._extract_value(TAX_RE, text),
+            "total": self._extract_value(TOTAL_RE, text),
+            "store_name": self._extract_store_name(lines),
+            "date": self._extract_date(text),
+            "raw_ocr_text": text,
+        }
+
     def _extract_store_name(self, lines: list[str]) -> Optional[str]:
         for line in lines[:5]:
             if len(line) > 3 and not STORE_SKIP.search(line) and not PRICE_RE.search(line):
@@ -0,0 +1,163 @@
+"""Turn a user's edits to a stored receipt into the parts of its analysis to redo.
+
+Edits arrive either as item changes (``ItemEdit``, applied by ``apply_edits``)
+or as the whole edited receipt (``edited_receipt``). Both give the edited
+receipt plus the positions of its items that need categorizing (renamed or
+added without a category) and of those whose category the user picked.
+``item_changes`` then finds the items that left or joined the receipt, which
+is all the breakdown update needs, and ``material_change`` decides whether
+the new analysis differs enough to be worth new insights.
+"""
+from collections import Counter
+from typing import Optional
+
+from agents.analysis_agent import DEFAULT_CATEGORY, OVERSPEND_THRESHOLD_PCT
+from models.data_models import ItemEdit, Receipt, ReceiptItem, SpendingAnalysis
+
+UNSET_CATEGORIES = ("", "Uncategorized", DEFAULT_CATEGORY)
+USER_CONFIDENCE = 1.0           # a value the user typed needs no second look
+MATERIAL_TOTAL_PCT = 5.0        # the total moved by at least this share...
+MATERIAL_SHARE_PTS = 5.0        # ...or a category's share by this many points
+
+
+def _edited(old: ReceiptItem, edit: ItemEdit) -> ReceiptItem:
+    quantity = edit.quantity if edit.quantity is not None else old.quantity
+    unit_price, total_price = edit.unit_price, edit.total_price
+    if unit_price is None:
+        # A new line total with the old quantity means a new unit price
+        unit_price = round(total_price / quantity, 2) if total_price is not None and quantity else old.unit_price
+    if total_price is None:
+        total_price = round(quantity * unit_price, 2)
+    return ReceiptItem(
+        name=edit.name.strip() if edit.name is not None else old.name,
+        quantity=quantity,
+        unit_price=unit_price,
+        total_price=total_price,
+        category=edit.category.strip() if edit.category is not None else old.category,
+        confidence=USER_CONFIDENCE,
+    )
+
+
+def apply_edits(stored: Receipt, edits: list[ItemEdit]) -> tuple[Receipt, list[int], list[int]]:
+    """The edited receipt, the positions to categorize and those with a user-picked category.
+
+    Items keep their stored order; added items go last. Raises ValueError for
+    an edit that does not fit the stored receipt.
+    """
+    items: list[Optional[ReceiptItem]] = list(stored.items)
+    recategorize, picked, seen = set(), set(), set()
+    blank = ReceiptItem(name="", unit_price=0, total_price=0)
+    for edit in edits:
+        if edit.index is None:
+            if edit.remove:
+                raise ValueError("Removing an item needs its index")
+            if not (edit.name or "").strip() or (edit.unit_price is None and edit.total_price is None):
+                raise ValueError("A new item needs a name and a price")
+            edit = edit.model_copy(update={"quantity": edit.quantity or 1.0})
+            old, index = blank.model_copy(update={"category": DEFAULT_CATEGORY}), len(items)
+            items.append(None)
+        else:
+            index = edit.index
+            if not 0 <= index < len(stored.items):
+                raise ValueError(f"No item at index {index}")
+            if index in seen:
+                raise ValueError(f"Item {index} is edited more than once")
+            old = stored.items[index]
+        seen.add(index)
+        if edit.remove:
+            items[index] = None
+            continue
+        item = items[index] = _edited(old, edit)
+        if not item.name:
+            raise ValueError(f"Item {index} needs a name")
+        if edit.category is not None and item.category not in UNSET_CATEGORIES:
+            picked.add(index)
+        elif item.name != old.name:
+            recategorize.add(index)
+
+    # Positions shift once removed items are dropped
+    kept = [i for i, item in enumerate(items) if item is not None]
+    position = {old: new for new, old in enumerate(kept)}
+    receipt = stored.model_copy(update={"items": [items[i] for i in kept]})
+    return (
+        receipt,
+        sorted(position[i] for i in recategorize if i in position),
+        sorted(position[i] for i in picked if i in position),
+    )
+
+
+def edited_receipt(stored: Receipt, edited: Receipt) -> tuple[Receipt, list[int], list[int]]:
+    """Like apply_edits, for a whole edited receipt sent back by the client.
+
+    An item named as on the stored receipt keeps its category unless the
+    user changed it. A new name is categorized unless it comes with a
+    category of its own; one equal to that of the stored item at the same
+    position was carried over by renaming the line, and does not count.
+    """
+    stored_categories = {item.name: item.category for item in stored.items}
+    items = [item.model_copy() for item in edited.items]
+    recategorize, picked = [], []
+    for index, item in enumerate(items):
+        item.name = item.name.strip()
+        if item.name in stored_categories:
+            if item.category != stored_categories[item.name] and item.category not in UNSET_CATEGORIES:
+                picked.append(index)
+            continue
+        carried = index < len(stored.items) and item.category == stored.items[index].category
+        if carried or item.category in UNSET_CATEGORIES:
+            recategorize.append(index)
+        else:
+            picked.append(index)
+    return edited.model_copy(update={"items": items}), recategorize, picked
+
+
+def _key(item: ReceiptItem) -> tuple:
+    return item.name, item.quantity, item.unit_price, item.total_price, item.category
+
+
+def item_changes(old: list[ReceiptItem], new: list[ReceiptItem]) -> tuple[list[ReceiptItem], list[ReceiptItem]]:
+    """(removed, added): items of ``old`` no longer on the receipt, and items of ``new`` not on it before.
+
+    An edited item shows up in both, as its old and its new version.
+    """
+    remaining = Counter(_key(item) for item in new)
+    removed = []
+    for item in old:
+        if remaining[_key(item)] > 0:
+            remaining[_key(item)] -= 1
+        else:
+            removed.append(item)
+    remaining = Counter(_key(item) for item in old)
+    added = []
+    for item in new:
+        if remaining[_key(item)] > 0:
+            remaining[_key(item)] -= 1
+        else:
+            added.append(item)
+    return removed, added
+
+
+def _overspending(analysis: SpendingAnalysis) -> set[str]:
+    return {c.category for c in analysis.category_breakdown if c.percentage > OVERSPEND_THRESHOLD_PCT}
+
+
+def material_change(previous: SpendingAnalysis, current: SpendingAnalysis) -> Optional[str]:
+    """Why ``current`` is worth new insights, or None when the old ones still fit."""
+    if previous.total_spending > 0:
+        moved = abs(current.total_spending - previous.total_spending) / previous.total_spending * 100
+        if moved >= MATERIAL_TOTAL_PCT:
+            return f"total moved {moved:.1f}%"
+    elif current.total_spending > 0:
+        return "total moved from zero"
+    if current.top_category != previous.top_category:
+        return "top category changed"
+    if _overspending(current) != _overspending(previous):
+        return "overspending categories changed"
+    before = {c.category: c.percentage for c in previous.category_breakdown}
+    after = {c.category: c.percentage for c in current.category_breakdown}
+    for category in before.keys() | after.keys():
+        if abs(after.get(category, 0.0) - before.get(category, 0.0)) >= MATERIAL_SHARE_PTS:
+            return f"{category} share moved"
+    if set(current.anomalies) - set(previous.anomalies):
+        return "new anomalies"
+    return None
@@ -0,0 +1,216 @@
+import contextvars
+import json
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Optional
+
+from agents.store_templates import SUBTOTAL_RE, TAX_RE, TOTAL_RE, name_words
+from config import OCR_MODEL
+from models.data_models import Receipt, ReceiptItem
+from utils.admission import track_model_call
+from utils.deadline import budgeted, timeout_kwargs
+from utils.logger import get_logger
+from utils.openai_client import ClientMixin
+from utils.profiling import traced
+
+logger = get_logger(__name__)
+
+TOLERANCE = 0.02             # $ a reconciled receipt may be off by (rounding)
+LOW_CONFIDENCE = 0.6         # items below this are always re-read when totals disagree
+MAX_PARALLEL_ROWS = 6
+# Digits a receipt printer's font and a blurry photo make look alike
+LOOK_ALIKE = {frozenset(p) for p in ("08", "06", "09", "17", "38", "56", "58", "68", "89", "49", "27", "14")}
+SUMMARY_PATTERNS = {"subtotal": SUBTOTAL_RE, "tax": TAX_RE, "total": TOTAL_RE}
+
+
+@dataclass
+class SuspectRow:
+    kind: str                # "item", "subtotal", "tax" or "total"
+    line: int                # index among the non-empty lines of the raw OCR text
+    index: int = -1          # position in receipt.items, for items
+    reason: str = ""
+
+
+def raw_lines(receipt: Receipt) -> list[str]:
+    return [l.strip() for l in (receipt.raw_ocr_text or "").splitlines() if l.strip()]
+
+
+def discrepancy(receipt: Receipt) -> float:
+    """Dollars by which items, subtotal, tax and total fail to add up."""
+    item_sum = sum(i.total_price for i in receipt.items)
+    off = abs(item_sum - receipt.subtotal) if receipt.subtotal > 0 else 0.0
+    if receipt.total > 0:
+        off += abs(receipt.subtotal + receipt.tax - receipt.total)
+    return round(off, 2)
+
+
+def _one_digit_apart(a: float, b: float) -> bool:
+    """Whether printed amounts a and b differ by one look-alike, dropped or extra digit."""
+    if b <= 0:
+        return False
+    x, y = f"{a:.2f}", f"{b:.2f}"
+    if len(x) == len(y):
+        diffs = [frozenset((c, d)) for c, d in zip(x, y) if c != d]
+        return len(diffs) == 1 and diffs[0] in LOOK_ALIKE
+    short, long = sorted((x, y), key=len)
+    return len(long) - len(short) == 1 and any(long[:i] + long[i + 1:] == short for i in range(len(long)))
+
+
+def find_suspects(receipt: Receipt) -> list[SuspectRow]:
+    """Rows whose re-reading could make the receipt add up, located in the raw text.
+
+    If the items add up to total minus tax, the subtotal line was misread.
+    If they match neither, the suspects are items with a low confidence and
+    items whose amount is one look-alike digit away from closing the gap. If the items
+    match the subtotal but subtotal plus tax is not the total, the tax and
+    total lines are re-read.
+    """
+    lines = raw_lines(receipt)
+    if not receipt.items or not lines:
+        return []
+    item_sum = round(sum(i.total_price for i in receipt.items), 2)
+    items_off = receipt.subtotal > 0 and abs(item_sum - receipt.subtotal) > TOLERANCE
+    summary_off = receipt.total > 0 and abs(receipt.subtotal + receipt.tax - receipt.total) > TOLERANCE
+
+    suspects: list[SuspectRow] = []
+    if items_off and receipt.total > 0 and abs(item_sum + receipt.tax - receipt.total) <= TOLERANCE:
+        suspects.append(SuspectRow("subtotal", -1, reason="items match total minus tax"))
+    elif items_off:
+        gap = receipt.subtotal - item_sum
+        used: set[int] = set()
+        for index, item in enumerate(receipt.items):
+            line = _item_line(item, lines, used)
+            if line is not None:
+                used.add(line)
+            if item.confidence < LOW_CONFIDENCE:
+                reason = "qty × unit price disagrees with the printed amount"
+            elif _one_digit_apart(item.total_price, item.total_price + gap):
+                reason = f"one look-alike digit from closing a {gap:+.2f} gap"
+            else:
+                continue
+            suspects.append(SuspectRow("item", -1 if line is None else line, index, reason))
+    elif summary_off:
+        suspects += [SuspectRow(kind, -1, reason="subtotal + tax ≠ total") for kind in ("tax", "total")]
+
+    for suspect in suspects:
+        if suspect.kind in SUMMARY_PATTERNS:
+            suspect.line = _summary_line(suspect.kind, lines)
+    return [s for s in suspects if s.line >= 0]
+
+
+def _item_line(item: ReceiptItem, lines: list[str], used: set[int]) -> Optional[int]:
+    words = name_words(item.name)
+    best, best_score = None, 0
+    for i, line in enumerate(lines):
+        if i in used:
+            continue
+        score = len(words & name_words(line)) + (2 if f"{item.total_price:.2f}" in line else 0)
+        if score > best_score:
+            best, best_score = i, score
+    return best
+
+
+def _summary_line(kind: str, lines: list[str]) -> int:
+    pattern = SUMMARY_PATTERNS[kind]
+    # The last match: savings and item-count lines that mention "total" come first
+    matches = [i for i, line in enumerate(lines) if pattern.search(line)]
+    return matches[-1] if matches else -1
+
+
+def patch_receipt(receipt: Receipt, suspects: list[SuspectRow], readings: list[Optional[dict]]) -> Receipt:
+    """The receipt with re-read rows patched in, if that makes it add up better; else unchanged."""
+    patched = receipt.model_copy(deep=True)
+    changed = 0
+    for suspect, reading in zip(suspects, readings):
+        if not reading:
+            continue
+        try:
+            if suspect.kind == "item":
+                item = patched.items[suspect.index]
+                quantity = float(reading.get("quantity") or item.quantity)
+                total = float(reading.get("total_price") or 0)
+                unit = float(reading.get("unit_price") or 0) or round(total / quantity, 2)
+                patched.items[suspect.index] = ReceiptItem(
+                    name=(reading.get("name") or item.name).strip(),
+                    quantity=quantity,
+                    unit_price=unit,
+                    total_price=total or round(quantity * unit, 2),
+                    category=item.category,
+                )
+            else:
+                setattr(patched, suspect.kind, float(reading["amount"]))
+            changed += 1
+        except (KeyError, TypeError, ValueError) as e:
+            logger.warning("Ignoring unreadable re-read of %s row: %s", suspect.kind, e)
+
+    before, after = discrepancy(receipt), discrepancy(patched)
+    if not changed or after >= before:
+        logger.info("🩹 Row re-reads did not reconcile the receipt (off by $%.2f)", before)
+        return receipt
+    logger.info("🩹 Patched %d rows; receipt off by $%.2f → $%.2f", changed, before, after)
+    return patched
+
+
+class RowRepairAgent(ClientMixin):
+    """Re-reads single receipt lines from cropped strips of the image, concurrently."""
+
+    def __init__(self, api_key: str = None, client=None):
+        self._init_client(api_key, client)
+        self.model = OCR_MODEL
+        self._executor: ThreadPoolExecutor | None = None
+
+    def reread(self, receipt: Receipt, suspects: list[SuspectRow], crops: list[Optional[str]]) -> list[Optional[dict]]:
+        """One reading per suspect row (None where its crop or call failed), in order."""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=MAX_PARALLEL_ROWS, thread_name_prefix="reread")
+        logger.info("🔎 Re-reading %d suspicious rows", len(suspects))
+        # Each worker runs in a copy of this context: request id and deadline go with it
+        futures = [
+            self._executor.submit(contextvars.copy_context().run, traced("reread", self._reread_row), receipt, suspect, crop)
+            for suspect, crop in zip(suspects, crops)
+        ]
+        return [future.result() for future in futures]
+
+    def _reread_row(self, receipt: Receipt, suspect: SuspectRow, crop: Optional[str]) -> Optional[dict]:
+        if crop is None:
+            return None
+        if suspect.kind == "item":
+            item = receipt.items[suspect.index]
+            target = (
+                f"the line item that was read as '{item.name}' "
+                f"({item.quantity:g} × {item.unit_price:.2f} = {item.total_price:.2f})"
+            )
+            shape = '{"name": "...", "quantity": 1, "unit_price": 0.00, "total_price": 0.00}'
+        else:
+            target = f"the {suspect.kind} line"
+            shape = '{"amount": 0.00}'
+        try:
+            with track_model_call():
+                response = budgeted(self.client).chat.completions.create(
+                    model=self.model,
+                    messages=[
+                        {
+                            "role": "user",
+                            "content": [
+                                {
+                                    "type": "image_url",
+                                    "image_url": {"url": f"data:image/jpeg;base64,{crop}", "detail": "high"},
+                                },
+                                {
+                                    "type": "text",
+                                    "text": (
+                                        f"This strip of a receipt photo contains {target}. Read that line "
+                                        f"again carefully, digit by digit. Return ONLY JSON: {shape}"
+                                    ),
+                                },
+                            ],
+                        }
+                    ],
+                    max_tokens=100,
+                    response_format={"type": "json_object"},
+                    **timeout_kwargs(),
+                )
+            return json.loads(response.choices[0].message.content)
+        except Exception as e:
+            logger.warning("⚠️ Re-reading %s row failed: %s", suspect.kind, e)
+            return None
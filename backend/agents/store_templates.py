@@ -0,0 +1,356 @@
+import re
+import statistics
+import threading
+from typing import Optional
+
+from models.data_models import Receipt, ReceiptItem
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Item line shapes, most specific first. A store's template keeps the ones its
+# receipts were seen to use; each yields name and total, some qty and unit.
+_PRICE = r"\$?\s*(?P<total>\d{1,4}\.\d{2})\s*[A-Z]{0,2}$"
+_NAME = r"(?P<name>.*?[A-Za-z].*?)"
+LINE_SHAPES = {
+    "qty_at_unit": re.compile(rf"^{_NAME}\s+(?P<qty>\d{{1,3}})\s*[@xX]\s*\$?\s*(?P<unit>\d+\.\d{{2}})\s+{_PRICE}"),
+    "qty_column": re.compile(rf"^{_NAME}\s+(?P<qty>\d{{1,3}})\s+{_PRICE}"),
+    "leading_qty": re.compile(rf"^(?P<qty>\d{{1,3}})\s+{_NAME}\s+{_PRICE}"),
+    "code_column": re.compile(rf"^{_NAME}\s+\d{{6,14}}\s+{_PRICE}"),
+    "name_price": re.compile(rf"^{_NAME}\s+{_PRICE}"),
+}
+PRICED_RE = re.compile(r"\d\.\d{2}\b")
+LEADING_WORD_RE = re.compile(r"[A-Za-z]+")
+SUMMARY_WORDS = {"subtotal", "total", "tax"}
+SUBTOTAL_RE = re.compile(r"\bsub\s*total\b[^\n\d]*(\d+\.\d{2})", re.IGNORECASE)
+TOTAL_RE = re.compile(r"(?<!sub )\btotal\b[^\n\d]*(\d+\.\d{2})", re.IGNORECASE)
+TAX_RE = re.compile(r"\b(?:tax|gst|vat)\b[^\n]*?(\d+\.\d{2})(?![\d%])", re.IGNORECASE)
+
+HEADER_LINES = 6            # the store is named within the first lines of a receipt
+MIN_OBSERVATIONS = 2        # validated receipts before a template is used
+COLUMN_SLACK = 3            # characters a price may sit from the learned column
+MAX_COLUMNS = 200           # price end columns kept per store
+SUM_TOLERANCE = 0.02
+MIN_HIT_RATE = 0.5          # below this expected hit rate, skip the text-first OCR attempt...
+PROBE_EVERY = 10            # ...except one request in this many, to notice recovery
+HIT_ALPHA = 0.1
+MIX_ALPHA = 0.05            # weight of the latest upload in each store's share of uploads
+MIN_SHARE = 0.001           # shares below this are forgotten
+
+
+def _key(text: str) -> str:
+    return re.sub(r"[^a-z0-9]+", "", text.lower())
+
+
+def name_words(text: str) -> set[str]:
+    """Lowercase words of three or more letters, for matching an item name to a text line."""
+    return {w for w in re.findall(r"[a-z]{3,}", text.lower())}
+
+
+def _amount(pattern: re.Pattern, text: str) -> float:
+    m = pattern.search(text)
+    return float(m.group(1)) if m else 0.0
+
+
+def _sums_match(items: list[ReceiptItem], subtotal: float, tax: float, total: float) -> bool:
+    if not items:
+        return False
+    item_sum = sum(i.total_price for i in items)
+    if subtotal > 0:
+        return abs(item_sum - subtotal) <= SUM_TOLERANCE
+    if total > 0:
+        return abs(item_sum + tax - total) <= SUM_TOLERANCE
+    return False
+
+
+class TemplateText(str):
+    """Raw OCR text a store template has already read; ``fields`` is what StoreTemplates.parse returned."""
+
+    fields: dict
+
+    def __new__(cls, text: str, fields: dict):
+        read = super().__new__(cls, text)
+        read.fields = fields
+        return read
+
+
+class StoreTemplate:
+    """The receipt layout of one store: item line shapes, price column and lines to skip."""
+
+    def __init__(self, store: str, header: str):
+        self.store = store
+        self.header = header                  # _key of the line naming the store
+        self.shapes: list[str] = []           # names from LINE_SHAPES, in LINE_SHAPES order
+        self.skip: set[str] = set()           # leading words of priced lines that are not items
+        self.columns: list[int] = []          # end column of the price on item lines
+        self.observations = 0
+        self.hit_rate = 1.0                   # recent share of this store's text the template read
+
+    @property
+    def price_column(self) -> Optional[int]:
+        """The column prices end at, when the store right-aligns them consistently."""
+        if len(self.columns) < 2 or max(self.columns) - min(self.columns) > COLUMN_SLACK:
+            return None
+        return round(statistics.median(self.columns))
+
+    def parse_items(self, lines: list[str]) -> list[tuple[ReceiptItem, int]]:
+        """(item, price end column) for every line this layout reads as an item."""
+        items = []
+        column = self.price_column
+        skip = self.skip | SUMMARY_WORDS
+        for line in lines:
+            word = LEADING_WORD_RE.match(line)
+            if word and word.group(0).lower() in skip:
+                continue
+            for shape in self.shapes:
+                m = LINE_SHAPES[shape].match(line)
+                if m is None:
+                    continue
+                if column is not None and abs(m.end("total") - column) > COLUMN_SLACK:
+                    break
+                items.append((_item(m), m.end("total")))
+                break
+        return items
+
+    def to_dict(self) -> dict:
+        return {
+            "store": self.store,
+            "shapes": self.shapes,
+            "skip": sorted(self.skip),
+            "price_column": self.price_column,
+            "observations": self.observations,
+            "hit_rate": round(self.hit_rate, 3),
+        }
+
+
+def _item(m: re.Match) -> ReceiptItem:
+    groups = m.groupdict()
+    qty = float(groups.get("qty") or 1) or 1.0
+    total = float(groups["total"])
+    unit = float(groups["unit"]) if groups.get("unit") else round(total / qty, 2)
+    name = re.sub(r"\s+", " ", groups["name"]).strip(" .:-$")
+    return ReceiptItem(name=name, quantity=qty, unit_price=unit, total_price=total)
+
+
+class StoreTemplates:
+    """Per-store receipt layouts learned from validated vision results.
+
+    ``learn`` takes a receipt the vision model structured and keeps it only if
+    it checks out: items add up to the printed subtotal and every item can be
+    found on a line of the raw text. From those lines it learns which line
+    shapes the store prints, where the price column sits and which priced
+    lines (totals, tenders) to skip. ``parse`` reads raw text from a known
+    store with its template and returns Receipt fields only if the items again
+    add up, so a layout change falls back to the vision path.
+
+    Whether text-first OCR is worth it depends on the store, which is only
+    known once the receipt is read. So each template tracks its own hit
+    rate, ``observe`` tracks which stores recent uploads came from, and
+    text-first is tried while the next upload is likely to hit: uploads from
+    stores without a template count as misses.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._by_header: dict[str, StoreTemplate] = {}
+        self._by_store: dict[str, StoreTemplate] = {}
+        self._mix: dict[str, float] = {}      # _key(store) -> recent share of uploads
+        self.hits = 0
+        self.misses = 0
+        self._attempts = 0
+
+    def __len__(self) -> int:
+        return sum(1 for t in self._by_header.values() if t.observations >= MIN_OBSERVATIONS)
+
+    # ------------------------------------------------------------------
+    # Learning
+    # ------------------------------------------------------------------
+
+    def learn(self, receipt: Receipt) -> bool:
+        """Fold one vision-structured receipt into its store's template; False if it doesn't validate."""
+        text = receipt.raw_ocr_text or ""
+        if not receipt.store_name or not receipt.items or not text:
+            return False
+        if not _sums_match(receipt.items, receipt.subtotal, receipt.tax, receipt.total):
+            return False
+        lines = [l.strip() for l in text.splitlines() if l.strip()]
+        header = self._find_header(receipt.store_name, lines)
+        if header is None:
+            return False
+
+        candidate = StoreTemplate(receipt.store_name, header)
+        unused = set(range(len(lines)))
+        for item in receipt.items:
+            found = self._align(item, lines, unused)
+            if found is None:
+                return False
+            index, shape, column = found
+            unused.discard(index)
+            if shape not in candidate.shapes:
+                candidate.shapes.append(shape)
+            candidate.columns.append(column)
+        candidate.shapes.sort(key=list(LINE_SHAPES).index)
+        for index in unused:
+            word = LEADING_WORD_RE.match(lines[index])
+            if word and PRICED_RE.search(lines[index]):
+                candidate.skip.add(word.group(0).lower())
+
+        # The template must read this very receipt back before it is kept
+        parsed = [item for item, _ in candidate.parse_items(lines)]
+        if len(parsed) != len(receipt.items) or not _sums_match(
+            parsed, receipt.subtotal, receipt.tax, receipt.total
+        ):
+            return False
+
+        with self._lock:
+            template = self._by_header.setdefault(header, StoreTemplate(receipt.store_name, header))
+            self._by_store.setdefault(_key(receipt.store_name), template)
+            template.shapes = sorted(set(template.shapes) | set(candidate.shapes), key=list(LINE_SHAPES).index)
+            template.skip |= candidate.skip
+            template.columns = (template.columns + candidate.columns)[-MAX_COLUMNS:]
+            template.observations += 1
+            if template.observations == MIN_OBSERVATIONS:
+                logger.info("🧾 Learned receipt layout for %s", receipt.store_name)
+        return True
+
+    def _find_header(self, store: str, lines: list[str]) -> Optional[str]:
+        store_key = _key(store)
+        for line in lines[:HEADER_LINES]:
+            line_key = _key(line)
+            if line_key and len(line_key) >= 3 and (store_key in line_key or line_key in store_key):
+                return line_key
+        return None
+
+    def _align(self, item: ReceiptItem, lines: list[str], unused: set[int]):
+        """(line index, shape, price column) of the raw line that printed ``item``."""
+        price = f"{item.total_price:.2f}"
+        words = name_words(item.name)
+        for index in sorted(unused):
+            line = lines[index]
+            if price not in line or not (words & name_words(line)):
+                continue
+            for shape, pattern in LINE_SHAPES.items():
+                m = pattern.match(line)
+                if m is None:
+                    continue
+                parsed = _item(m)
+                if abs(parsed.total_price - item.total_price) < 0.005 and parsed.quantity == item.quantity:
+                    return index, shape, m.end("total")
+        return None
+
+    # ------------------------------------------------------------------
+    # Parsing
+    # ------------------------------------------------------------------
+
+    def template_for(self, text: str) -> Optional[StoreTemplate]:
+        lines = [l.strip() for l in text.splitlines() if l.strip()]
+        for line in lines[:HEADER_LINES]:
+            template = self._by_header.get(_key(line))
+            if template is not None and template.observations >= MIN_OBSERVATIONS:
+                return template
+        return None
+
+    def parse(self, text: str) -> Optional[dict]:
+        """Receipt fields for raw text from a known store, or None if its template doesn't fit."""
+        template = self.template_for(text)
+        if template is None:
+            return None
+        lines = [l.strip() for l in text.splitlines() if l.strip()]
+        with self._lock:
+            items = [item for item, _ in template.parse_items(lines)]
+        subtotal, tax, total = _amount(SUBTOTAL_RE, text), _amount(TAX_RE, text), _amount(TOTAL_RE, text)
+        if not _sums_match(items, subtotal, tax, total):
+            logger.info("🧾 %s template did not validate, using the generic parser", template.store)
+            return None
+        return {
+            "items": items,
+            "subtotal": subtotal,
+            "tax": tax,
+            "total": total,
+            "store_name": template.store,
+            "raw_ocr_text": text,
+        }
+
+    # ------------------------------------------------------------------
+    # Text-first OCR policy
+    # ------------------------------------------------------------------
+
+    def observe(self, store_name: Optional[str]) -> None:
+        """Count one upload from ``store_name`` (None: unknown) towards the store mix."""
+        key = _key(store_name or "")
+        with self._lock:
+            for other in list(self._mix):
+                self._mix[other] *= 1 - MIX_ALPHA
+                if self._mix[other] < MIN_SHARE:
+                    del self._mix[other]
+            self._mix[key] = self._mix.get(key, 0.0) + MIX_ALPHA
+
+    @property
+    def hit_rate(self) -> float:
+        """Expected chance that the next upload's text is read by its store's template."""
+        with self._lock:
+            total = sum(self._mix.values())
+            if not total:
+                return 0.0
+            expected = 0.0
+            for key, share in self._mix.items():
+                template = self._by_store.get(key)
+                if template is not None and template.observations >= MIN_OBSERVATIONS:
+                    expected += share * template.hit_rate
+            return expected / total
+
+    def worth_trying(self) -> bool:
+        """Whether to OCR as plain text first, hoping a template parses it.
+
+        A miss costs a second (structured) vision call, so text-first is used
+        while the next upload likely hits, with the odd probe when not.
+        """
+        if not len(self):
+            return False
+        worth = self.hit_rate >= MIN_HIT_RATE
+        with self._lock:
+            self._attempts += 1
+            return worth or self._attempts % PROBE_EVERY == 0
+
+    def record(self, text: str, hit: bool) -> None:
+        """Count a text-first attempt on ``text`` against its store's template."""
+        template = self.template_for(text)
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+            if template is not None:
+                template.hit_rate = HIT_ALPHA * hit + (1 - HIT_ALPHA) * template.hit_rate
+
+    def stats(self) -> dict:
+        hit_rate = self.hit_rate
+        with self._lock:
+            return {
+                "stores": len(self),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(hit_rate, 3),
+                "templates": [t.to_dict() for t in self._by_header.values()],
+            }
+
+    @classmethod
+    def from_store(cls, store, limit: int = 2000) -> "StoreTemplates":
+        """Relearn layouts from the most recent receipts in history."""
+        from models.data_models import AnalysisResult
+
+        templates = cls()
+        try:
+            rows = store.query(
+                "SELECT payload FROM receipts WHERE store_name IS NOT NULL "
+                "ORDER BY processed_at DESC LIMIT ?", (limit,)
+            )
+            # Oldest first, so the store mix weighs recent uploads most
+            for row in reversed(rows):
+                receipt = AnalysisResult.model_validate_json(row["payload"]).receipt
+                templates.learn(receipt)
+                templates.observe(receipt.store_name)
+            logger.info("🧾 Store templates warmed: %d stores", len(templates))
+        except Exception as e:
+            logger.warning("⚠️ Could not warm store templates (%s)", e)
+        return templates
@@ -1,26 +1,61 @@
+import asyncio
+import hmac
 import sys
 import os
 import time
+import uuid
+from typing import List, Optional
 
 # Ensure backend root is on the path when run as a Vercel serverless function
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from fastapi import FastAPI, HTTPException, Request
+from fastapi import BackgroundTasks, FastAPI, HTTPException, Path, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-
-from config import ALLOWED_ORIGINS
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+
+from config import (
+    ADMISSION_MAX_IN_FLIGHT,
+    ADMISSION_MAX_QUEUE,
+    ADMISSION_QUEUE_TIMEOUT_S,
+    ALLOWED_ORIGINS,
+    ANALYZE_DEADLINE_S,
+    ANALYZE_SLO_S,
+    CATEGORIZE_BATCH_WINDOW_MS,
+    GZIP_MIN_BYTES,
+    PROFILE_DIR,
+    PROFILE_INTERVAL_MS,
+    PROFILE_TOKEN,
+)
 from models.data_models import (
     AnalyzeRequest,
     AnalyzeResponse,
     AnalysisResult,
+    ReanalyzeRequest,
+    ReanalyzeResponse,
+    ReceiptListResponse,
+    TrendPoint,
+    CategoryShare,
+    StoreComparison,
+)
+from pipeline import reanalyze, run_analysis
+from services import (
+    get_aggregator,
+    get_analysis_agent,
+    get_insight_router,
+    get_parser_agent,
+    get_receipt_store,
 )
-from agents.ocr_agent import OCRAgent
-from agents.parser_agent import ParserAgent
-from agents.analysis_agent import AnalysisAgent
-from agents.llm_agent import LLMAgent
-from utils.image_processor import ImageProcessor
-from utils.logger import get_logger
+from storage.export import FORMATS as EXPORT_FORMATS, iter_pages, stream_rows
+from utils.admission import NO_LLM_INSIGHTS, NO_OPTIONAL_WORK, AdmissionController, Overloaded
+from utils.deadline import DeadlineExceeded
+from utils.image_quality import ImageQualityError
+from utils.json_response import COMPACT_EXCLUDE, FastJSONResponse
+from utils import profiling
+from utils.logger import ALWAYS, bind_request, current_request_id, get_logger, unbind_request
+from utils.micro_batcher import MicroBatcher
+from utils.single_flight import SingleFlight, request_digest
 
 logger = get_logger(__name__)
 
@@ -28,6 +63,7 @@ app = FastAPI(
     title="AI Receipt Analyzer API",
     description="Extracts, analyzes, and provides financial insights from receipt images.",
     version="1.0.0",
+    default_response_class=FastJSONResponse,
 )
 
 app.add_middleware(
@@ -38,13 +74,68 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Level 5 is ~4× cheaper than the default 9 for ~12% more bytes on analyze responses
+GZIP_LEVEL = 5
+app.add_middleware(GZipMiddleware, minimum_size=GZIP_MIN_BYTES, compresslevel=GZIP_LEVEL)
+
+
+def _is_admin(request: Request) -> bool:
+    """Whether the request carries the profiling token, as an X-Profile header or ?profile=."""
+    supplied = request.headers.get("x-profile") or request.query_params.get("profile")
+    if not PROFILE_TOKEN or not supplied:
+        return False
+    return hmac.compare_digest(supplied.encode(), PROFILE_TOKEN.encode())
+
+
+@app.middleware("http")
+async def profile_request(request: Request, call_next):
+    # Debug switch: an admin request runs under the sampling profiler (inside
+    # request_context below, so the profile is named after the request id)
+    if not _is_admin(request) or request.url.path.startswith("/api/profiles"):
+        return await call_next(request)
+    with profiling.session(current_request_id(), PROFILE_INTERVAL_MS / 1000) as profile:
+        response = await call_next(request)
+    report = profile.report()
+    path = await run_in_threadpool(profile.save, PROFILE_DIR, report)
+    logger.info(
+        "Profile saved to %s (%.2fs wall, %.2fs CPU)", path, report["wall_s"], report["cpu_s"],
+        extra={**ALWAYS, "profile": path, "breakdown": report["breakdown_s"]},
+    )
+    response.headers["Server-Timing"] = profile.server_timing(report)
+    response.headers["X-Profile-Id"] = profiling.safe_label(profile.label)
+    return response
+
 
-# Agent singletons
-_image_processor = ImageProcessor()
-_ocr_agent = OCRAgent()
-_parser_agent = ParserAgent()
-_analysis_agent = AnalysisAgent()
-_llm_agent = LLMAgent()
+@app.middleware("http")
+async def request_context(request: Request, call_next):
+    # Tag every log line of this request with one id, echoed back to the client
+    request_id = request.headers.get("x-request-id") or uuid.uuid4().hex[:16]
+    tokens = bind_request(request_id)
+    try:
+        response = await call_next(request)
+    finally:
+        unbind_request(tokens)
+    response.headers["X-Request-ID"] = request_id
+    return response
+
+
+# Agents and storage are built lazily by services.get_* on first use, so a
+# cold start only pays for FastAPI itself.
+
+# In-flight de-duplication of identical requests
+_analysis_flights = SingleFlight("analysis")
+# Bounds concurrent pipeline runs; sheds (429) or degrades work under overload
+_admission = AdmissionController(
+    max_in_flight=ADMISSION_MAX_IN_FLIGHT,
+    max_queue=ADMISSION_MAX_QUEUE,
+    queue_timeout=ADMISSION_QUEUE_TIMEOUT_S,
+    slo=ANALYZE_SLO_S,
+)
+_category_batcher = MicroBatcher(
+    "categorization",
+    lambda names: get_analysis_agent().categorize_names(names),
+    window_ms=CATEGORIZE_BATCH_WINDOW_MS,
+)
 
 
 @app.exception_handler(Exception)
@@ -73,70 +164,263 @@ async def health():
 # Main analysis pipeline
 # --------------------------------------------------------------------------
 
+async def _admitted_analysis(request: AnalyzeRequest) -> tuple[AnalysisResult, int]:
+    """Run the pipeline in a slot from the admission controller, shedding optional work under pressure."""
+    arrived = time.monotonic()
+    async with _admission.admit() as level:
+        # Under pressure insights stay local (no LLM call), then aggressive preprocessing goes too
+        insights_mode = "local" if level >= NO_LLM_INSIGHTS else request.insights_mode
+        aggressive = request.aggressive_preprocessing and level < NO_OPTIONAL_WORK
+        # Time spent queueing comes out of the request's budget
+        budget = ANALYZE_DEADLINE_S - (time.monotonic() - arrived)
+        result = await run_in_threadpool(
+            profiling.traced("pipeline", run_analysis), request.image_base64, aggressive, request.detect_duplicates, insights_mode, budget,
+        )
+        return result, level
+
+
 @app.post("/api/analyze", response_model=AnalyzeResponse)
-async def analyze_receipt(request: AnalyzeRequest):
+async def analyze_receipt(request: AnalyzeRequest, background_tasks: BackgroundTasks):
     start = time.time()
-    logger.info("📥 Received analysis request (aggressive=%s)", request.aggressive_preprocessing)
+    logger.info("Received analysis request (aggressive=%s)", request.aggressive_preprocessing)
 
     try:
-        # 1. Preprocess image
-        logger.info("Step 1/5 — Image preprocessing")
-        processed_image = _image_processor.preprocess(
+        # Identical uploads already in flight share one pipeline run
+        key = request_digest(
             request.image_base64,
             aggressive=request.aggressive_preprocessing,
+            detect_duplicates=request.detect_duplicates,
+            insights_mode=request.insights_mode,
         )
+        if profiling.active():
+            # A profiled request does its own run rather than joining someone else's
+            (result, level), shared = await _admitted_analysis(request), False
+        else:
+            (result, level), shared = await _analysis_flights.do(key, lambda: _admitted_analysis(request))
+        if not shared and not result.duplicate_of:
+            # Persist after the response is sent so history writes add no latency.
+            # A duplicate is already in history; saving it again would double-count it.
+            background_tasks.add_task(get_receipt_store().save, result)
 
-        # 2. OCR — try structured first, fall back to raw text
-        logger.info("Step 2/5 — OCR extraction")
-        try:
-            ocr_data = _ocr_agent.extract_structured_data(processed_image)
-            receipt = _parser_agent.parse(ocr_data)
-        except Exception as e:
-            logger.warning("Structured OCR failed (%s), falling back to raw text", e)
-            ocr_result = _ocr_agent.extract_text(processed_image)
-            cleaned_text = _ocr_agent.postprocess_text(ocr_result["extracted_text"])
-            receipt = _parser_agent.parse(cleaned_text)
-
-        receipt.processing_time = time.time() - start
-
-        # 3. Spending analysis
-        logger.info("Step 3/5 — Spending analysis")
-        spending_analysis = _analysis_agent.analyze(receipt)
-
-        # 4. LLM insights
-        logger.info("Step 4/5 — LLM insights")
-        llm_insight = _llm_agent.generate_insights(spending_analysis, receipt=receipt)
-
-        # 5. Build result
-        result = AnalysisResult(
-            receipt=receipt,
-            spending_analysis=spending_analysis,
-            llm_insight=llm_insight,
+        elapsed = round(time.time() - start, 2)
+        logger.info(
+            "Analysis complete in %.2fs%s", elapsed, " (coalesced)" if shared else "",
+            extra={**ALWAYS, "elapsed": elapsed, "coalesced": shared, "degradation": level},
         )
 
-        elapsed = round(time.time() - start, 2)
-        logger.info("✅ Pipeline complete in %.2fs", elapsed)
+        # Returned as a ready response so FastAPI does not re-validate and re-encode the model
+        return FastJSONResponse(
+            AnalyzeResponse(success=True, data=result, processing_time=elapsed),
+            exclude=COMPACT_EXCLUDE if request.compact else None,
+            headers={"X-Degradation-Level": str(level)},
+        )
 
-        return AnalyzeResponse(success=True, data=result, processing_time=elapsed)
+    except Overloaded as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
 
+    except ImageQualityError as e:
+        # Rejected before any model call; the message tells the user how to retake it
+        raise HTTPException(status_code=422, detail=str(e))
+    except DeadlineExceeded as e:
+        logger.warning("Analysis deadline exceeded: %s", e, extra={"elapsed": round(time.time() - start, 2)})
+        raise HTTPException(status_code=504, detail=f"Analysis took too long: {e}")
     except Exception as e:
         elapsed = round(time.time() - start, 2)
-        logger.error("❌ Pipeline error: %s", e)
+        logger.error("Pipeline error: %s", e, extra={"elapsed": elapsed})
         raise HTTPException(status_code=500, detail=str(e))
 
 
+# --------------------------------------------------------------------------
+# Receipt history (served from storage — no model calls)
+# --------------------------------------------------------------------------
+
+@app.get("/api/receipts", response_model=ReceiptListResponse)
+async def list_receipts(
+    store: Optional[str] = None,
+    category: Optional[str] = None,
+    date_from: Optional[str] = Query(None, description="ISO date, inclusive"),
+    date_to: Optional[str] = Query(None, description="ISO date, inclusive"),
+    limit: int = Query(50, ge=1, le=500),
+    offset: int = Query(0, ge=0),
+):
+    """List previously analyzed receipts, newest first."""
+    receipts = await run_in_threadpool(
+        get_receipt_store().list_receipts,
+        store=store, category=category, date_from=date_from, date_to=date_to,
+        limit=limit, offset=offset,
+    )
+    return ReceiptListResponse(receipts=receipts, count=len(receipts), limit=limit, offset=offset)
+
+
+@app.get("/api/receipts/{receipt_id}", response_model=AnalysisResult)
+async def get_receipt(receipt_id: str):
+    """Fetch a stored analysis result without re-running the pipeline."""
+    result = await run_in_threadpool(get_receipt_store().get, receipt_id)
+    if result is None:
+        raise HTTPException(status_code=404, detail=f"Receipt '{receipt_id}' not found")
+    return result
+
+
+@app.post("/api/receipts/{receipt_id}/reanalyze", response_model=ReanalyzeResponse)
+async def reanalyze_receipt(receipt_id: str, request: ReanalyzeRequest):
+    """Apply the user's corrections to a stored receipt, redoing only the analysis they affect.
+
+    Send either the whole edited ``receipt`` or ``edits`` against the stored
+    items. The updated result replaces the stored one under the same id.
+    """
+    start = time.time()
+    store = get_receipt_store()
+    stored = await run_in_threadpool(store.get, receipt_id)
+    if stored is None:
+        raise HTTPException(status_code=404, detail=f"Receipt '{receipt_id}' not found")
+    try:
+        result, recomputed = await run_in_threadpool(reanalyze, stored, request)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except DeadlineExceeded as e:
+        raise HTTPException(status_code=504, detail=f"Re-analysis took too long: {e}")
+    # Saved before answering, so a reload right after shows the corrections
+    await run_in_threadpool(store.save, result)
+
+    return FastJSONResponse(
+        ReanalyzeResponse(success=True, data=result, processing_time=round(time.time() - start, 2), **recomputed),
+        exclude=COMPACT_EXCLUDE if request.compact else None,
+    )
+
+
+@app.get("/api/history/trends", response_model=List[TrendPoint])
+async def spending_trends(
+    grain: str = Query("month", pattern="^(day|month)$"),
+    category: Optional[str] = None,
+    store: Optional[str] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    window: int = Query(3, ge=1, le=365, description="Periods in the rolling total"),
+):
+    """Spending per day/month with a rolling total, optionally for one category or store."""
+    return await run_in_threadpool(
+        get_aggregator().trends,
+        grain=grain, category=category, store_name=store,
+        date_from=date_from, date_to=date_to, window=window,
+    )
+
+
+@app.get("/api/history/categories", response_model=List[CategoryShare])
+async def category_shares(
+    grain: str = Query("month", pattern="^(day|month)$"),
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+):
+    """Share of total spending per category across stored receipts."""
+    return await run_in_threadpool(
+        get_aggregator().category_shares, grain=grain, date_from=date_from, date_to=date_to,
+    )
+
+
+@app.get("/api/history/stores", response_model=List[StoreComparison])
+async def store_comparison(
+    grain: str = Query("month", pattern="^(day|month)$"),
+    category: Optional[str] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+):
+    """Compare total and average spend per store."""
+    return await run_in_threadpool(
+        get_aggregator().store_comparison,
+        grain=grain, category=category, date_from=date_from, date_to=date_to,
+    )
+
+
+@app.get("/api/export/{table}")
+async def export_history(
+    table: str = Path(..., pattern="^(items|receipts)$"),
+    format: str = Query("csv", pattern="^(csv|ndjson)$"),
+    date_from: Optional[str] = Query(None, description="ISO date, inclusive"),
+    date_to: Optional[str] = Query(None, description="ISO date, inclusive"),
+):
+    """Download stored line items or receipts as CSV or NDJSON, oldest purchase first.
+
+    Streamed a page at a time, so memory stays flat whatever the date range.
+    """
+    pages = iter_pages(get_receipt_store(), table, date_from, date_to)
+    name = "-".join([table] + [d for d in (date_from, date_to) if d])
+    return StreamingResponse(
+        stream_rows(pages, table, format),
+        media_type=EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="{profiling.safe_label(name)}.{format}"'},
+    )
+
+
 # --------------------------------------------------------------------------
 # Utility endpoints
 # --------------------------------------------------------------------------
 
 @app.post("/api/categorize-item")
 async def categorize_item(payload: dict):
-    """Categorize a single item name."""
-    name = payload.get("name", "")
-    if not name:
-        raise HTTPException(status_code=400, detail="'name' field is required")
-    category = _analysis_agent._categorize(name)
-    return {"name": name, "category": category}
+    """Categorize one item name (``name``) or a list of them (``names``).
+
+    Known names are answered from the local category cache without a model
+    call; misses from concurrent requests are micro-batched into one call.
+    """
+    names = payload.get("names")
+    if names is None:
+        names = [payload.get("name", "")]
+    if not isinstance(names, list) or not names or not all(isinstance(n, str) and n.strip() for n in names):
+        raise HTTPException(status_code=400, detail="'name' or non-empty 'names' list is required")
+
+    agent = get_analysis_agent()
+    categories = {}
+    misses = []
+    for name in dict.fromkeys(names):
+        cached = agent.cached_category(name)
+        if cached:
+            categories[name] = cached
+        else:
+            misses.append(name)
+    if misses:
+        resolved = await asyncio.gather(*(_category_batcher.submit(name) for name in misses))
+        categories.update(zip(misses, resolved))
+
+    if "names" in payload:
+        return {"items": [{"name": name, "category": categories[name]} for name in names]}
+    return {"name": names[0], "category": categories[names[0]]}
+
+
+@app.get("/api/admission/stats")
+async def admission_stats():
+    """Current load, degradation level and shed/degraded counters for /api/analyze (this process)."""
+    return _admission.stats()
+
+
+@app.get("/api/insights/stats")
+async def insight_stats():
+    """How often insights were answered locally instead of by the LLM (this process)."""
+    return get_insight_router().stats()
+
+
+@app.get("/api/templates/stats")
+async def template_stats():
+    """Learned store layouts and how often text-first OCR was parsed locally (this process)."""
+    templates = get_parser_agent().templates
+    return templates.stats() if templates is not None else {"enabled": False}
+
+
+@app.get("/api/profiles/{profile_id}")
+async def get_profile(
+    profile_id: str,
+    request: Request,
+    format: str = Query("json", pattern="^(json|folded)$"),
+):
+    """A saved request profile (profiling token required); ``folded`` gives flamegraph input."""
+    if not _is_admin(request):
+        raise HTTPException(status_code=403, detail="Profiling token required")
+    path = os.path.join(PROFILE_DIR, f"{profiling.safe_label(profile_id)}.json")
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail=f"Profile '{profile_id}' not found")
+    report = await run_in_threadpool(profiling.load, path)
+    if format == "folded":
+        return PlainTextResponse("".join(f"{stack} {n}\n" for stack, n in report["folded"].items()))
+    return report
 
 
 @app.get("/api/categories")
@@ -0,0 +1,114 @@
+"""Measure /api/analyze goodput under overload with and without admission control.
+
+Simulates the pipeline on a time-scaled model provider that serves a fixed
+number of calls at once: every request makes one OCR call, and a share of
+them a second (LLM insights) call. Requests arrive as a Poisson stream at
+multiples of capacity. Clients give up at the SLO, but, as with threadpool
+work behind a dropped HTTP connection, the server keeps going.
+
+Without admission control every request joins the provider queue, so under
+overload latency grows until almost nothing finishes within the SLO. With
+``AdmissionController`` excess requests get 429 at once, and admitted ones
+skip the LLM call under pressure.
+
+    cd backend && python benchmarks/bench_admission.py [--duration 3] [--loads 0.5 1 1.5 2 3]
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.admission import NO_LLM_INSIGHTS, AdmissionController, Overloaded, track_model_call  # noqa: E402
+
+MODEL_SLOTS = 8        # calls the provider serves at once
+OCR_S = 0.20
+LLM_S = 0.10
+LLM_SHARE = 0.5        # requests whose insights escalate to the LLM
+SLO_S = 1.0
+
+
+async def model_call(provider: asyncio.Semaphore, seconds: float) -> None:
+    with track_model_call():
+        async with provider:
+            await asyncio.sleep(seconds)
+
+
+async def pipeline(provider, wants_llm: bool, level: int = 0) -> None:
+    await model_call(provider, OCR_S)
+    if wants_llm and level < NO_LLM_INSIGHTS:
+        await model_call(provider, LLM_S)
+
+
+async def run(load: float, duration: float, admission: bool, seed: int) -> dict:
+    provider = asyncio.Semaphore(MODEL_SLOTS)
+    capacity = MODEL_SLOTS / (OCR_S + LLM_SHARE * LLM_S)
+    controller = AdmissionController(
+        max_in_flight=MODEL_SLOTS, max_queue=MODEL_SLOTS, queue_timeout=SLO_S / 2, slo=SLO_S
+    )
+    rng = random.Random(seed)
+    outcomes: list = []
+
+    async def serve(wants_llm: bool):
+        if not admission:
+            return await pipeline(provider, wants_llm)
+        async with controller.admit() as level:
+            await pipeline(provider, wants_llm, level)
+
+    async def client():
+        start = time.monotonic()
+        work = asyncio.ensure_future(serve(rng.random() < LLM_SHARE))
+        try:
+            await asyncio.wait_for(asyncio.shield(work), SLO_S)
+            outcomes.append(("ok", time.monotonic() - start))
+        except Overloaded:
+            outcomes.append(("shed", time.monotonic() - start))
+        except asyncio.TimeoutError:
+            outcomes.append(("timeout", SLO_S))
+        return work
+
+    clients = []
+    end = time.monotonic() + duration
+    while time.monotonic() < end:
+        clients.append(asyncio.ensure_future(client()))
+        await asyncio.sleep(rng.expovariate(load * capacity))
+    works = await asyncio.gather(*clients)
+    await asyncio.gather(*works, return_exceptions=True)   # let abandoned work drain
+
+    ok = [t for kind, t in outcomes if kind == "ok"]
+    return {
+        "offered": len(outcomes) / duration,
+        "goodput": len(ok) / duration,
+        "shed": sum(kind == "shed" for kind, _ in outcomes),
+        "timeouts": sum(kind == "timeout" for kind, _ in outcomes),
+        "p50": statistics.median(ok) if ok else float("nan"),
+        "p95": sorted(ok)[int(len(ok) * 0.95)] if ok else float("nan"),
+        "degraded": controller.degraded,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--duration", type=float, default=3.0)
+    parser.add_argument("--loads", type=float, nargs="+", default=[0.5, 1.0, 1.5, 2.0, 3.0])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    capacity = MODEL_SLOTS / (OCR_S + LLM_SHARE * LLM_S)
+    print(f"capacity ≈ {capacity:.0f} req/s, SLO {SLO_S:.1f}s (time-scaled)")
+    print(f"{'load':>5} {'mode':<10}{'offered/s':>10}{'goodput/s':>10}{'shed':>6}{'timeout':>8}"
+          f"{'degraded':>9}{'p50 s':>7}{'p95 s':>7}")
+    for load in args.loads:
+        for admission in (False, True):
+            r = asyncio.run(run(load, args.duration, admission, args.seed))
+            mode = "admission" if admission else "none"
+            print(f"{load:>5.1f} {mode:<10}{r['offered']:>10.1f}{r['goodput']:>10.1f}{r['shed']:>6}"
+                  f"{r['timeouts']:>8}{r['degraded']:>9}{r['p50']:>7.2f}{r['p95']:>7.2f}")
+
+
+if __name__ == "__main__":
+    main()
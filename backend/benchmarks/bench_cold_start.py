@@ -0,0 +1,93 @@
+"""Measure API cold-start cost and report where import time goes.
+
+Each run spawns a fresh interpreter (as a serverless cold start would),
+imports ``api.index`` and serves one ``GET /api/health`` through the ASGI
+app directly. A ``-X importtime`` pass then lists the slowest imports.
+
+    cd backend && python benchmarks/bench_cold_start.py [--runs 5] [--top 15]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+COLD_START_SNIPPET = r"""
+import asyncio, sys, time
+t0 = time.perf_counter()
+import api.index
+t1 = time.perf_counter()
+
+async def first_request():
+    sent = []
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+    async def send(message):
+        sent.append(message)
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "method": "GET", "scheme": "http", "path": "/api/health", "raw_path": b"/api/health",
+        "query_string": b"", "root_path": "", "headers": [], "client": ("127.0.0.1", 1),
+        "server": ("127.0.0.1", 80),
+    }
+    await api.index.app(scope, receive, send)
+    return sent[0]["status"]
+
+status = asyncio.run(first_request())
+t2 = time.perf_counter()
+heavy = [m for m in ("openai", "PIL", "httpx", "numpy") if m in sys.modules]
+print(f"{t1 - t0:.4f} {t2 - t1:.4f} {status} {','.join(heavy) or '-'}")
+"""
+
+
+def cold_start_once() -> tuple[float, float, int, str]:
+    out = subprocess.run(
+        [sys.executable, "-c", COLD_START_SNIPPET],
+        cwd=BACKEND, capture_output=True, text=True, check=True,
+    ).stdout.strip().splitlines()[-1]
+    import_s, first_s, status, heavy = out.split()
+    return float(import_s), float(first_s), int(status), heavy
+
+
+def import_profile(top: int) -> list[tuple[int, str]]:
+    """Self import time in microseconds, summed per top-level package."""
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import api.index"],
+        cwd=BACKEND, capture_output=True, text=True, check=True,
+    ).stderr
+    totals: dict[str, int] = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, _, name = line[len("import time:"):].split("|")
+        package = name.strip().split(".")[0]
+        totals[package] = totals.get(package, 0) + int(self_us)
+    return sorted(((us, pkg) for pkg, us in totals.items()), reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    cold_start_once()  # warm the .pyc cache so runs measure imports, not compilation
+    runs = [cold_start_once() for _ in range(args.runs)]
+    imports = [r[0] * 1000 for r in runs]
+    firsts = [r[1] * 1000 for r in runs]
+
+    print(f"Cold starts          : {args.runs}")
+    print(f"import api.index     : median {statistics.median(imports):.0f} ms "
+          f"(min {min(imports):.0f}, max {max(imports):.0f})")
+    print(f"first /api/health    : median {statistics.median(firsts):.1f} ms")
+    print(f"heavy modules loaded : {runs[-1][3]}")
+    print()
+    print("Import time by package (self time):")
+    for micros, name in import_profile(args.top):
+        print(f"  {micros / 1000:8.1f} ms  {name}")
+
+
+if __name__ == "__main__":
+    main()
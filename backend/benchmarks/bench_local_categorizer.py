@@ -0,0 +1,97 @@
+"""Benchmark the local categorizer against LLM-assigned labels.
+
+Uses the labeled items in the receipt store (RECEIPT_DB_PATH) when there are
+enough of them, otherwise a synthetic labeled corpus. Items are split into a
+train set (fed to the index) and a held-out set whose stored/LLM label is
+treated as ground truth.
+
+    cd backend && python benchmarks/bench_local_categorizer.py [--db receipts.db]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agents.local_categorizer import LocalCategorizer
+
+SYNTHETIC = {
+    "Dairy & Eggs": ["Whole Milk", "2% Milk", "Cheddar Cheese", "Greek Yogurt", "Large Eggs",
+                     "Butter Unsalted", "Mozzarella", "Sour Cream", "Cottage Cheese", "Oat Milk"],
+    "Fresh Produce": ["Banana Bunch", "Roma Tomatoes", "Organic Spinach", "Gala Apples",
+                      "Red Onions", "Baby Carrots", "Blueberries", "Avocado", "Lemons", "Broccoli"],
+    "Meat & Seafood": ["Chicken Breast", "Ground Beef", "Pork Chops", "Salmon Fillet",
+                       "Turkey Slices", "Bacon", "Shrimp", "Chicken Thighs", "Ribeye Steak"],
+    "Snacks & Candy": ["Potato Chips", "Tortilla Chips", "Candy Mix Bag", "Pretzels",
+                       "Chocolate Bar", "Trail Mix", "Popcorn", "Gummy Bears", "Crackers"],
+    "Beverages": ["Orange Juice", "Sparkling Water", "Cola 12 Pack", "Cold Brew Coffee",
+                  "Apple Juice", "Green Tea", "Energy Drink", "Lemonade", "Ginger Ale"],
+    "Household Cleaning": ["Tide Detergent", "Dish Soap", "Paper Towels", "Bleach",
+                           "Trash Bags", "Sponges", "Glass Cleaner", "Laundry Pods"],
+    "Personal Care": ["Shampoo", "Toothpaste", "Body Wash", "Deodorant", "Conditioner",
+                      "Razor Blades", "Lotion", "Mouthwash"],
+    "Bakery": ["Sourdough Loaf", "White Bread", "Bagels", "Croissants", "Tortillas",
+               "Hamburger Buns", "Muffins", "Dinner Rolls"],
+}
+BRANDS = ["", "Great Value ", "Kirkland ", "Organic ", "Store Brand ", "Simple Truth ", "365 "]
+SIZES = ["", " 16oz", " 1 Gal", " 2lb", " 12ct", " 6pk", " Family Size", " Lg"]
+
+
+def synthetic_corpus(n: int, seed: int = 7) -> list[tuple[str, str]]:
+    rng = random.Random(seed)
+    corpus = []
+    for _ in range(n):
+        category = rng.choice(list(SYNTHETIC))
+        name = f"{rng.choice(BRANDS)}{rng.choice(SYNTHETIC[category])}{rng.choice(SIZES)}"
+        corpus.append((name, category))
+    return corpus
+
+
+def store_corpus(path: str) -> list[tuple[str, str]]:
+    from storage.receipt_store import ReceiptStore
+    store = ReceiptStore(path)
+    rows = store.query("SELECT name, category FROM items ORDER BY id")
+    store.close()
+    return [(r["name"], r["category"]) for r in rows]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db", help="receipt store to read labels from")
+    parser.add_argument("--size", type=int, default=20_000, help="synthetic corpus size")
+    parser.add_argument("--holdout", type=float, default=0.2)
+    args = parser.parse_args()
+
+    corpus = store_corpus(args.db) if args.db else []
+    source = f"store {args.db}"
+    if len(corpus) < 200:
+        corpus, source = synthetic_corpus(args.size), "synthetic corpus"
+    random.Random(0).shuffle(corpus)
+    split = int(len(corpus) * (1 - args.holdout))
+    train, test = corpus[:split], corpus[split:]
+
+    categorizer = LocalCategorizer()
+    start = time.perf_counter()
+    categorizer.learn_many(train)
+    learn_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    predictions = categorizer.predict_many([name for name, _ in test])
+    predict_s = time.perf_counter() - start
+
+    confident = [(predictions[name][0], label) for name, label in test if predictions[name][0]]
+    agree = sum(1 for predicted, label in confident if predicted == label)
+
+    print(f"Source            : {source} ({len(train)} train / {len(test)} held out)")
+    print(f"Index build       : {learn_s * 1000:.1f} ms ({len(categorizer)} distinct names)")
+    print(f"Batch throughput  : {len(test) / predict_s:,.0f} items/s "
+          f"({predict_s / len(test) * 1e6:.1f} µs/item)")
+    print(f"Answered locally  : {len(confident) / len(test):.1%} (rest escalate to the LLM)")
+    print(f"Agreement w/ LLM  : {agree / len(confident):.1%} of local answers" if confident else
+          "Agreement w/ LLM  : n/a")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""Measure per-request logging overhead on the request threads.
+
+Simulates concurrent requests that each emit a dozen step lines, as
+``/api/analyze`` does, and compares the previous synchronous text handler
+with the queue-backed handler at several sample rates. The sink can be
+given a per-write latency to mimic a slow stdout pipe (log collectors
+under load).
+
+    cd backend && python benchmarks/bench_logging.py [--requests 2000] [--threads 8] [--sink-latency-us 50]
+"""
+import argparse
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.logger import (  # noqa: E402
+    ALWAYS,
+    ContextFilter,
+    JSONFormatter,
+    TextFormatter,
+    _PreformattedQueueHandler,
+    bind_request,
+    unbind_request,
+)
+
+LINES_PER_REQUEST = 12
+
+
+class SlowSink:
+    """A write-only stream that takes ``latency`` seconds per write."""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.writes = 0
+        self._lock = threading.Lock()
+
+    def write(self, text):
+        with self._lock:
+            self.writes += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def flush(self):
+        pass
+
+
+def build_sync(sink):
+    handler = logging.StreamHandler(sink)
+    handler.setFormatter(logging.Formatter(
+        "%(asctime)s | %(levelname)s | %(name)s | %(message)s", datefmt="%Y-%m-%d %H:%M:%S"
+    ))
+    return handler, None
+
+
+def build_queued(sink, fmt):
+    stream_handler = logging.StreamHandler(sink)
+    stream_handler.setFormatter(JSONFormatter() if fmt == "json" else TextFormatter())
+    log_queue = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(log_queue, stream_handler)
+    listener.start()
+    handler = _PreformattedQueueHandler(log_queue)
+    handler.addFilter(ContextFilter())
+    return handler, listener
+
+
+def fake_request(logger, n, sample_rate):
+    tokens = bind_request(f"req-{n}", sample_rate=sample_rate)
+    start = time.perf_counter()
+    try:
+        for step in range(LINES_PER_REQUEST - 1):
+            logger.info("Step %d — processing %s", step, "receipt", extra={"step": step})
+        logger.info("Pipeline finished in %.2fs", 1.23, extra=ALWAYS)
+    finally:
+        unbind_request(tokens)
+    return time.perf_counter() - start
+
+
+def run_case(label, handler, listener, sink, requests, threads, sample_rate):
+    logger = logging.getLogger(f"bench.{label}")
+    logger.handlers = [handler]
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        caller = list(pool.map(lambda n: fake_request(logger, n, sample_rate), range(requests)))
+    issued = time.perf_counter() - start
+    if listener is not None:
+        listener.stop()   # drains the queue
+    drained = time.perf_counter() - start
+
+    caller.sort()
+    p50 = caller[len(caller) // 2] * 1e6
+    p99 = caller[int(len(caller) * 0.99)] * 1e6
+    print(
+        f"{label:<26} {p50:>10.1f} {p99:>10.1f} {requests / issued:>12.0f} "
+        f"{drained:>9.2f}s {sink.writes:>9}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--sink-latency-us", type=float, default=50.0)
+    args = parser.parse_args()
+    latency = args.sink_latency_us / 1e6
+
+    print(
+        f"{args.requests} requests × {LINES_PER_REQUEST} lines, {args.threads} threads, "
+        f"sink latency {args.sink_latency_us:.0f}µs/write\n"
+    )
+    print(f"{'handler':<26} {'p50 µs/req':>10} {'p99 µs/req':>10} {'req/s issued':>12} {'drained':>10} {'lines':>9}")
+
+    sink = SlowSink(latency)
+    run_case("sync text (before)", *build_sync(sink), sink, args.requests, args.threads, 1.0)
+    for fmt in ("text", "json"):
+        for rate in (1.0, 0.1):
+            sink = SlowSink(latency)
+            handler, listener = build_queued(sink, fmt)
+            run_case(f"queued {fmt}, sample {rate:g}", handler, listener, sink,
+                     args.requests, args.threads, rate)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""Measure near-duplicate lookup latency over a large perceptual-hash index.
+
+Fills a ``HammingIndex`` with random 256-bit hashes, then times lookups for
+near-duplicates (a stored hash with a few bits flipped) and for misses,
+against a linear scan over the same hashes.
+
+    cd backend && python benchmarks/bench_phash_index.py [--size 1000000] [--radius 16]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.phash_index import HASH_BITS, HammingIndex, hamming  # noqa: E402
+
+
+def time_queries(fn, queries):
+    samples = []
+    for query in queries:
+        start = time.perf_counter()
+        fn(query)
+        samples.append((time.perf_counter() - start) * 1e6)
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.99)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=int, default=1_000_000)
+    parser.add_argument("--radius", type=int, default=16)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    stored = [rng.getrandbits(HASH_BITS) for _ in range(args.size)]
+    index = HammingIndex()
+    start = time.perf_counter()
+    for i, value in enumerate(stored):
+        index.add(str(i), value)
+    print(f"built index of {len(index):,} hashes in {time.perf_counter() - start:.1f}s")
+
+    near = []
+    for value in rng.sample(stored, args.queries):
+        for bit in rng.sample(range(HASH_BITS), rng.randint(0, args.radius)):
+            value ^= 1 << bit
+        near.append(value)
+    misses = [rng.getrandbits(HASH_BITS) for _ in range(args.queries)]
+
+    found = sum(index.nearest(q, args.radius) is not None for q in near)
+    print(f"recall on near-duplicates: {found}/{len(near)}\n")
+
+    print(f"{'lookup':<28} {'p50 µs':>10} {'p99 µs':>10}")
+    for label, queries in (("index, near-duplicate", near), ("index, miss", misses)):
+        p50, p99 = time_queries(lambda q: index.nearest(q, args.radius), queries)
+        print(f"{label:<28} {p50:>10.1f} {p99:>10.1f}")
+
+    def scan(query):
+        return min((hamming(query, v), i) for i, v in enumerate(stored))
+
+    p50, p99 = time_queries(scan, misses[:20])
+    print(f"{'linear scan':<28} {p50:>10.1f} {p99:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""Measure what cropping photos to the receipt saves on the vision call.
+
+Composites the synthetic receipts onto phone-photo-sized backgrounds (dark
+table, wood, light counter) at a few tilts, then runs ``ImageProcessor.preprocess``
+with the receipt crop off and on. For each setting it reports the payload sent
+to the model, the image tiles and input tokens it is billed for
+(high-detail pricing: 85 + 170 per 512px tile), and the preprocessing time.
+
+High-detail images are rescaled by the API to a 768px short side, so the tile
+count follows the aspect ratio rather than the pixel count: cropping mostly
+shrinks the upload and hands those same tiles to the receipt instead of the
+table around it.
+
+    cd backend && python benchmarks/bench_receipt_crop.py [--width 3024] [--height 4032] [--no-deskew]
+"""
+import argparse
+import base64
+import io
+import math
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np  # noqa: E402
+from PIL import Image  # noqa: E402
+
+import utils.image_processor as image_processor  # noqa: E402
+from utils.sample_generator import SAMPLE_RECEIPTS, _create_receipt_image  # noqa: E402
+
+BACKGROUNDS = {"dark": (60, 60, 60), "wood": (130, 95, 60), "light": (200, 200, 195)}
+TILTS = (0, 4, -7)
+
+
+def vision_tiles(width: int, height: int) -> int:
+    """Tiles billed for a high-detail image after the API's own downscaling."""
+    scale = min(1.0, 2048 / max(width, height))
+    width, height = width * scale, height * scale
+    scale = min(1.0, 768 / min(width, height))
+    return math.ceil(width * scale / 512) * math.ceil(height * scale / 512)
+
+
+def photo(receipt: Image.Image, colour: tuple, tilt: float, size: tuple, seed: int) -> str:
+    """A JPEG 'phone photo' of ``receipt`` lying on a noisy background."""
+    rng = np.random.default_rng(seed)
+    noise = rng.normal(0, 12, (size[1] // 8, size[0] // 8, 3)) + colour
+    frame = Image.fromarray(np.clip(noise, 0, 255).astype(np.uint8)).resize(size, Image.BILINEAR)
+    sheet = receipt.rotate(tilt, expand=True, resample=Image.BICUBIC)
+    mask = Image.new("L", receipt.size, 255).rotate(tilt, expand=True)
+    frame.paste(sheet, ((size[0] - sheet.size[0]) // 2, (size[1] - sheet.size[1]) // 3), mask)
+    buffer = io.BytesIO()
+    frame.save(buffer, format="JPEG", quality=90)
+    return base64.b64encode(buffer.getvalue()).decode()
+
+
+def measure(processor, photos, crop: bool, deskew: bool) -> dict:
+    image_processor.RECEIPT_CROP = crop
+    image_processor.RECEIPT_DESKEW = deskew
+    payload, tiles, millis = [], [], []
+    for b64 in photos:
+        start = time.perf_counter()
+        out = processor.preprocess(b64)
+        millis.append((time.perf_counter() - start) * 1000)
+        payload.append(len(out))
+        tiles.append(vision_tiles(*Image.open(io.BytesIO(base64.b64decode(out))).size))
+    return {
+        "payload_kb": statistics.mean(payload) / 1024,
+        "tiles": statistics.mean(tiles),
+        "tokens": 85 + 170 * statistics.mean(tiles),
+        "ms_p50": statistics.median(millis),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--width", type=int, default=3024)
+    parser.add_argument("--height", type=int, default=4032)
+    parser.add_argument("--scale", type=float, default=3.0, help="receipt size relative to the generator's")
+    parser.add_argument("--no-deskew", action="store_true")
+    args = parser.parse_args()
+
+    photos = []
+    for r in SAMPLE_RECEIPTS:
+        receipt = _create_receipt_image(r["store"], r["date"], r["items"], r["tax_rate"]).convert("RGB")
+        receipt = receipt.resize((int(receipt.size[0] * args.scale), int(receipt.size[1] * args.scale)))
+        for colour in BACKGROUNDS.values():
+            for tilt in TILTS:
+                photos.append(photo(receipt, colour, tilt, (args.width, args.height), seed=len(photos)))
+
+    processor = image_processor.ImageProcessor()
+    processor.preprocess(photos[0])     # warm up imports
+    before = measure(processor, photos, crop=False, deskew=False)
+    after = measure(processor, photos, crop=True, deskew=not args.no_deskew)
+
+    print(f"{len(photos)} photos {args.width}×{args.height}, "
+          f"{len(BACKGROUNDS)} backgrounds × tilts {TILTS}")
+    print(f"{'':<10}{'payload KB':>12}{'tiles':>8}{'tokens':>8}{'prep p50 ms':>13}")
+    for name, row in (("full", before), ("cropped", after)):
+        print(f"{name:<10}{row['payload_kb']:>12.0f}{row['tiles']:>8.1f}{row['tokens']:>8.0f}{row['ms_p50']:>13.0f}")
+    print(f"payload {100 * (after['payload_kb'] / before['payload_kb'] - 1):+.0f}%, "
+          f"input tokens {100 * (after['tokens'] / before['tokens'] - 1):+.0f}%, "
+          f"preprocessing {100 * (after['ms_p50'] / before['ms_p50'] - 1):+.0f}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Measure AnalyzeResponse serialization time and bytes on the wire.
+
+Builds analyze responses for receipts of several sizes and compares FastAPI's
+default path (validate against ``response_model``, then ``json.dumps`` via
+JSONResponse) with ``FastJSONResponse``, in full and ``compact`` form. It also
+reports the gzipped size the GZip middleware would send and what compressing
+costs.
+
+    cd backend && python benchmarks/bench_response_json.py [--sizes 10 40 120] [--repeat 500]
+"""
+import argparse
+import asyncio
+import gzip
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.responses import JSONResponse  # noqa: E402
+from fastapi.routing import serialize_response  # noqa: E402
+from fastapi.utils import create_response_field  # noqa: E402
+
+from models.data_models import AnalyzeResponse, ReceiptItem  # noqa: E402
+from tests.test_storage import _make_result  # noqa: E402
+from api.index import GZIP_LEVEL  # noqa: E402
+from utils.json_response import COMPACT_EXCLUDE, FastJSONResponse  # noqa: E402
+
+FIELD = create_response_field(name="Response_analyze", type_=AnalyzeResponse)
+LOOP = asyncio.new_event_loop()
+
+
+def build_response(n_items: int) -> AnalyzeResponse:
+    items = [
+        ReceiptItem(name=f"Organic Product {i:03d}", quantity=1, unit_price=2.49, total_price=2.49,
+                    category=f"Category {i % 8}")
+        for i in range(n_items)
+    ]
+    result = _make_result(items=items)
+    result.receipt.raw_ocr_text = "\n".join(f"ORGANIC PRODUCT {i:03d}        2.49" for i in range(n_items))
+    return AnalyzeResponse(success=True, data=result, processing_time=4.2)
+
+
+def fastapi_default(response: AnalyzeResponse) -> bytes:
+    content = LOOP.run_until_complete(
+        serialize_response(field=FIELD, response_content=response, is_coroutine=True)
+    )
+    return JSONResponse(content).body
+
+
+def time_us(fn, repeat: int) -> tuple[float, bytes]:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        body = fn()
+        samples.append((time.perf_counter() - start) * 1e6)
+    return statistics.median(samples), body
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 40, 120])
+    parser.add_argument("--repeat", type=int, default=500)
+    args = parser.parse_args()
+
+    print(f"{'items':>5}  {'path':<26}{'serialize µs':>13}{'bytes':>9}{'gzip bytes':>12}{'gzip µs':>9}")
+    for n in args.sizes:
+        response = build_response(n)
+        paths = {
+            "FastAPI default": lambda: fastapi_default(response),
+            "FastJSONResponse": lambda: FastJSONResponse(response).body,
+            "FastJSONResponse compact": lambda: FastJSONResponse(response, exclude=COMPACT_EXCLUDE).body,
+        }
+        for name, fn in paths.items():
+            micros, body = time_us(fn, args.repeat)
+            gz_micros, packed = time_us(lambda: gzip.compress(body, compresslevel=GZIP_LEVEL), 50)
+            print(f"{n:>5}  {name:<26}{micros:>13.0f}{len(body):>9}{len(packed):>12}{gz_micros:>9.0f}")
+        print()
+
+
+if __name__ == "__main__":
+    main()
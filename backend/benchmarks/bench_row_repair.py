@@ -0,0 +1,117 @@
+"""Measure re-reading suspicious rows against re-OCRing the whole receipt.
+
+For each sample receipt (rendered at a few scales, as a phone photo would be)
+and each kind of misread (one item, the subtotal, the tax), finds the suspect
+rows, crops them with ``ImageProcessor.crop_lines`` and compares what the
+model is billed for and has to write: the whole image plus the full
+structured JSON answer, vs one strip per suspect row plus a few-token answer.
+Row re-reads run concurrently, so their latency is that of the largest one.
+
+Image tokens use high-detail pricing (85 + 170 per 512px tile, see
+bench_receipt_crop); output tokens are estimated at 4 characters per token,
+decoded at ~60 tokens/s.
+
+    cd backend && python benchmarks/bench_row_repair.py [--scales 1 2 3] [--repeat 20]
+"""
+import argparse
+import base64
+import io
+import json
+import logging
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image  # noqa: E402
+
+from agents.parser_agent import ParserAgent  # noqa: E402
+from agents.row_repair import find_suspects, raw_lines  # noqa: E402
+from benchmarks.bench_receipt_crop import vision_tiles  # noqa: E402
+from utils.image_processor import ImageProcessor  # noqa: E402
+from utils.sample_generator import SAMPLE_RECEIPTS, _create_receipt_image, receipt_text  # noqa: E402
+
+TOKENS_PER_S = 60
+ROW_ANSWER_TOKENS = 20
+CONFUSABLE = dict(zip("0123456789", "8778965134"))      # each a LOOK_ALIKE pair
+
+
+def structured(sample: dict) -> dict:
+    rows = [{"name": name, "quantity": qty, "unit_price": price, "total_price": round(qty * price, 2)}
+            for name, qty, price in sample["items"]]
+    subtotal = round(sum(r["total_price"] for r in rows), 2)
+    tax = round(subtotal * sample["tax_rate"], 2)
+    return {"store_name": sample["store"], "date": sample["date"], "items": rows, "subtotal": subtotal,
+            "tax": tax, "total": round(subtotal + tax, 2),
+            "raw_text": receipt_text(sample["store"], sample["date"], sample["items"], sample["tax_rate"])}
+
+
+def confuse(amount: float) -> float:
+    """``amount`` with its tenths digit misread as a look-alike digit (8 → 3, 1 → 7, ...)."""
+    text = f"{amount:.2f}"
+    return float(text[:-2] + CONFUSABLE[text[-2]] + text[-1])
+
+
+def misreads(data: dict) -> dict:
+    """The structured answer with one value misread, per kind of misread."""
+    item = json.loads(json.dumps(data))
+    largest = max(item["items"], key=lambda i: i["total_price"])
+    largest["total_price"] = confuse(largest["total_price"])
+    largest["unit_price"] = round(largest["total_price"] / largest["quantity"], 2)
+    return {
+        "item": item,
+        "subtotal": {**data, "subtotal": confuse(data["subtotal"])},
+        "tax": {**data, "tax": confuse(data["tax"])},
+    }
+
+
+def image_tokens(width: int, height: int) -> int:
+    return 85 + 170 * vision_tiles(width, height)
+
+
+def size_of(crop: str) -> tuple[int, int]:
+    return Image.open(io.BytesIO(base64.b64decode(crop))).size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 2, 3])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    processor = ImageProcessor()
+    print(f"{'receipt':<22}{'scale':>6}{'misread':>9}{'rows':>5}{'in tok':>16}{'out tok':>12}"
+          f"{'~decode s':>13}{'crop ms':>9}")
+    for sample in SAMPLE_RECEIPTS:
+        data = structured(sample)
+        answer_tokens = len(json.dumps(data)) / 4
+        for scale in args.scales:
+            image = _create_receipt_image(sample["store"], sample["date"], sample["items"], sample["tax_rate"])
+            image = image.resize((image.width * scale, image.height * scale), Image.LANCZOS)
+            buffer = io.BytesIO()
+            image.save(buffer, format="JPEG", quality=90)
+            encoded = base64.b64encode(buffer.getvalue()).decode()
+            full_tokens = image_tokens(*image.size)
+
+            for kind, misread in misreads(data).items():
+                receipt = ParserAgent().parse(misread)
+                suspects = find_suspects(receipt)
+                lines = [s.line for s in suspects]
+                samples = []
+                for _ in range(args.repeat):
+                    start = time.perf_counter()
+                    crops = processor.crop_lines(encoded, lines, len(raw_lines(receipt)))
+                    samples.append((time.perf_counter() - start) * 1e3)
+                crop_tokens = sum(image_tokens(*size_of(c)) for c in crops if c)
+                decode = f"{answer_tokens / TOKENS_PER_S:.1f} → {ROW_ANSWER_TOKENS / TOKENS_PER_S:.1f}"
+                print(f"{sample['store'][:21]:<22}{scale:>6}{kind:>9}{len(suspects):>5}"
+                      f"{f'{full_tokens} → {crop_tokens}':>16}"
+                      f"{f'{answer_tokens:.0f} → {ROW_ANSWER_TOKENS * len(suspects)}':>12}"
+                      f"{decode:>13}{statistics.median(samples):>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
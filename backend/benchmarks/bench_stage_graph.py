@@ -0,0 +1,96 @@
+"""Measure what the stage graph and the request deadline do to /api/analyze latency.
+
+Replays the pipeline's stages as sleeps with typical (time-scaled) durations,
+once serially as the old five-step pipeline ran them and once through
+``StageGraph``. Categorization has a heavy tail (one call in ten is very
+slow), so the run also shows how the deadline caps the worst case by falling
+back to local categories instead of waiting.
+
+    cd backend && python benchmarks/bench_stage_graph.py [--runs 200] [--scale 0.01] [--deadline 8]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.deadline import deadline  # noqa: E402
+from utils.stage_graph import Stage, StageGraph  # noqa: E402
+
+# Typical seconds per stage on a ~30 item photo
+DURATIONS = {
+    "hash": 0.09, "duplicate": 0.02, "same_image": 0.0, "quality": 0.08, "preprocess": 0.35,
+    "receipt": 5.0, "categorize": 2.0, "price_history": 0.04, "price_anomalies": 0.01,
+    "analysis": 0.01, "insights": 0.02,
+}
+SLOW_CATEGORIZE_S = 20.0     # a stalled categorization call
+SLOW_SHARE = 0.1
+
+
+def stages(durations: dict, scale: float) -> list[Stage]:
+    def sleep(name):
+        return lambda r: time.sleep(durations[name] * scale)
+
+    return [
+        Stage("hash", sleep("hash")),
+        Stage("duplicate", sleep("duplicate"), deps=("hash",)),
+        Stage("same_image", sleep("same_image"), deps=("duplicate",), short_circuit=True),
+        Stage("quality", sleep("quality")),
+        Stage("preprocess", sleep("preprocess"), deps=("quality",)),
+        Stage("receipt", sleep("receipt"), deps=("preprocess", "same_image")),
+        Stage("categorize", sleep("categorize"), deps=("receipt",), fallback=lambda r: None),
+        Stage("price_history", sleep("price_history"), deps=("receipt",)),
+        Stage("price_anomalies", sleep("price_anomalies"), deps=("categorize", "price_history")),
+        Stage("analysis", sleep("analysis"), deps=("categorize", "price_anomalies")),
+        Stage("insights", sleep("insights"), deps=("analysis",), fallback=lambda r: None),
+    ]
+
+
+def percentiles(samples: list) -> tuple:
+    ordered = sorted(samples)
+    return statistics.median(ordered), ordered[int(len(ordered) * 0.95)], ordered[-1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=200)
+    parser.add_argument("--scale", type=float, default=0.01, help="real seconds per simulated second")
+    parser.add_argument("--deadline", type=float, default=8.0, help="simulated seconds")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    pool = ThreadPoolExecutor(max_workers=8)
+    serial, graph, fell_back = [], [], 0
+    for _ in range(args.runs):
+        durations = dict(DURATIONS)
+        if rng.random() < SLOW_SHARE:
+            durations["categorize"] = SLOW_CATEGORIZE_S
+
+        start = time.perf_counter()
+        for seconds in durations.values():
+            time.sleep(seconds * args.scale)
+        serial.append((time.perf_counter() - start) / args.scale)
+
+        start = time.perf_counter()
+        with deadline(args.deadline * args.scale):
+            run = StageGraph(stages(durations, args.scale)).run(pool)
+        graph.append((time.perf_counter() - start) / args.scale)
+        fell_back += bool(run.fell_back)
+
+    print(f"{args.runs} runs, {SLOW_SHARE:.0%} with a {SLOW_CATEGORIZE_S:.0f}s categorization, "
+          f"deadline {args.deadline:.0f}s (simulated seconds)")
+    print(f"{'':<12}{'p50':>8}{'p95':>8}{'max':>8}")
+    for name, samples in (("serial", serial), ("stage graph", graph)):
+        p50, p95, worst = percentiles(samples)
+        print(f"{name:<12}{p50:>8.2f}{p95:>8.2f}{worst:>8.2f}")
+    print(f"fell back to local answers in {fell_back}/{args.runs} runs")
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+if __name__ == "__main__":
+    main()
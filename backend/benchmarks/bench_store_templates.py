@@ -0,0 +1,82 @@
+"""Measure the store-template fast path against the structured vision path.
+
+For receipts of several sizes from a store whose template has been learned,
+compares what the model has to write (the structured JSON answer with its
+embedded raw text vs the raw text alone, in estimated output tokens) and the
+local parse time: the template parse, the generic regex parse, and parsing
+the structured JSON.
+
+Output tokens are estimated at 4 characters per token; at the typical
+~60 tokens/s of a vision model answer, they dominate the OCR call's latency.
+
+    cd backend && python benchmarks/bench_store_templates.py [--sizes 10 30 60] [--repeat 2000]
+"""
+import argparse
+import json
+import logging
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agents.parser_agent import ParserAgent  # noqa: E402
+from agents.store_templates import MIN_OBSERVATIONS, StoreTemplates  # noqa: E402
+from utils.sample_generator import receipt_text  # noqa: E402
+
+STORE, DATE, TAX = "Walmart Supercenter", "02/10/2026", 0.08
+TOKENS_PER_S = 60
+
+
+def items(n: int) -> list:
+    return [(f"Grocery Product {i:03d}", 1 + i % 3, round(1.29 + (i * 0.37) % 9, 2)) for i in range(n)]
+
+
+def vision_json(lines: list) -> dict:
+    rows = [{"name": name, "quantity": qty, "unit_price": price, "total_price": round(qty * price, 2)}
+            for name, qty, price in lines]
+    subtotal = round(sum(r["total_price"] for r in rows), 2)
+    tax = round(subtotal * TAX, 2)
+    return {"store_name": STORE, "date": DATE, "items": rows, "subtotal": subtotal, "tax": tax,
+            "total": round(subtotal + tax, 2), "raw_text": receipt_text(STORE, DATE, lines, TAX)}
+
+
+def time_us(fn, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1e6)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 30, 60])
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+    logging.disable(logging.INFO)        # per-parse log lines would dominate the timings
+
+    trained = ParserAgent(templates=StoreTemplates())
+    for _ in range(MIN_OBSERVATIONS):
+        trained.parse(vision_json(items(12)))
+    generic = ParserAgent()
+
+    print(f"{'items':>5}{'JSON tok':>10}{'text tok':>10}{'~decode s':>16}"
+          f"{'template µs':>13}{'generic µs':>12}{'JSON µs':>9}")
+    for n in args.sizes:
+        data = vision_json(items(n))
+        text = data["raw_text"]
+        assert trained.templates.parse(text) is not None, "template did not validate"
+        json_tokens = len(json.dumps(data)) / 4
+        text_tokens = len(text) / 4
+        decode = f"{json_tokens / TOKENS_PER_S:.1f} → {text_tokens / TOKENS_PER_S:.1f}"
+        print(f"{n:>5}{json_tokens:>10.0f}{text_tokens:>10.0f}{decode:>16}"
+              f"{time_us(lambda: trained.parse(text), args.repeat):>13.0f}"
+              f"{time_us(lambda: generic.parse(text), args.repeat):>12.0f}"
+              f"{time_us(lambda: generic.parse(data), args.repeat):>9.0f}")
+
+
+if __name__ == "__main__":
+    main()
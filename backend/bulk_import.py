@@ -0,0 +1,265 @@
+"""Offline bulk import: run the analysis pipeline over a directory or archive.
+
+Walks a directory (recursively) or a .zip/.tar[.gz] archive for receipt
+images and PDFs, analyzes them with a pool of worker threads calling
+``pipeline.run_analysis`` directly (no HTTP), and writes each result to a
+JSONL file and/or the receipt store.
+
+Progress is checkpointed to a file listing the sources already written, so
+a crashed or interrupted run picks up where it left off. Store ids are
+derived from the source name and path, so a receipt re-processed after a crash
+replaces its earlier row instead of duplicating it.
+
+    cd backend && python bulk_import.py ~/scans --store --workers 8
+    cd backend && python bulk_import.py receipts-2023.zip --jsonl out.jsonl
+"""
+import argparse
+import base64
+import hashlib
+import json
+import os
+import sys
+import tarfile
+import time
+import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+
+RECEIPT_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp", ".pdf")
+
+
+def source_id(key: str) -> str:
+    """Stable receipt id for a source, so re-imports overwrite rather than duplicate."""
+    return hashlib.sha1(key.encode()).hexdigest()[:32]
+
+
+class ReceiptSource:
+    """The receipt files inside a directory or archive, read one at a time."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.name = os.path.basename(os.path.abspath(path).rstrip(os.sep))
+        self._archive = None
+        if os.path.isdir(path):
+            self.keys = sorted(
+                os.path.relpath(os.path.join(root, name), path)
+                for root, _, names in os.walk(path)
+                for name in names
+                if name.lower().endswith(RECEIPT_EXTENSIONS)
+            )
+        elif zipfile.is_zipfile(path):
+            self._archive = zipfile.ZipFile(path)
+            self.keys = sorted(
+                n for n in self._archive.namelist() if n.lower().endswith(RECEIPT_EXTENSIONS)
+            )
+        elif tarfile.is_tarfile(path):
+            self._archive = tarfile.open(path)
+            self.keys = sorted(
+                m.name for m in self._archive.getmembers()
+                if m.isfile() and m.name.lower().endswith(RECEIPT_EXTENSIONS)
+            )
+        else:
+            raise ValueError(f"{path} is not a directory, zip or tar archive")
+
+    def read(self, key: str) -> bytes:
+        if self._archive is None:
+            with open(os.path.join(self.path, key), "rb") as f:
+                return f.read()
+        if isinstance(self._archive, zipfile.ZipFile):
+            return self._archive.read(key)
+        return self._archive.extractfile(key).read()
+
+    def close(self) -> None:
+        if self._archive is not None:
+            self._archive.close()
+
+
+class Checkpoint:
+    """Append-only list of finished source keys, fsynced after every write."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.done: set[str] = set()
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self.done = {line.rstrip("\n") for line in f if line.strip()}
+        self._file = open(path, "a", encoding="utf-8")
+
+    def mark(self, keys: list[str]) -> None:
+        if not keys:
+            return
+        self._file.write("".join(f"{k}\n" for k in keys))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self.done.update(keys)
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class Progress:
+    """Throughput and ETA, printed at most every ``interval`` seconds."""
+
+    def __init__(self, total: int, interval: float = 5.0, out=sys.stderr):
+        self.total = total
+        self.interval = interval
+        self.out = out
+        self.done = 0
+        self.failed = 0
+        self.start = time.time()
+        self._last = 0.0
+
+    def update(self, ok: bool) -> None:
+        self.done += 1
+        self.failed += not ok
+        now = time.time()
+        if now - self._last >= self.interval or self.done == self.total:
+            self._last = now
+            print(self.line(now), file=self.out, flush=True)
+
+    def line(self, now: float = None) -> str:
+        elapsed = (now or time.time()) - self.start
+        rate = self.done / elapsed if elapsed > 0 else 0.0
+        remaining = (self.total - self.done) / rate if rate else 0.0
+        return (
+            f"[{self.done}/{self.total}] {rate * 60:.1f} receipts/min, "
+            f"{self.failed} failed, elapsed {_clock(elapsed)}, ETA {_clock(remaining)}"
+        )
+
+
+def _clock(seconds: float) -> str:
+    minutes, secs = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours:d}:{minutes:02d}:{secs:02d}"
+
+
+def run_import(
+    source: ReceiptSource,
+    analyze: Callable,
+    checkpoint: Checkpoint,
+    jsonl_path: Optional[str] = None,
+    store=None,
+    workers: int = 4,
+    batch_size: int = 20,
+    progress_interval: float = 5.0,
+) -> Progress:
+    """Analyze every unfinished source; returns the final progress counters.
+
+    At most ``2 * workers`` files are read into memory at once. Results are
+    written in batches; only after a batch is durably written are its keys
+    added to the checkpoint.
+    """
+    pending = [k for k in source.keys if k not in checkpoint.done]
+    progress = Progress(len(pending), interval=progress_interval)
+    print(
+        f"{len(source.keys)} receipts found, {len(source.keys) - len(pending)} already imported",
+        file=sys.stderr,
+    )
+    jsonl = open(jsonl_path, "a", encoding="utf-8") if jsonl_path else None
+    batch: list = []
+
+    def flush() -> None:
+        if not batch:
+            return
+        results = [r for _, r in batch if not r.duplicate_of]
+        if jsonl is not None:
+            jsonl.write("".join(
+                f'{{"source": {json.dumps(k)}, "result": {r.model_dump_json()}}}\n' for k, r in batch
+            ))
+            jsonl.flush()
+            os.fsync(jsonl.fileno())
+        if store is not None and results:
+            store.save_many(results)
+        checkpoint.mark([k for k, _ in batch])
+        batch.clear()
+
+    def work(key: str, data: bytes):
+        result = analyze(base64.b64encode(data).decode())
+        if not result.duplicate_of:
+            result.id = source_id(f"{source.name}/{key}")
+        return result
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="import") as pool:
+            in_flight: deque = deque()
+
+            def collect(key, future) -> None:
+                try:
+                    result = future.result()
+                except Exception as e:
+                    print(f"FAILED {key}: {e}", file=sys.stderr)
+                    progress.update(ok=False)
+                    return
+                batch.append((key, result))
+                if len(batch) >= batch_size:
+                    flush()
+                progress.update(ok=True)
+
+            for key in pending:
+                if len(in_flight) >= 2 * workers:
+                    collect(*in_flight.popleft())
+                in_flight.append((key, pool.submit(work, key, source.read(key))))
+            while in_flight:
+                collect(*in_flight.popleft())
+            flush()
+    finally:
+        # Whatever finished before an interruption is still written and checkpointed
+        flush()
+        if jsonl is not None:
+            jsonl.close()
+    return progress
+
+
+def main(argv: list[str] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("source", help="directory, .zip or .tar[.gz] of receipt images/PDFs")
+    parser.add_argument("--jsonl", help="append results to this JSONL file")
+    parser.add_argument("--store", action="store_true", help="save results to the receipt store")
+    parser.add_argument("--db", help="receipt store path (default: RECEIPT_DB_PATH)")
+    parser.add_argument("--checkpoint", help="checkpoint file (default: <source>.checkpoint)")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--batch-size", type=int, default=20)
+    parser.add_argument("--aggressive", action="store_true", help="aggressive image preprocessing")
+    parser.add_argument("--no-dedup", action="store_true", help="analyze re-photographed receipts too")
+    parser.add_argument("--insights", choices=["auto", "local", "llm"], help="insights tier (default: INSIGHTS_MODE)")
+    parser.add_argument("--progress-every", type=float, default=5.0, help="seconds between progress lines")
+    parser.add_argument("--verbose", action="store_true", help="keep per-step pipeline logs")
+    args = parser.parse_args(argv)
+    if not args.jsonl and not args.store:
+        parser.error("choose an output: --jsonl PATH and/or --store")
+
+    # Per-receipt step logs would drown the progress lines; set before any import reads it
+    if not args.verbose:
+        os.environ.setdefault("LOG_LEVEL", "WARNING")
+    if args.db:
+        os.environ["RECEIPT_DB_PATH"] = args.db
+
+    from pipeline import run_analysis
+    from services import get_receipt_store
+
+    source = ReceiptSource(args.source)
+    checkpoint = Checkpoint(args.checkpoint or os.path.abspath(args.source).rstrip(os.sep) + ".checkpoint")
+    try:
+        progress = run_import(
+            source,
+            lambda image: run_analysis(image, args.aggressive, not args.no_dedup, args.insights),
+            checkpoint,
+            jsonl_path=args.jsonl,
+            store=get_receipt_store() if args.store else None,
+            workers=args.workers,
+            batch_size=args.batch_size,
+            progress_interval=args.progress_every,
+        )
+    except KeyboardInterrupt:
+        print("Interrupted — progress saved; rerun the same command to resume.", file=sys.stderr)
+        return 130
+    finally:
+        checkpoint.close()
+        source.close()
+    print(progress.line(), file=sys.stderr)
+    return 1 if progress.failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
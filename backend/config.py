@@ -18,3 +18,82 @@ LLM_MINI_MODEL = "gpt-4o-mini"
 
 MAX_IMAGE_WIDTH = 2000
 IMAGE_QUALITY = 85
+
+# Crop photos to the receipt (dropping the table around it) before OCR, and
+# straighten slightly tilted receipts; either can be switched off with "false"
+RECEIPT_CROP = os.getenv("RECEIPT_CROP", "true").lower() == "true"
+RECEIPT_DESKEW = os.getenv("RECEIPT_DESKEW", "true").lower() == "true"
+
+# Responses larger than this many bytes are gzipped for clients that accept it
+GZIP_MIN_BYTES = int(os.getenv("GZIP_MIN_BYTES", "1000"))
+
+# /api/analyze admission control: at most ADMISSION_MAX_IN_FLIGHT pipeline runs
+# at once and ADMISSION_MAX_QUEUE waiting (for up to ADMISSION_QUEUE_TIMEOUT_S);
+# beyond that requests get 429 + Retry-After. Near capacity, or when recent
+# latency approaches ANALYZE_SLO_S, LLM insights and then aggressive
+# preprocessing are skipped.
+ADMISSION_MAX_IN_FLIGHT = int(os.getenv("ADMISSION_MAX_IN_FLIGHT", "8"))
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "16"))
+ADMISSION_QUEUE_TIMEOUT_S = float(os.getenv("ADMISSION_QUEUE_TIMEOUT_S", "10"))
+ANALYZE_SLO_S = float(os.getenv("ANALYZE_SLO_S", "20"))
+
+# Time budget for one /api/analyze request, queueing included. Model calls get
+# the time left as their timeout; when it runs out, categorization and insights
+# fall back to local answers, and a receipt not yet read gives 504.
+ANALYZE_DEADLINE_S = float(os.getenv("ANALYZE_DEADLINE_S", "60"))
+
+# Learn each store's receipt layout from validated vision results; known stores
+# are then OCRed as plain text and parsed locally ("false" to switch off)
+STORE_TEMPLATES = os.getenv("STORE_TEMPLATES", "true").lower() == "true"
+
+# When a photographed receipt does not add up, re-read only the suspicious rows
+# from cropped strips of the image ("false" to switch off). A receipt with more
+# suspects than ROW_REPAIR_MAX_ROWS is left as read.
+ROW_REPAIR = os.getenv("ROW_REPAIR", "true").lower() == "true"
+ROW_REPAIR_MAX_ROWS = int(os.getenv("ROW_REPAIR_MAX_ROWS", "6"))
+
+# Per-request profiling, for debugging slow receipts. A request carrying this
+# token in an X-Profile header or ?profile= query parameter runs under the
+# sampling profiler; its profile is saved to PROFILE_DIR (/tmp/profiles on
+# Vercel) and fetched from GET /api/profiles/{request id}. Unset: switched off.
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN", "")
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+
+# SQLite receipt history. On Vercel point this at /tmp (the only writable path).
+RECEIPT_DB_PATH = os.getenv("RECEIPT_DB_PATH", "receipts.db")
+
+# History exports read this many rows per page (and per streamed chunk)
+EXPORT_PAGE_SIZE = int(os.getenv("EXPORT_PAGE_SIZE", "1000"))
+
+# /api/categorize-item: misses arriving within this window share one model call
+CATEGORIZE_BATCH_WINDOW_MS = float(os.getenv("CATEGORIZE_BATCH_WINDOW_MS", "20"))
+
+# Logging: "json" or "text" lines; LOG_SAMPLE_RATE is the share of requests
+# whose per-step INFO lines are kept (warnings and summaries always are)
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "1.0"))
+
+# Uploads whose perceptual hash is within DUPLICATE_MAX_DISTANCE bits (of 256)
+# of a stored receipt are duplicate candidates (up to 16 keeps lookups under a
+# millisecond). Within DUPLICATE_REUSE_DISTANCE it is the same picture again
+# (recompressed, resized or re-taken; different receipts of one store's layout
+# sit 40+ bits apart) and the stored result is reused with no vision call;
+# further candidates are first confirmed against the OCR'd store, date, total
+# and item count.
+DUPLICATE_MAX_DISTANCE = int(os.getenv("DUPLICATE_MAX_DISTANCE", "16"))
+DUPLICATE_REUSE_DISTANCE = int(os.getenv("DUPLICATE_REUSE_DISTANCE", "6"))
+
+# PDF uploads: pages beyond PDF_MAX_PAGES are ignored; scanned pages are
+# rendered at PDF_RENDER_DPI and up to PDF_PAGE_CONCURRENCY are OCRed at once
+PDF_MAX_PAGES = int(os.getenv("PDF_MAX_PAGES", "30"))
+PDF_RENDER_DPI = int(os.getenv("PDF_RENDER_DPI", "200"))
+PDF_PAGE_CONCURRENCY = int(os.getenv("PDF_PAGE_CONCURRENCY", "4"))
+
+# Insights: "auto" answers locally and calls the LLM only for receipts with at
+# least INSIGHTS_LLM_MIN_ITEMS items, INSIGHTS_LLM_MIN_TOTAL spent or a price
+# jump against history; "local" never calls it, "llm" always does.
+INSIGHTS_MODE = os.getenv("INSIGHTS_MODE", "auto")
+INSIGHTS_LLM_MIN_ITEMS = int(os.getenv("INSIGHTS_LLM_MIN_ITEMS", "25"))
+INSIGHTS_LLM_MIN_TOTAL = float(os.getenv("INSIGHTS_LLM_MIN_TOTAL", "150"))
@@ -0,0 +1,60 @@
+"""Export receipt history for analysis outside the app.
+
+Writes receipts and line items from the receipt store as Parquet (default)
+or Arrow IPC files, one per month in Hive-style partitions that DuckDB,
+pandas, Spark and ``pyarrow.dataset`` read directly:
+
+    exports/items/month=2026-02/part-0.parquet
+    exports/receipts/month=2026-02/part-0.parquet
+
+Store and category columns are dictionary-encoded. The store is read a page
+at a time (see storage.export), so memory stays flat however long the range.
+--from/--to are widened to whole months, since each month is one file.
+Needs pyarrow (``pip install pyarrow``), which the API does not ship.
+
+    cd backend && python export_history.py exports/ --from 2026-01-01 --to 2026-06-30
+    cd backend && python export_history.py exports/ --format arrow --tables items
+"""
+import argparse
+import os
+import sys
+import time
+
+
+def main(argv: list[str] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description=__doc__.splitlines()[0],
+        epilog="Needs the optional pyarrow package (pip install pyarrow); the API does not ship it.",
+    )
+    parser.add_argument("out", help="directory to write the partitioned files into")
+    parser.add_argument("--format", choices=["parquet", "arrow"], default="parquet")
+    parser.add_argument("--tables", nargs="+", choices=["receipts", "items"], default=["receipts", "items"])
+    parser.add_argument("--from", dest="date_from", help="first purchase date (ISO); starts at its month's first day")
+    parser.add_argument("--to", dest="date_to", help="last purchase date (ISO); runs to its month's last day")
+    parser.add_argument("--db", help="receipt store path (default: RECEIPT_DB_PATH)")
+    args = parser.parse_args(argv)
+
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    from storage.export import write_columnar
+    from storage.receipt_store import ReceiptStore
+
+    store = ReceiptStore(args.db)
+    start = time.perf_counter()
+    try:
+        written = write_columnar(
+            store, args.out, fmt=args.format, tables=args.tables,
+            date_from=args.date_from, date_to=args.date_to,
+        )
+    except (RuntimeError, ValueError) as e:
+        print(e, file=sys.stderr)
+        return 1
+    finally:
+        store.close()
+    for table, info in written.items():
+        print(f"{table}: {info['rows']} rows in {len(info['files'])} month files")
+    print(f"Exported to {args.out} in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 from datetime import datetime
-from typing import List, Optional
+from typing import List, Literal, Optional
 
 from pydantic import BaseModel, Field, model_validator
 
@@ -64,13 +64,51 @@ class LLMInsight(BaseModel):
     recommendations: List[str]
     budget_tips: List[str]
     savings_potential: str
+    source: str = "llm"                      # "llm", "local" (rule-based tier) or "fallback"
 
 
 class AnalysisResult(BaseModel):
+    id: Optional[str] = None                 # set once the result is stored in history
     receipt: Receipt
     spending_analysis: SpendingAnalysis
     llm_insight: LLMInsight
     processed_at: str = Field(default_factory=lambda: datetime.utcnow().isoformat())
+    image_hash: Optional[str] = None         # perceptual hash of the uploaded image
+    duplicate_of: Optional[str] = None       # set when this upload matched a stored receipt
+
+
+class ReceiptSummary(BaseModel):
+    id: str
+    store_name: Optional[str] = None
+    purchase_date: Optional[str] = None      # ISO date, normalized from the receipt
+    total: float
+    item_count: int
+    top_category: Optional[str] = None
+    processed_at: str
+
+
+# --- History aggregation (served from pre-aggregated rollups) ---
+
+class TrendPoint(BaseModel):
+    bucket: str                              # YYYY-MM-DD or YYYY-MM
+    total_spent: float
+    item_count: int
+    receipt_count: int
+    rolling_total: float
+
+
+class CategoryShare(BaseModel):
+    category: str
+    total_spent: float
+    percentage: float
+    item_count: int
+
+
+class StoreComparison(BaseModel):
+    store_name: Optional[str] = None
+    total_spent: float
+    receipt_count: int
+    average_receipt: float
 
 
 # --- API request/response models ---
@@ -78,6 +116,9 @@ class AnalysisResult(BaseModel):
 class AnalyzeRequest(BaseModel):
     image_base64: str
     aggressive_preprocessing: bool = False
+    detect_duplicates: bool = True           # reuse the stored result for a re-photographed receipt
+    insights_mode: Optional[Literal["auto", "local", "llm"]] = None   # default: INSIGHTS_MODE
+    compact: bool = False                    # omit raw_ocr_text and per-category item name lists
 
 
 class AnalyzeResponse(BaseModel):
@@ -85,3 +126,37 @@ class AnalyzeResponse(BaseModel):
     data: Optional[AnalysisResult] = None
     error: Optional[str] = None
     processing_time: float = 0.0
+
+
+class ItemEdit(BaseModel):
+    """One change to a stored receipt's items; unset fields keep their stored value."""
+    index: Optional[int] = None              # position in the stored receipt; None adds an item
+    remove: bool = False
+    name: Optional[str] = None
+    quantity: Optional[float] = None
+    unit_price: Optional[float] = None
+    total_price: Optional[float] = None
+    category: Optional[str] = None           # a renamed item without one is re-categorized
+
+
+class ReanalyzeRequest(BaseModel):
+    receipt: Optional[Receipt] = None        # the whole edited receipt...
+    edits: List[ItemEdit] = []               # ...or item changes against the stored one
+    store_name: Optional[str] = None
+    date: Optional[str] = None
+    tax: Optional[float] = None
+    insights_mode: Optional[Literal["auto", "local", "llm"]] = None   # default: INSIGHTS_MODE
+    compact: bool = False
+
+
+class ReanalyzeResponse(AnalyzeResponse):
+    recomputed: List[str] = []               # parts redone: categorization, breakdown, anomalies, insights
+    categorized: int = 0                     # items sent to categorization
+    insights_reason: Optional[str] = None    # why insights were regenerated, if they were
+
+
+class ReceiptListResponse(BaseModel):
+    receipts: List[ReceiptSummary]
+    count: int
+    limit: int
+    offset: int
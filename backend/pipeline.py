@@ -0,0 +1,439 @@
+"""The receipt analysis pipeline, independent of the HTTP layer.
+
+Used by ``POST /api/analyze`` (inside the threadpool) and by offline tools;
+``reanalyze`` serves ``POST /api/receipts/{id}/reanalyze``.
+"""
+import contextvars
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+from config import (
+    ANALYZE_DEADLINE_S,
+    DUPLICATE_REUSE_DISTANCE,
+    PDF_PAGE_CONCURRENCY,
+    ROW_REPAIR,
+    ROW_REPAIR_MAX_ROWS,
+)
+from agents.store_templates import TemplateText
+from models.data_models import AnalysisResult, ReanalyzeRequest, Receipt, SpendingAnalysis
+from services import (
+    get_analysis_agent,
+    get_image_index,
+    get_image_processor,
+    get_insight_router,
+    get_ocr_agent,
+    get_parser_agent,
+    get_pdf_processor,
+    get_receipt_store,
+    get_row_repair_agent,
+)
+from utils.admission import track_model_call
+from utils.deadline import DeadlineExceeded, deadline
+from utils.image_quality import ImageQualityError, assess
+from utils.logger import ALWAYS, get_logger
+from utils.pdf_processor import is_pdf
+from utils.profiling import traced
+from utils.stage_graph import Stage, StageGraph
+
+logger = get_logger(__name__)
+
+STAGE_WORKERS = 16     # shared by concurrent requests; stages only wait on their own deps
+
+
+def find_duplicate(image_hash: str) -> tuple[AnalysisResult, int] | None:
+    """The stored result whose image looks nearly identical, and its hash distance."""
+    match = get_image_index().find(image_hash)
+    if match is None:
+        return None
+    receipt_id, distance = match
+    stored = get_receipt_store().get(receipt_id)
+    if stored is None:
+        return None
+    logger.info("Image close to receipt %s (distance %d)", receipt_id, distance)
+    return stored, distance
+
+
+def same_image(match: tuple[AnalysisResult, int] | None) -> AnalysisResult | None:
+    """The stored result, flagged, when the upload is the same picture again.
+
+    Within DUPLICATE_REUSE_DISTANCE bits only a recompressed, resized or
+    re-taken copy of the image matches, so no OCR is needed to confirm it.
+    """
+    if match is None or match[1] > DUPLICATE_REUSE_DISTANCE:
+        return None
+    return _reuse(match[0])
+
+
+def same_receipt(stored: Receipt, read: Receipt) -> bool:
+    """Whether ``read`` has the store, date, total and item count of ``stored``."""
+    from storage.receipt_store import normalize_date
+
+    def store(receipt: Receipt) -> str:
+        return " ".join((receipt.store_name or "").casefold().split())
+
+    return (
+        read.total > 0
+        and abs(read.total - stored.total) <= 0.01
+        and len(read.items) == len(stored.items)
+        and store(read) == store(stored)
+        and normalize_date(read.date) == normalize_date(stored.date)
+    )
+
+
+def confirm_duplicate(match: tuple[AnalysisResult, int] | None, receipt: Receipt) -> AnalysisResult | None:
+    """The candidate flagged with ``duplicate_of`` if the freshly read ``receipt`` is the same one.
+
+    Further from the stored image than same_image accepts, receipts printed
+    from one template can look alike to the hash, so the stored result is
+    reused only when the OCR agrees.
+    """
+    if match is None:
+        return None
+    candidate = match[0]
+    if not same_receipt(candidate.receipt, receipt):
+        logger.info("Receipt %s only looks alike; analyzing this one", candidate.id)
+        return None
+    return _reuse(candidate)
+
+
+def _reuse(candidate: AnalysisResult) -> AnalysisResult:
+    logger.info(
+        "Duplicate of receipt %s, reusing stored result", candidate.id,
+        extra={**ALWAYS, "duplicate_of": candidate.id},
+    )
+    return candidate.model_copy(update={"duplicate_of": candidate.id})
+
+
+def ocr_image(processed_image: str) -> dict | str:
+    """OCR one preprocessed image: structured JSON, or raw text the parser can read.
+
+    Once store templates are learned, the image is first read as plain text
+    (a shorter model answer than the structured JSON). If the text comes from
+    a known store and its template validates, the parser reads it locally;
+    otherwise the structured call runs as before.
+    """
+    with track_model_call():
+        text, hit = _known_store_text(processed_image)
+        if hit:
+            return text
+        try:
+            return get_ocr_agent().extract_structured_data(processed_image)
+        except DeadlineExceeded:
+            raise
+        except Exception as e:
+            logger.warning("Structured OCR failed (%s), falling back to raw text", e)
+            if text is None:
+                text = get_ocr_agent().extract_text(processed_image)["extracted_text"]
+            return get_ocr_agent().postprocess_text(text)
+
+
+def _known_store_text(processed_image: str) -> tuple[str | None, bool]:
+    """(raw text, whether a store template reads it), if text-first OCR is worth a try.
+
+    On a hit the text is a TemplateText carrying the template's reading, so
+    the parser does not parse it again.
+    """
+    templates = get_parser_agent().templates
+    if templates is None or not templates.worth_trying():
+        return None, False
+    try:
+        text = get_ocr_agent().extract_text(processed_image)["extracted_text"]
+    except DeadlineExceeded:
+        raise
+    except Exception as e:
+        logger.warning("Text-first OCR failed (%s), using structured OCR", e)
+        return None, False
+    fields = templates.parse(text)
+    hit = fields is not None
+    templates.record(text, hit)
+    logger.info("Store template %s", "hit" if hit else "miss", extra={"template_hit": hit})
+    return (TemplateText(text, fields) if hit else text), hit
+
+
+def repair_receipt(receipt: Receipt, processed_image: str) -> Receipt:
+    """The receipt with suspicious rows re-read from crops of the image, when it doesn't add up.
+
+    Only the rows that could explain the mismatch are cropped and re-read,
+    concurrently, instead of OCRing the whole image again. The corrections
+    are kept only if the receipt then adds up better; any failure returns
+    the receipt as read.
+    """
+    if not ROW_REPAIR:
+        return receipt
+    from agents.row_repair import find_suspects, patch_receipt, raw_lines
+
+    suspects = find_suspects(receipt)
+    if not suspects:
+        return receipt
+    if len(suspects) > ROW_REPAIR_MAX_ROWS:
+        logger.info("%d suspicious rows, too many to re-read", len(suspects))
+        return receipt
+    try:
+        crops = get_image_processor().crop_lines(
+            processed_image, [s.line for s in suspects], len(raw_lines(receipt))
+        )
+        readings = get_row_repair_agent().reread(receipt, suspects, crops)
+    except Exception as e:        # DeadlineExceeded included: the receipt as read still stands
+        logger.warning("Row re-reading failed (%s), keeping the receipt as read", e)
+        return receipt
+    patched = patch_receipt(receipt, suspects, readings)
+    logger.info(
+        "Re-read %d rows", len(suspects),
+        extra={"step": "row_repair", "rows": [s.kind for s in suspects], "patched": patched is not receipt},
+    )
+    return patched
+
+
+def extract_pdf_receipt(pdf_base64: str, aggressive: bool = False) -> Receipt:
+    """Turn a (possibly multi-page) PDF into one Receipt.
+
+    Pages with a text layer go straight to the parser; scanned pages are
+    rendered and OCRed in a thread pool; blank pages (e.g. the back of a
+    scanned sheet) are skipped and sideways pages turned upright first.
+    Pages are pulled from the document one at a time and at most
+    ``PDF_PAGE_CONCURRENCY`` rendered pages are in flight, so memory stays
+    bounded however long the document is.
+    """
+    parser = get_parser_agent()
+    processor = get_image_processor()
+    pages: dict[int, dict] = {}
+    in_flight: deque = deque()
+    scanned = 0
+
+    def ocr_page(image) -> dict:
+        try:
+            rotation, _ = assess(image)
+        except ImageQualityError as e:
+            if e.reason in ("blank", "no_text"):
+                logger.info("Skipping empty PDF page (%s)", e.reason)
+                return {}
+            rotation = 0      # a rendered page is OCRed even when it looks poor
+        if rotation:
+            image = image.rotate(rotation, expand=True)
+        return parser.parse_page(ocr_image(processor.preprocess_image(image, aggressive)))
+
+    with ThreadPoolExecutor(max_workers=PDF_PAGE_CONCURRENCY, thread_name_prefix="pdf-page") as pool:
+        for number, text, image in get_pdf_processor().iter_pages(pdf_base64):
+            if text is not None:
+                pages[number] = parser.parse_page(text)
+                continue
+            scanned += 1
+            if len(in_flight) >= PDF_PAGE_CONCURRENCY:
+                done, future = in_flight.popleft()
+                pages[done] = future.result()
+            # A copied context keeps the request id on the worker's log lines
+            future = pool.submit(contextvars.copy_context().run, traced("pdf-page", ocr_page), image)
+            in_flight.append((number, future))
+        for done, future in in_flight:
+            pages[done] = future.result()
+
+    logger.info("PDF: %d pages, %d scanned", len(pages), scanned, extra={"step": "pdf"})
+    return parser.merge_pages([pages[n] for n in sorted(pages)])
+
+
+@lru_cache(maxsize=1)
+def _stage_pool() -> ThreadPoolExecutor:
+    return ThreadPoolExecutor(max_workers=STAGE_WORKERS, thread_name_prefix="stage")
+
+
+def analysis_stages(
+    image_base64: str,
+    aggressive: bool = False,
+    detect_duplicates: bool = True,
+    insights_mode: str = None,
+) -> list[Stage]:
+    """The pipeline as a stage graph; ``receipt`` and ``insights`` are always present.
+
+    Images: the duplicate lookup runs beside the quality gate and
+    preprocessing. The same picture again ends the run before OCR; a
+    look-alike stored receipt ends it once the OCR agrees. Rows that don't add up are then re-read (skipped past the
+    deadline). Then categorization (model calls)
+    runs beside the item price-history lookup; price anomalies, which fall
+    back to category history, follow categorization. Past the deadline,
+    categorization and insights fall back to local answers.
+    """
+    start = time.time()
+
+    def read_receipt(receipt: Receipt) -> Receipt:
+        receipt.processing_time = time.time() - start
+        return receipt
+
+    if is_pdf(image_base64):
+        # Text layer or per-page OCR
+        stages = [Stage("receipt", lambda r: read_receipt(extract_pdf_receipt(image_base64, aggressive=aggressive)))]
+    else:
+        processor = get_image_processor()
+        stages = [
+            Stage("hash", lambda r: processor.perceptual_hash(image_base64)),
+            Stage(
+                "duplicate",
+                lambda r: find_duplicate(r["hash"]) if detect_duplicates and r["hash"] else None,
+                deps=("hash",),
+            ),
+            # The same picture again needs no OCR
+            Stage("same_image", lambda r: same_image(r["duplicate"]), deps=("duplicate",), short_circuit=True),
+            # Quality gate, then preprocessing
+            Stage("quality", lambda r: processor.check_quality(image_base64)),
+            Stage(
+                "preprocess",
+                lambda r: processor.preprocess(image_base64, aggressive=aggressive, rotation=r["quality"]),
+                deps=("quality",),
+            ),
+            # OCR (structured first, raw text as a fallback) and parsing
+            Stage(
+                "ocr",
+                lambda r: get_parser_agent().parse(ocr_image(r["preprocess"])),
+                deps=("preprocess", "same_image"),
+            ),
+            # A look-alike stored receipt is reused only if the OCR agrees
+            Stage(
+                "same_receipt",
+                lambda r: confirm_duplicate(r["duplicate"], r["ocr"]),
+                deps=("ocr", "duplicate"), short_circuit=True,
+            ),
+            # Rows that keep the receipt from adding up are re-read from crops
+            Stage(
+                "receipt",
+                lambda r: read_receipt(repair_receipt(r["ocr"], r["preprocess"])),
+                deps=("ocr", "same_receipt"),
+                fallback=lambda r: read_receipt(r["ocr"]),
+            ),
+        ]
+
+    def price_anomalies(r: dict) -> list[str]:
+        categorized = r["receipt"].model_copy(update={"items": r["categorize"]})
+        return get_analysis_agent().price_anomalies(categorized, r["price_history"])
+
+    def analysis(r: dict) -> SpendingAnalysis:
+        r["receipt"].items = r["categorize"]
+        return get_analysis_agent().summarize(r["receipt"], r["price_anomalies"])
+
+    return stages + [
+        Stage(
+            "categorize",
+            lambda r: get_analysis_agent().categorize(r["receipt"].items),
+            deps=("receipt",),
+            fallback=lambda r: get_analysis_agent().categorize_locally(r["receipt"].items),
+        ),
+        # Item history needs no categories; the category fallback does
+        Stage("price_history", lambda r: get_analysis_agent().item_price_history(r["receipt"].items), deps=("receipt",)),
+        Stage("price_anomalies", price_anomalies, deps=("categorize", "price_history")),
+        Stage("analysis", analysis, deps=("categorize", "price_anomalies")),
+        # Local engine, escalating to the LLM only when worthwhile
+        Stage(
+            "insights",
+            lambda r: get_insight_router().generate(r["analysis"], r["receipt"], mode=insights_mode),
+            deps=("analysis",),
+            fallback=lambda r: get_insight_router().engine.generate(r["analysis"], r["receipt"]),
+        ),
+    ]
+
+
+def run_analysis(
+    image_base64: str,
+    aggressive: bool = False,
+    detect_duplicates: bool = True,
+    insights_mode: str = None,
+    deadline_s: float = None,
+) -> AnalysisResult:
+    """Run preprocessing → OCR → parsing → analysis → insights for one upload.
+
+    The upload is an image or a PDF (detected from its content). A
+    re-photographed receipt already in history short-circuits to its stored
+    result once OCR confirms it (no categorization or insights) unless
+    ``detect_duplicates`` is False. Unusable
+    photos raise ``ImageQualityError`` before any model call.
+    ``insights_mode`` picks the insights tier (see agents.local_insights).
+
+    The run gets ``deadline_s`` seconds (ANALYZE_DEADLINE_S by default).
+    When they run out the best result so far is returned, or
+    ``DeadlineExceeded`` raised if the receipt itself could not be read.
+    """
+    start = time.time()
+    stages = analysis_stages(image_base64, aggressive, detect_duplicates, insights_mode)
+    with deadline(ANALYZE_DEADLINE_S if deadline_s is None else deadline_s):
+        run = StageGraph(stages).run(_stage_pool())
+    if run.stopped_by:
+        return run.result
+
+    receipt = run.results["receipt"]
+    llm_insight = run.results["insights"]
+    # One unsampled summary line carries the per-stage timings
+    logger.info(
+        "Pipeline finished: %d items, %.2fs", len(receipt.items), time.time() - start,
+        extra={**ALWAYS, "timings": run.timings, "insights": llm_insight.source, "fell_back": run.fell_back},
+    )
+
+    return AnalysisResult(
+        id=uuid.uuid4().hex,
+        image_hash=run.results.get("hash"),
+        receipt=receipt,
+        spending_analysis=run.results["analysis"],
+        llm_insight=llm_insight,
+    )
+
+
+def reanalyze(stored: AnalysisResult, request: ReanalyzeRequest) -> tuple[AnalysisResult, dict]:
+    """``stored`` with a user's edits applied, redoing only the parts they affect.
+
+    Only renamed or added items without a category of their own are
+    categorized, and categories the user picked teach the local categorizer.
+    The breakdown is updated from the items that changed, and price
+    anomalies are looked up again (one batched history query) only if any
+    did. Insights are regenerated only when the analysis changed materially
+    (see agents.reanalysis.material_change); otherwise the stored ones stay.
+
+    Returns the new result, under the stored id, and what was recomputed
+    (``recomputed``, ``categorized``, ``insights_reason``). Raises ValueError
+    for edits that don't fit the stored receipt.
+    """
+    from agents.reanalysis import apply_edits, edited_receipt, item_changes, material_change
+
+    start = time.time()
+    if request.receipt is not None:
+        receipt, recategorize, picked = edited_receipt(stored.receipt, request.receipt)
+    else:
+        receipt, recategorize, picked = apply_edits(stored.receipt, request.edits)
+        if request.edits or request.tax is not None:
+            # The printed subtotal and total no longer describe the edited items
+            subtotal = round(sum(i.total_price for i in receipt.items), 2)
+            tax = stored.receipt.tax if request.tax is None else request.tax
+            receipt = receipt.model_copy(update={"subtotal": subtotal, "tax": tax, "total": round(subtotal + tax, 2)})
+    receipt = receipt.model_copy(update={
+        field: value for field, value in (("store_name", request.store_name), ("date", request.date))
+        if value is not None
+    })
+
+    recomputed = []
+    agent = get_analysis_agent()
+    with deadline(ANALYZE_DEADLINE_S):
+        if recategorize:
+            categorized = agent.categorize([receipt.items[i] for i in recategorize])
+            for index, item in zip(recategorize, categorized):
+                receipt.items[index] = item
+            recomputed.append("categories")
+        agent.learn([receipt.items[i] for i in picked])
+
+        removed, added = item_changes(stored.receipt.items, receipt.items)
+        analysis = stored.spending_analysis
+        if removed or added:
+            analysis = agent.update_summary(analysis, receipt, removed, added, agent.price_anomalies(receipt))
+            recomputed += ["breakdown", "anomalies"]
+
+        llm_insight = stored.llm_insight
+        reason = material_change(stored.spending_analysis, analysis)
+        if reason:
+            llm_insight = get_insight_router().generate(analysis, receipt, mode=request.insights_mode)
+            recomputed.append("insights")
+
+    logger.info(
+        "Reanalyzed %s: %d changed items, %.2fs", stored.id, len(removed) + len(added), time.time() - start,
+        extra={**ALWAYS, "recomputed": recomputed, "insights_reason": reason},
+    )
+    result = stored.model_copy(update={
+        "receipt": receipt, "spending_analysis": analysis, "llm_insight": llm_insight, "duplicate_of": None,
+    })
+    return result, {"recomputed": recomputed, "categorized": len(recategorize), "insights_reason": reason}
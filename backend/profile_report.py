@@ -0,0 +1,158 @@
+"""Aggregate request profiles, optionally profiling a corpus of receipts first.
+
+Reads the JSON profiles written by utils.profiling: those saved by the API
+for requests sent with the profiling token, or those this tool writes when
+given ``--corpus``. For ``--corpus``, each receipt in a directory or archive
+is run through ``pipeline.run_analysis`` (no HTTP) under the profiler, one at
+a time so that samples are not skewed by concurrent runs.
+
+The summary shows wall-time percentiles, and thread-seconds per bucket
+(network, waiting, image, validation, json, parsing, other CPU). It also
+shows time per pipeline stage, the hottest frames and the slowest receipts.
+``--folded`` writes every profile's stacks merged into one file for
+flamegraph.pl or speedscope.
+
+    cd backend && python profile_report.py profiles/
+    cd backend && python profile_report.py --corpus ~/scans --out profiles/ --folded corpus.folded
+"""
+import argparse
+import glob
+import os
+import statistics
+import sys
+import time
+from collections import Counter, defaultdict
+
+from utils import profiling
+
+TOP = 15
+
+
+def profile_corpus(source, out_dir: str, analyze, interval: float = profiling.DEFAULT_INTERVAL_S) -> list[str]:
+    """Profile ``analyze(image_base64)`` on every receipt of a ReceiptSource; the saved paths."""
+    import base64
+
+    paths = []
+    for key in source.keys:
+        image = base64.b64encode(source.read(key)).decode()
+        with profiling.session(os.path.splitext(key)[0], interval) as profile:
+            try:
+                with profiling.span("pipeline"):
+                    analyze(image)
+            except Exception as e:
+                # A failing receipt's profile is still worth keeping
+                print(f"{key}: {e}", file=sys.stderr)
+        paths.append(profile.save(out_dir))
+    return paths
+
+
+def aggregate(reports: list[dict]) -> dict:
+    """Totals across profiles: wall percentiles, buckets, stages, hot frames, slowest runs."""
+    walls = sorted(r["wall_s"] for r in reports)
+    buckets = Counter()
+    hot = Counter()
+    stages = defaultdict(lambda: {"count": 0, "wall_s": 0.0, "cpu_s": 0.0})
+    for report in reports:
+        buckets.update(report["breakdown_s"])
+        hot.update({h["frame"]: h["samples"] for h in report["hot"]})
+        for span in report["spans"]:
+            stage = stages[span["name"]]
+            stage["count"] += 1
+            stage["wall_s"] += span["wall_s"]
+            stage["cpu_s"] += span["cpu_s"]
+    sampled = sum(buckets.values()) or 1
+    return {
+        "profiles": len(reports),
+        "wall_s": {
+            "p50": round(statistics.median(walls), 3) if walls else 0.0,
+            "p95": round(walls[int(0.95 * (len(walls) - 1))], 3) if walls else 0.0,
+            "max": round(walls[-1], 3) if walls else 0.0,
+            "total": round(sum(walls), 3),
+        },
+        "cpu_s": round(sum(r["cpu_s"] for r in reports), 3),
+        "awaiting_s": round(sum(r["awaiting_s"] for r in reports), 3),
+        "buckets": {
+            name: {"seconds": round(buckets[name], 3), "share": round(buckets[name] / sampled, 3)}
+            for name in profiling.BUCKET_NAMES
+        },
+        "stages": {
+            name: {k: round(v, 3) if isinstance(v, float) else v for k, v in stage.items()}
+            for name, stage in sorted(stages.items(), key=lambda kv: -kv[1]["wall_s"])
+        },
+        "hot": hot.most_common(TOP),
+        "slowest": [(r["label"], r["wall_s"]) for r in sorted(reports, key=lambda r: -r["wall_s"])[:TOP]],
+    }
+
+
+def merge_folded(reports: list[dict]) -> Counter:
+    folded = Counter()
+    for report in reports:
+        folded.update(report["folded"])
+    return folded
+
+
+def format_summary(summary: dict) -> str:
+    wall = summary["wall_s"]
+    lines = [
+        f"{summary['profiles']} profiles  wall p50 {wall['p50']:.2f}s  p95 {wall['p95']:.2f}s  "
+        f"max {wall['max']:.2f}s  cpu {summary['cpu_s']:.2f}s  awaiting {summary['awaiting_s']:.2f}s",
+        "",
+        f"{'bucket':<14}{'thread-s':>10}{'share':>8}",
+    ]
+    lines += [f"{name:<14}{b['seconds']:>10.2f}{b['share']:>8.1%}" for name, b in summary["buckets"].items()]
+    lines += ["", f"{'stage':<18}{'runs':>6}{'wall s':>10}{'cpu s':>9}"]
+    lines += [
+        f"{name:<18}{s['count']:>6}{s['wall_s']:>10.2f}{s['cpu_s']:>9.2f}" for name, s in summary["stages"].items()
+    ]
+    lines += ["", "hottest frames (samples)"]
+    lines += [f"{n:>8}  {frame}" for frame, n in summary["hot"]]
+    lines += ["", "slowest"]
+    lines += [f"{seconds:>8.2f}s {label}" for label, seconds in summary["slowest"]]
+    return "\n".join(lines)
+
+
+def main(argv: list[str] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("profiles", nargs="*", help="profile JSON files or directories of them")
+    parser.add_argument("--corpus", help="directory, .zip or .tar[.gz] of receipts to profile first")
+    parser.add_argument("--out", default="profiles", help="where --corpus profiles are written")
+    parser.add_argument("--interval-ms", type=float, default=profiling.DEFAULT_INTERVAL_S * 1000)
+    parser.add_argument("--insights", choices=["auto", "local", "llm"], help="insights tier for --corpus runs")
+    parser.add_argument("--folded", help="write the merged folded stacks here")
+    args = parser.parse_args(argv)
+    if not args.profiles and not args.corpus:
+        parser.error("give profile files/directories and/or --corpus")
+
+    paths = []
+    if args.corpus:
+        os.environ.setdefault("LOG_LEVEL", "WARNING")
+        from bulk_import import ReceiptSource
+        from pipeline import run_analysis
+
+        source = ReceiptSource(args.corpus)
+        start = time.perf_counter()
+        try:
+            paths += profile_corpus(
+                source, args.out,
+                lambda image: run_analysis(image, False, False, args.insights),
+                interval=args.interval_ms / 1000,
+            )
+        finally:
+            source.close()
+        print(f"Profiled {len(source.keys)} receipts in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+    for path in args.profiles:
+        paths += sorted(glob.glob(os.path.join(path, "*.json"))) if os.path.isdir(path) else [path]
+
+    reports = [profiling.load(path) for path in dict.fromkeys(paths)]
+    if not reports:
+        print("No profiles found", file=sys.stderr)
+        return 1
+    print(format_summary(aggregate(reports)))
+    if args.folded:
+        with open(args.folded, "w") as f:
+            f.writelines(f"{stack} {n}\n" for stack, n in merge_folded(reports).most_common())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,89 @@
+"""Process-wide agent and storage singletons, built on first use.
+
+Nothing here is constructed at import time: on a serverless cold start the
+API module loads without touching the openai SDK, PIL or the database, and
+each component is created the first time a request actually needs it.
+Agents share one OpenAI client via utils.openai_client.get_client.
+"""
+from functools import lru_cache
+
+from config import STORE_TEMPLATES
+
+
+@lru_cache(maxsize=None)
+def get_receipt_store():
+    from storage.receipt_store import ReceiptStore
+    return ReceiptStore()
+
+
+@lru_cache(maxsize=None)
+def get_aggregator():
+    from storage.aggregation import SpendingAggregator
+    return SpendingAggregator(get_receipt_store())
+
+
+@lru_cache(maxsize=None)
+def get_image_index():
+    from storage.image_index import ImageIndex
+    return ImageIndex(get_receipt_store())
+
+
+@lru_cache(maxsize=None)
+def get_image_processor():
+    from utils.image_processor import ImageProcessor
+    return ImageProcessor()
+
+
+@lru_cache(maxsize=None)
+def get_pdf_processor():
+    from utils.pdf_processor import PDFProcessor
+    return PDFProcessor()
+
+
+@lru_cache(maxsize=None)
+def get_ocr_agent():
+    from agents.ocr_agent import OCRAgent
+    return OCRAgent()
+
+
+@lru_cache(maxsize=None)
+def get_parser_agent():
+    from agents.parser_agent import ParserAgent
+
+    if not STORE_TEMPLATES:
+        return ParserAgent()
+    from agents.store_templates import StoreTemplates
+    return ParserAgent(templates=StoreTemplates.from_store(get_receipt_store()))
+
+
+@lru_cache(maxsize=None)
+def get_row_repair_agent():
+    from agents.row_repair import RowRepairAgent
+    return RowRepairAgent()
+
+
+@lru_cache(maxsize=None)
+def get_analysis_agent():
+    from agents.analysis_agent import AnalysisAgent
+    from agents.category_canonicalizer import CategoryCanonicalizer
+    from agents.local_categorizer import LocalCategorizer
+    from storage.price_baseline import PriceBaseline
+
+    store = get_receipt_store()
+    return AnalysisAgent(
+        baseline=PriceBaseline(store),
+        categorizer=LocalCategorizer.from_store(store),
+        canonicalizer=CategoryCanonicalizer.from_store(store),
+    )
+
+
+@lru_cache(maxsize=None)
+def get_llm_agent():
+    from agents.llm_agent import LLMAgent
+    return LLMAgent()
+
+
+@lru_cache(maxsize=None)
+def get_insight_router():
+    from agents.local_insights import InsightRouter, LocalInsightEngine
+    return InsightRouter(LocalInsightEngine(get_aggregator()), get_llm_agent)
@@ -0,0 +1,132 @@
+from typing import Optional
+
+from models.data_models import CategoryShare, StoreComparison, TrendPoint
+from storage.receipt_store import ReceiptStore
+
+GRAIN_WIDTH = {"day": 10, "month": 7}
+
+
+class SpendingAggregator:
+    """Trend, category-share and store queries over stored receipt history.
+
+    All queries read the pre-aggregated ``spending_rollups`` table, which the
+    store updates incrementally on every insert, so cost scales with the
+    number of buckets rather than the number of receipts.
+    """
+
+    def __init__(self, store: ReceiptStore):
+        self.store = store
+
+    def trends(
+        self,
+        grain: str = "month",
+        category: Optional[str] = None,
+        store_name: Optional[str] = None,
+        date_from: Optional[str] = None,
+        date_to: Optional[str] = None,
+        window: int = 3,
+    ) -> list[TrendPoint]:
+        """Spending per period with a rolling total over the last ``window`` periods."""
+        where, params = self._filters(grain, date_from, date_to)
+        where.append("category = :category")
+        params["category"] = category or ""
+        if store_name is not None:
+            where.append("store_name = :store_name")
+            params["store_name"] = store_name
+        params["preceding"] = max(window, 1) - 1
+
+        rows = self.store.query(
+            f"""
+            SELECT bucket, total_spent, item_count, receipt_count,
+                   round(SUM(total_spent) OVER (
+                       ORDER BY bucket ROWS BETWEEN :preceding PRECEDING AND CURRENT ROW
+                   ), 2) AS rolling_total
+            FROM (
+                SELECT bucket, round(SUM(total_spent), 2) AS total_spent,
+                       SUM(item_count) AS item_count, SUM(receipt_count) AS receipt_count
+                FROM spending_rollups
+                WHERE {' AND '.join(where)}
+                GROUP BY bucket
+            )
+            ORDER BY bucket
+            """,
+            params,
+        )
+        return [TrendPoint(**dict(row)) for row in rows]
+
+    def category_shares(
+        self,
+        grain: str = "month",
+        date_from: Optional[str] = None,
+        date_to: Optional[str] = None,
+    ) -> list[CategoryShare]:
+        """Each category's total and share of all spending in the date range."""
+        where, params = self._filters(grain, date_from, date_to)
+        rows = self.store.query(
+            f"""
+            SELECT category, round(SUM(total_spent), 2) AS total_spent,
+                   SUM(item_count) AS item_count
+            FROM spending_rollups
+            WHERE {' AND '.join(where)} AND category != ''
+            GROUP BY category
+            ORDER BY total_spent DESC
+            """,
+            params,
+        )
+        grand_total = sum(row["total_spent"] for row in rows)
+        return [
+            CategoryShare(
+                **dict(row),
+                percentage=round(row["total_spent"] / grand_total * 100, 1) if grand_total else 0.0,
+            )
+            for row in rows
+        ]
+
+    def store_comparison(
+        self,
+        grain: str = "month",
+        category: Optional[str] = None,
+        date_from: Optional[str] = None,
+        date_to: Optional[str] = None,
+    ) -> list[StoreComparison]:
+        """Per-store totals and average basket size in the date range."""
+        where, params = self._filters(grain, date_from, date_to)
+        where.append("category = :category")
+        params["category"] = category or ""
+        rows = self.store.query(
+            f"""
+            SELECT store_name, round(SUM(total_spent), 2) AS total_spent,
+                   SUM(receipt_count) AS receipt_count
+            FROM spending_rollups
+            WHERE {' AND '.join(where)}
+            GROUP BY store_name
+            ORDER BY total_spent DESC
+            """,
+            params,
+        )
+        return [
+            StoreComparison(
+                store_name=row["store_name"] or None,
+                total_spent=row["total_spent"],
+                receipt_count=row["receipt_count"],
+                average_receipt=round(row["total_spent"] / row["receipt_count"], 2)
+                if row["receipt_count"] else 0.0,
+            )
+            for row in rows
+        ]
+
+    def _filters(
+        self, grain: str, date_from: Optional[str], date_to: Optional[str]
+    ) -> tuple[list[str], dict]:
+        if grain not in GRAIN_WIDTH:
+            raise ValueError(f"grain must be one of {sorted(GRAIN_WIDTH)}, got '{grain}'")
+        width = GRAIN_WIDTH[grain]
+        where, params = ["grain = :grain"], {"grain": grain}
+        # Truncate ISO dates to the bucket width so month queries accept full dates
+        if date_from:
+            where.append("bucket >= :date_from")
+            params["date_from"] = date_from[:width]
+        if date_to:
+            where.append("bucket <= :date_to")
+            params["date_to"] = date_to[:width]
+        return where, params
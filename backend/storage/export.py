@@ -0,0 +1,246 @@
+"""Receipt history export, read from the store a page at a time.
+
+Rows are read in (purchase_date, rowid) order with keyset paging: each page
+starts after the last row of the previous one, along the date index, so
+memory holds one page and a late page costs what the first did, whatever
+the date range. OFFSET paging would re-scan every skipped row.
+
+``stream_rows`` renders the pages as CSV or NDJSON chunks for HTTP
+downloads. ``write_columnar`` writes Parquet or Arrow IPC files partitioned
+by month (``items/month=2026-02/part-0.parquet``), with the store and
+category columns dictionary-encoded. It needs pyarrow, which is imported
+only there: it is too large to ship with the API.
+"""
+import calendar
+import csv
+import io
+import os
+from datetime import date, datetime
+from typing import Iterable, Iterator, Optional
+
+import orjson
+
+from config import EXPORT_PAGE_SIZE
+
+TABLES = {
+    "items": (
+        "receipt_id", "position", "purchase_date", "store_name", "name", "category",
+        "quantity", "unit_price", "total_price",
+    ),
+    "receipts": (
+        "id", "purchase_date", "store_name", "subtotal", "tax", "total",
+        "item_count", "top_category", "processed_at",
+    ),
+}
+# Few distinct values repeated on every row
+DICTIONARY_COLUMNS = {"store_name", "category", "top_category"}
+FORMATS = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+COLUMNAR_FORMATS = {"parquet": "parquet", "arrow": "arrow"}   # format -> file extension
+
+
+def iter_pages(
+    store,
+    table: str,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    page_size: int = EXPORT_PAGE_SIZE,
+) -> Iterator[list[dict]]:
+    """Pages of ``table`` rows (dicts of TABLES[table]) purchased in [date_from, date_to], oldest first.
+
+    Each page is one short query, so saves are not held up for the length
+    of an export.
+    """
+    columns = ", ".join(TABLES[table])
+    clauses = ["purchase_date IS NOT NULL", "(purchase_date, rowid) > (:after_date, :after_key)"]
+    params = {"after_date": "", "after_key": 0, "limit": page_size}
+    if date_from:
+        clauses.append("purchase_date >= :date_from")
+        params["date_from"] = date_from
+    if date_to:
+        clauses.append("purchase_date <= :date_to")
+        params["date_to"] = date_to
+    sql = (
+        f"SELECT rowid AS _key, {columns} FROM {table} WHERE {' AND '.join(clauses)} "
+        "ORDER BY purchase_date, rowid LIMIT :limit"
+    )
+    while True:
+        rows = store.query(sql, params)
+        if not rows:
+            return
+        params["after_date"], params["after_key"] = rows[-1]["purchase_date"], rows[-1]["_key"]
+        yield [{column: row[column] for column in TABLES[table]} for row in rows]
+        if len(rows) < page_size:
+            return
+
+
+def stream_rows(pages: Iterable[list[dict]], table: str, fmt: str) -> Iterator[bytes]:
+    """One chunk of CSV (after a header) or NDJSON per page."""
+    if fmt == "ndjson":
+        for page in pages:
+            yield b"".join(orjson.dumps(row) + b"\n" for row in page)
+        return
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=TABLES[table], lineterminator="\n")
+    writer.writeheader()
+    for page in pages:
+        writer.writerows(page)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():                 # a header with no rows
+        yield buffer.getvalue().encode()
+
+
+class _Dictionary:
+    """A column's dictionary for one file; it only grows, so later batches are written as deltas."""
+
+    def __init__(self):
+        self.values: list[str] = []
+        self._codes: dict[str, int] = {}
+
+    def encode(self, column: list[Optional[str]]) -> list[Optional[int]]:
+        codes = []
+        for value in column:
+            if value is not None and value not in self._codes:
+                self._codes[value] = len(self.values)
+                self.values.append(value)
+            codes.append(None if value is None else self._codes[value])
+        return codes
+
+
+def _schema(pa, table: str):
+    types = {
+        "receipt_id": pa.string(), "id": pa.string(), "name": pa.string(),
+        "position": pa.int32(), "item_count": pa.int32(),
+        "purchase_date": pa.date32(), "processed_at": pa.timestamp("us"),
+    }
+    return pa.schema([
+        (column, pa.dictionary(pa.int32(), pa.string()) if column in DICTIONARY_COLUMNS
+         else types.get(column, pa.float64()))
+        for column in TABLES[table]
+    ])
+
+
+class _MonthWriter:
+    """Writes one table's rows, arriving in date order, to one file per month."""
+
+    def __init__(self, pa, table: str, out_dir: str, fmt: str):
+        self.pa = pa
+        self.table = table
+        self.out_dir = out_dir
+        self.fmt = fmt
+        self.schema = _schema(pa, table)
+        self.files: list[str] = []
+        self.rows = 0
+        self._month: Optional[str] = None
+        self._writer = None
+        self._dictionaries: dict[str, _Dictionary] = {}
+
+    def write(self, rows: list[dict]) -> None:
+        start = 0
+        for end in range(1, len(rows) + 1):
+            if end == len(rows) or rows[end]["purchase_date"][:7] != rows[start]["purchase_date"][:7]:
+                self._write_month(rows[start]["purchase_date"][:7], rows[start:end])
+                start = end
+
+    def _write_month(self, month: str, rows: list[dict]) -> None:
+        if month != self._month:
+            self.close()
+            self._open(month)
+        pa = self.pa
+        arrays = []
+        for field in self.schema:
+            column = [row[field.name] for row in rows]
+            if field.name in DICTIONARY_COLUMNS:
+                dictionary = self._dictionaries[field.name]
+                codes = dictionary.encode(column)
+                arrays.append(pa.DictionaryArray.from_arrays(
+                    pa.array(codes, pa.int32()), pa.array(dictionary.values, pa.string())
+                ))
+            elif field.name == "purchase_date":
+                arrays.append(pa.array([date.fromisoformat(v) for v in column], field.type))
+            elif field.name == "processed_at":
+                arrays.append(pa.array([datetime.fromisoformat(v) if v else None for v in column], field.type))
+            else:
+                arrays.append(pa.array(column, field.type))
+        self._writer.write_batch(pa.record_batch(arrays, schema=self.schema))
+        self.rows += len(rows)
+
+    def _open(self, month: str) -> None:
+        directory = os.path.join(self.out_dir, self.table, f"month={month}")
+        os.makedirs(directory, exist_ok=True)
+        self._path = os.path.join(directory, f"part-0.{COLUMNAR_FORMATS[self.fmt]}")
+        self._tmp = f"{self._path}.tmp"
+        if self.fmt == "parquet":
+            import pyarrow.parquet as pq
+
+            self._writer = pq.ParquetWriter(self._tmp, self.schema, compression="zstd")
+        else:
+            options = self.pa.ipc.IpcWriteOptions(emit_dictionary_deltas=True)
+            self._writer = self.pa.ipc.new_file(self._tmp, self.schema, options=options)
+        self._month = month
+        self._dictionaries = {name: _Dictionary() for name in DICTIONARY_COLUMNS if name in self.schema.names}
+
+    def close(self, keep: bool = True) -> None:
+        """Finish the current month's file; ``keep=False`` discards it instead."""
+        if self._writer is None:
+            return
+        self._writer.close()
+        if keep:
+            os.replace(self._tmp, self._path)
+            self.files.append(self._path)
+        else:
+            os.remove(self._tmp)
+        self._writer = None
+        self._month = None
+
+
+def month_bounds(date_from: Optional[str], date_to: Optional[str]) -> tuple[Optional[str], Optional[str]]:
+    """Widen ISO date bounds to whole months: the first of date_from's month, the last of date_to's."""
+    if date_from:
+        date_from = date.fromisoformat(date_from).replace(day=1).isoformat()
+    if date_to:
+        last = date.fromisoformat(date_to)
+        date_to = last.replace(day=calendar.monthrange(last.year, last.month)[1]).isoformat()
+    return date_from, date_to
+
+
+def write_columnar(
+    store,
+    out_dir: str,
+    fmt: str = "parquet",
+    tables: Iterable[str] = ("receipts", "items"),
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    page_size: int = EXPORT_PAGE_SIZE,
+) -> dict[str, dict]:
+    """Write each table under ``out_dir/<table>/month=YYYY-MM/``; {table: {"rows", "files"}}.
+
+    Each month file is written whole, so the range is widened to whole
+    months (see month_bounds): a mid-month bound would otherwise replace that
+    month's file with part of its rows. Months in the range are rewritten;
+    other months already there are left alone. Raises RuntimeError if
+    pyarrow is not installed.
+    """
+    if fmt not in COLUMNAR_FORMATS:
+        raise ValueError(f"Unknown columnar format '{fmt}' (use {', '.join(COLUMNAR_FORMATS)})")
+    date_from, date_to = month_bounds(date_from, date_to)
+    try:
+        import pyarrow as pa
+        import pyarrow.ipc  # noqa: F401
+    except ImportError:
+        raise RuntimeError("Columnar export needs pyarrow: pip install pyarrow")
+
+    written = {}
+    for table in tables:
+        writer = _MonthWriter(pa, table, out_dir, fmt)
+        try:
+            for page in iter_pages(store, table, date_from, date_to, page_size):
+                writer.write(page)
+        except BaseException:
+            # A month cut short would look complete to readers of the dataset
+            writer.close(keep=False)
+            raise
+        writer.close()
+        written[table] = {"rows": writer.rows, "files": writer.files}
+    return written
@@ -0,0 +1,51 @@
+import threading
+from typing import Optional
+
+from config import DUPLICATE_MAX_DISTANCE
+from utils.logger import get_logger
+from utils.phash_index import HASH_BITS, HammingIndex
+
+logger = get_logger(__name__)
+
+
+class ImageIndex:
+    """Finds stored receipts whose image is a near-duplicate of a new upload.
+
+    Wraps an in-memory ``HammingIndex`` over the ``image_hash`` column. The
+    index loads lazily and then catches up incrementally: each lookup first
+    pulls only rows added since the last one (by rowid), so receipts saved by
+    any writer — API background tasks or offline imports — become findable
+    without the store having to know about the index. Hashes of another
+    width (stored before the hash changed) cannot be compared and are skipped.
+    """
+
+    def __init__(self, store, max_distance: int = None):
+        self.store = store
+        self.max_distance = DUPLICATE_MAX_DISTANCE if max_distance is None else max_distance
+        self._index = HammingIndex()
+        self._last_rowid = 0
+        self._sync_lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def _sync(self) -> None:
+        with self._sync_lock:
+            rows = self.store.query(
+                "SELECT rowid, id, image_hash FROM receipts "
+                "WHERE rowid > ? AND length(image_hash) = ? ORDER BY rowid",
+                (self._last_rowid, HASH_BITS // 4),
+            )
+            for row in rows:
+                self._index.add(row["id"], int(row["image_hash"], 16))
+            if rows:
+                self._last_rowid = rows[-1]["rowid"]
+                logger.info("🖼️ Image index now holds %d hashes", len(self._index))
+
+    def find(self, image_hash: str) -> Optional[tuple[str, int]]:
+        """Return ``(receipt_id, distance)`` of the closest stored image, if close enough."""
+        if len(image_hash) != HASH_BITS // 4:
+            return None
+        self._sync()
+        hit = self._index.nearest(int(image_hash, 16), self.max_distance)
+        return (hit[1], hit[0]) if hit else None
@@ -0,0 +1,161 @@
+import math
+import re
+
+from models.data_models import ReceiptItem
+
+# A baseline needs a few observations before its variance means anything
+MIN_ITEM_SAMPLES = 5
+MIN_CATEGORY_SAMPLES = 20
+Z_THRESHOLD = 3.0
+MIN_PCT_INCREASE = 20.0     # ignore statistically significant but tiny increases
+
+# Matches the messages built by PriceBaseline._check (history-backed price jumps)
+PRICE_ANOMALY_RE = re.compile(r" costs \d+% more than ")
+
+PRICE_STATS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS price_stats (
+    kind       TEXT NOT NULL,                 -- 'item' or 'category'
+    key        TEXT NOT NULL,
+    count      INTEGER NOT NULL,
+    mean       REAL NOT NULL,
+    m2         REAL NOT NULL,                 -- sum of squared deviations (Welford)
+    PRIMARY KEY (kind, key)
+);
+"""
+
+# Welford's online update expressed as an upsert. SET expressions see the old
+# row, so the new mean is inlined where the second delta needs it.
+UPDATE_PRICE_STATS_SQL = """
+INSERT INTO price_stats (kind, key, count, mean, m2) VALUES (?, ?, 1, ?, 0)
+ON CONFLICT (kind, key) DO UPDATE SET
+    count = count + 1,
+    mean = mean + (excluded.mean - mean) / (count + 1),
+    m2 = m2 + (excluded.mean - mean)
+              * (excluded.mean - (mean + (excluded.mean - mean) / (count + 1)))
+"""
+
+# The inverse update: takes one sample (kind ?1, key ?2, price ?3) back out.
+# Rows left with no samples are deleted by the caller.
+REMOVE_PRICE_STATS_SQL = """
+UPDATE price_stats SET
+    count = count - 1,
+    mean = CASE WHEN count > 1 THEN (count * mean - ?3) / (count - 1) ELSE 0 END,
+    m2 = CASE WHEN count > 1
+              THEN MAX(m2 - (?3 - mean) * (?3 - (count * mean - ?3) / (count - 1)), 0)
+              ELSE 0 END
+WHERE kind = ?1 AND key = ?2
+"""
+
+REBUILD_PRICE_STATS_SQL = """
+INSERT INTO price_stats (kind, key, count, mean, m2)
+SELECT kind, key, COUNT(*), AVG(x), MAX(SUM(x * x) - COUNT(*) * AVG(x) * AVG(x), 0)
+FROM (
+    SELECT 'item' AS kind, price_key(name) AS key, unit_price AS x FROM items WHERE unit_price > 0
+    UNION ALL
+    SELECT 'category', lower(trim(category)), unit_price FROM items WHERE unit_price > 0
+)
+GROUP BY kind, key
+"""
+
+
+def price_key(name: str) -> str:
+    """Normalize an item name so the same product matches across receipts."""
+    return re.sub(r"\s+", " ", name).strip().lower()
+
+
+def price_stat_rows(items: list[ReceiptItem]) -> list[tuple]:
+    """Rows for UPDATE_PRICE_STATS_SQL — one item and one category sample per line."""
+    return price_sample_rows((item.name, item.category, item.unit_price) for item in items)
+
+
+def price_sample_rows(lines) -> list[tuple]:
+    """price_stat_rows for (name, category, unit_price) triples, e.g. stored item rows."""
+    rows = []
+    for name, category, unit_price in lines:
+        if unit_price <= 0:
+            continue
+        rows.append(("item", price_key(name), unit_price))
+        rows.append(("category", category.strip().lower(), unit_price))
+    return rows
+
+
+class PriceBaseline:
+    """Flags items whose price deviates from their own history.
+
+    Statistics are running count/mean/M2 per item and per category, updated
+    in O(1) by the receipt store on insert, so memory is bounded by the number
+    of distinct products rather than the number of line items.
+    """
+
+    def __init__(self, store):
+        self.store = store
+
+    def stats_for(
+        self, items: list[ReceiptItem], kinds: tuple[str, ...] = ("item", "category")
+    ) -> dict[tuple[str, str], tuple[int, float, float]]:
+        """Fetch (count, mean, std) for every item and/or category key in one query."""
+        keys = set()
+        if "item" in kinds:
+            keys |= {("item", price_key(i.name)) for i in items}
+        if "category" in kinds:
+            keys |= {("category", i.category.strip().lower()) for i in items}
+        if not keys:
+            return {}
+        placeholders = ",".join("(?, ?)" for _ in keys)
+        rows = self.store.query(
+            f"SELECT kind, key, count, mean, m2 FROM price_stats "
+            f"WHERE (kind, key) IN (VALUES {placeholders})",
+            tuple(v for k in keys for v in k),
+        )
+        return {
+            (r["kind"], r["key"]): (
+                r["count"], r["mean"],
+                math.sqrt(r["m2"] / (r["count"] - 1)) if r["count"] > 1 else 0.0,
+            )
+            for r in rows
+        }
+
+    def find_anomalies(
+        self, items: list[ReceiptItem], item_stats: dict | None = None
+    ) -> tuple[list[str], set[str]]:
+        """Return anomaly messages and the names of items that had usable history.
+
+        Items without enough history of their own are compared against their
+        category, so ``items`` must already be categorized. ``item_stats``
+        (``stats_for(items, kinds=("item",))``, fetched earlier) leaves only
+        the category keys to look up.
+        """
+        if item_stats is None:
+            stats = self.stats_for(items)
+        else:
+            stats = {**item_stats, **self.stats_for(items, kinds=("category",))}
+        anomalies, covered = [], set()
+        for item in items:
+            item_stats = stats.get(("item", price_key(item.name)))
+            cat_stats = stats.get(("category", item.category.strip().lower()))
+            if item_stats and item_stats[0] >= MIN_ITEM_SAMPLES:
+                covered.add(item.name)
+                message = self._check(item, item_stats, "usual")
+            elif cat_stats and cat_stats[0] >= MIN_CATEGORY_SAMPLES:
+                covered.add(item.name)
+                message = self._check(item, cat_stats, f"typical for {item.category}")
+            else:
+                continue
+            if message:
+                anomalies.append(message)
+        return anomalies, covered
+
+    def _check(self, item: ReceiptItem, stats: tuple[int, float, float], baseline: str) -> str | None:
+        _, mean, std = stats
+        if mean <= 0:
+            return None
+        pct = (item.unit_price - mean) / mean * 100
+        if pct < MIN_PCT_INCREASE:
+            return None
+        # A perfectly stable price has zero variance — any real jump is significant
+        if std > 0 and (item.unit_price - mean) / std < Z_THRESHOLD:
+            return None
+        return (
+            f"{item.name} costs {pct:.0f}% more than {baseline} "
+            f"(${item.unit_price:.2f} vs ${mean:.2f} avg)"
+        )
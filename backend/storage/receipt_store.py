@@ -0,0 +1,310 @@
+import sqlite3
+import threading
+import uuid
+from datetime import datetime
+from typing import Optional
+
+from config import RECEIPT_DB_PATH
+from models.data_models import AnalysisResult, ReceiptSummary
+from storage.price_baseline import (
+    PRICE_STATS_SCHEMA,
+    REBUILD_PRICE_STATS_SQL,
+    REMOVE_PRICE_STATS_SQL,
+    UPDATE_PRICE_STATS_SQL,
+    price_key,
+    price_sample_rows,
+    price_stat_rows,
+)
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS receipts (
+    id            TEXT PRIMARY KEY,
+    store_name    TEXT,
+    purchase_date TEXT,
+    subtotal      REAL NOT NULL DEFAULT 0,
+    tax           REAL NOT NULL DEFAULT 0,
+    total         REAL NOT NULL DEFAULT 0,
+    item_count    INTEGER NOT NULL DEFAULT 0,
+    top_category  TEXT,
+    processed_at  TEXT NOT NULL,
+    payload       TEXT NOT NULL,
+    image_hash    TEXT
+);
+CREATE TABLE IF NOT EXISTS items (
+    id            INTEGER PRIMARY KEY AUTOINCREMENT,
+    receipt_id    TEXT NOT NULL REFERENCES receipts(id) ON DELETE CASCADE,
+    position      INTEGER NOT NULL,
+    name          TEXT NOT NULL,
+    quantity      REAL NOT NULL,
+    unit_price    REAL NOT NULL,
+    total_price   REAL NOT NULL,
+    category      TEXT NOT NULL,
+    store_name    TEXT,
+    purchase_date TEXT
+);
+CREATE TABLE IF NOT EXISTS categories (
+    receipt_id    TEXT NOT NULL REFERENCES receipts(id) ON DELETE CASCADE,
+    category      TEXT NOT NULL,
+    total_spent   REAL NOT NULL,
+    percentage    REAL NOT NULL,
+    item_count    INTEGER NOT NULL,
+    PRIMARY KEY (receipt_id, category)
+);
+CREATE TABLE IF NOT EXISTS spending_rollups (
+    grain         TEXT NOT NULL,              -- 'day' or 'month'
+    bucket        TEXT NOT NULL,              -- YYYY-MM-DD or YYYY-MM
+    store_name    TEXT NOT NULL DEFAULT '',
+    category      TEXT NOT NULL,              -- '' holds the all-category total
+    total_spent   REAL NOT NULL DEFAULT 0,
+    item_count    INTEGER NOT NULL DEFAULT 0,
+    receipt_count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (grain, bucket, store_name, category)
+);
+CREATE INDEX IF NOT EXISTS idx_rollups_category ON spending_rollups(grain, category, bucket);
+CREATE INDEX IF NOT EXISTS idx_receipts_date ON receipts(purchase_date);
+CREATE INDEX IF NOT EXISTS idx_receipts_store ON receipts(store_name, purchase_date);
+CREATE INDEX IF NOT EXISTS idx_items_receipt ON items(receipt_id);
+CREATE INDEX IF NOT EXISTS idx_items_category ON items(category, purchase_date);
+CREATE INDEX IF NOT EXISTS idx_items_date ON items(purchase_date);
+CREATE INDEX IF NOT EXISTS idx_categories_category ON categories(category);
+"""
+
+# Adds (sign=1) or removes (sign=-1) a receipt's category totals from the
+# day and month rollups. {scope} restricts the categories rows considered.
+ROLLUP_SQL = """
+WITH grains(grain, width) AS (VALUES ('day', 10), ('month', 7)),
+contrib AS (
+    SELECT receipt_id, category, total_spent, item_count FROM categories c {scope}
+    UNION ALL
+    SELECT receipt_id, '', SUM(total_spent), SUM(item_count) FROM categories c {scope}
+    GROUP BY receipt_id
+)
+INSERT INTO spending_rollups
+    (grain, bucket, store_name, category, total_spent, item_count, receipt_count)
+SELECT g.grain, substr(r.purchase_date, 1, g.width), COALESCE(r.store_name, ''),
+       x.category, :sign * x.total_spent, :sign * x.item_count, :sign
+FROM contrib x
+JOIN receipts r ON r.id = x.receipt_id
+CROSS JOIN grains g
+WHERE r.purchase_date IS NOT NULL
+ON CONFLICT (grain, bucket, store_name, category) DO UPDATE SET
+    total_spent = round(total_spent + excluded.total_spent, 2),
+    item_count = item_count + excluded.item_count,
+    receipt_count = receipt_count + excluded.receipt_count
+"""
+ROLLUP_ONE_SQL = ROLLUP_SQL.format(scope="WHERE c.receipt_id = :receipt_id")
+ROLLUP_ALL_SQL = ROLLUP_SQL.format(scope="")
+
+# Receipt dates are free-form OCR output — try the common layouts, US order first
+DATE_FORMATS = (
+    "%m/%d/%Y", "%m/%d/%y", "%m-%d-%Y", "%m-%d-%y",
+    "%Y-%m-%d", "%Y/%m/%d",
+    "%b %d, %Y", "%b %d %Y", "%B %d, %Y", "%B %d %Y",
+    "%d/%m/%Y", "%d.%m.%Y",
+)
+
+
+def normalize_date(raw: Optional[str], fallback: Optional[str] = None) -> Optional[str]:
+    """Best-effort conversion of a receipt date to ISO ``YYYY-MM-DD``."""
+    if raw:
+        cleaned = raw.strip().replace("Date:", "").strip()
+        for fmt in DATE_FORMATS:
+            try:
+                return datetime.strptime(cleaned, fmt).date().isoformat()
+            except ValueError:
+                continue
+    return fallback[:10] if fallback else None
+
+
+class ReceiptStore:
+    """SQLite-backed history of analysis results.
+
+    A single connection is shared across threads and guarded by a lock;
+    every save is one transaction so item/category rows are batch-inserted.
+    """
+
+    def __init__(self, path: str = None):
+        self.path = path or RECEIPT_DB_PATH
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.create_function("price_key", 1, price_key, deterministic=True)
+        with self._lock:
+            if self.path != ":memory:":
+                self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute("PRAGMA foreign_keys=ON")
+            self._conn.executescript(SCHEMA)
+            self._conn.executescript(PRICE_STATS_SCHEMA)
+            columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(receipts)")}
+            if "image_hash" not in columns:   # databases created before image dedup
+                self._conn.execute("ALTER TABLE receipts ADD COLUMN image_hash TEXT")
+        if self.count():
+            if not self.query("SELECT 1 FROM spending_rollups LIMIT 1"):
+                self.rebuild_rollups()
+            if not self.query("SELECT 1 FROM price_stats LIMIT 1"):
+                self.rebuild_price_stats()
+        logger.info("🗄️ Receipt store ready at %s", self.path)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    # ------------------------------------------------------------------
+    # Writes
+    # ------------------------------------------------------------------
+
+    def save(self, result: AnalysisResult) -> str:
+        """Persist one analysis result and return its id."""
+        return self.save_many([result])[0]
+
+    def save_many(self, results: list[AnalysisResult]) -> list[str]:
+        """Persist several results in a single transaction."""
+        receipt_rows, item_rows, category_rows = [], [], []
+        for result in results:
+            if not result.id:
+                result.id = uuid.uuid4().hex
+            receipt = result.receipt
+            analysis = result.spending_analysis
+            purchase_date = normalize_date(receipt.date, result.processed_at)
+
+            receipt_rows.append((
+                result.id, receipt.store_name, purchase_date,
+                receipt.subtotal, receipt.tax, receipt.total,
+                len(receipt.items), analysis.top_category,
+                result.processed_at, result.model_dump_json(), result.image_hash,
+            ))
+            item_rows.extend(
+                (
+                    result.id, pos, item.name, item.quantity, item.unit_price,
+                    item.total_price, item.category, receipt.store_name, purchase_date,
+                )
+                for pos, item in enumerate(receipt.items)
+            )
+            category_rows.extend(
+                (result.id, c.category, c.total_spent, c.percentage, c.item_count)
+                for c in analysis.category_breakdown
+            )
+
+        ids = [(r[0],) for r in receipt_rows]
+        with self._lock, self._conn:
+            placeholders = ",".join("?" * len(ids))
+            replaced = [
+                {"receipt_id": row[0], "sign": -1}
+                for row in self._conn.execute(
+                    f"SELECT id FROM receipts WHERE id IN ({placeholders})", [i[0] for i in ids]
+                )
+            ]
+            if replaced:
+                # Back the old totals and prices out of the rollups and price
+                # baselines before the rows go away, so corrections replace them
+                self._conn.executemany(ROLLUP_ONE_SQL, replaced)
+                self._conn.execute("DELETE FROM spending_rollups WHERE receipt_count <= 0")
+                old_items = self._conn.execute(
+                    f"SELECT name, category, unit_price FROM items WHERE receipt_id IN "
+                    f"({','.join('?' * len(replaced))})",
+                    [r["receipt_id"] for r in replaced],
+                ).fetchall()
+                self._conn.executemany(REMOVE_PRICE_STATS_SQL, price_sample_rows(old_items))
+                self._conn.execute("DELETE FROM price_stats WHERE count <= 0")
+
+            # Re-saving a receipt replaces its child rows rather than appending
+            self._conn.executemany("DELETE FROM items WHERE receipt_id = ?", ids)
+            self._conn.executemany("DELETE FROM categories WHERE receipt_id = ?", ids)
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO receipts (id, store_name, purchase_date, subtotal, tax, "
+                "total, item_count, top_category, processed_at, payload, image_hash) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                receipt_rows,
+            )
+            self._conn.executemany(
+                "INSERT INTO items (receipt_id, position, name, quantity, unit_price, "
+                "total_price, category, store_name, purchase_date) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                item_rows,
+            )
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO categories (receipt_id, category, total_spent, "
+                "percentage, item_count) VALUES (?, ?, ?, ?, ?)",
+                category_rows,
+            )
+            self._conn.executemany(
+                ROLLUP_ONE_SQL, [{"receipt_id": i[0], "sign": 1} for i in ids]
+            )
+            self._conn.executemany(
+                UPDATE_PRICE_STATS_SQL,
+                [row for result in results for row in price_stat_rows(result.receipt.items)],
+            )
+        logger.info("💾 Stored %d receipt(s), %d items", len(receipt_rows), len(item_rows))
+        return [r[0] for r in receipt_rows]
+
+    def rebuild_rollups(self) -> None:
+        """Recompute the day/month rollups from scratch (e.g. for an older database)."""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM spending_rollups")
+            self._conn.execute(ROLLUP_ALL_SQL, {"sign": 1})
+        logger.info("🔁 Rebuilt spending rollups")
+
+    def rebuild_price_stats(self) -> None:
+        """Recompute per-item and per-category price baselines from stored items."""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM price_stats")
+            self._conn.execute(REBUILD_PRICE_STATS_SQL)
+        logger.info("🔁 Rebuilt price baselines")
+
+    # ------------------------------------------------------------------
+    # Reads
+    # ------------------------------------------------------------------
+
+    def query(self, sql: str, params: tuple | dict = ()) -> list[sqlite3.Row]:
+        """Run a read-only query against the store (used by the aggregation engine)."""
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def get(self, receipt_id: str) -> Optional[AnalysisResult]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT payload FROM receipts WHERE id = ?", (receipt_id,)
+            ).fetchone()
+        return AnalysisResult.model_validate_json(row["payload"]) if row else None
+
+    def list_receipts(
+        self,
+        store: str = None,
+        category: str = None,
+        date_from: str = None,
+        date_to: str = None,
+        limit: int = 50,
+        offset: int = 0,
+    ) -> list[ReceiptSummary]:
+        """List stored receipts, newest purchase first."""
+        clauses, params = [], []
+        if store:
+            clauses.append("r.store_name = ?")
+            params.append(store)
+        if category:
+            clauses.append("EXISTS (SELECT 1 FROM categories c WHERE c.receipt_id = r.id AND c.category = ?)")
+            params.append(category)
+        if date_from:
+            clauses.append("r.purchase_date >= ?")
+            params.append(date_from)
+        if date_to:
+            clauses.append("r.purchase_date <= ?")
+            params.append(date_to)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+
+        query = (
+            "SELECT r.id, r.store_name, r.purchase_date, r.total, r.item_count, "
+            "r.top_category, r.processed_at FROM receipts r "
+            f"{where} ORDER BY r.purchase_date DESC, r.processed_at DESC LIMIT ? OFFSET ?"
+        )
+        with self._lock:
+            rows = self._conn.execute(query, (*params, limit, offset)).fetchall()
+        return [ReceiptSummary(**dict(row)) for row in rows]
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM receipts").fetchone()[0]
@@ -0,0 +1,30 @@
+"""Test doubles shared across test modules."""
+import json
+import threading
+from types import SimpleNamespace
+
+
+class FakeClient:
+    """Stands in for the OpenAI client: records chat.completions.create calls.
+
+    ``reply`` is a dict returned as JSON content, or a callable receiving the
+    call kwargs and returning that dict (or a plain string).
+    """
+
+    def __init__(self, reply):
+        self.reply = reply
+        self.calls = []
+        self._lock = threading.Lock()
+        self.options = {}
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def with_options(self, **options):
+        self.options = options
+        return self
+
+    def _create(self, **kwargs):
+        with self._lock:
+            self.calls.append(kwargs)
+        reply = self.reply(kwargs) if callable(self.reply) else self.reply
+        content = reply if isinstance(reply, str) else json.dumps(reply)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
@@ -0,0 +1,104 @@
+"""Tests for admission control and load shedding on /api/analyze."""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import asyncio
+import base64
+import io
+
+import pytest
+from fastapi.testclient import TestClient
+from PIL import Image
+
+import api.index as api
+from storage.receipt_store import ReceiptStore
+from tests.test_storage import _make_result
+from utils.admission import FULL, NO_LLM_INSIGHTS, NO_OPTIONAL_WORK, AdmissionController, Overloaded
+
+
+def _controller(**overrides) -> AdmissionController:
+    options = {"max_in_flight": 2, "max_queue": 1, "queue_timeout": 1.0, "slo": 10.0, **overrides}
+    return AdmissionController(**options)
+
+
+class TestAdmissionController:
+    def test_excess_requests_are_queued_then_shed(self):
+        async def main():
+            controller = _controller()
+            release = asyncio.Event()
+            levels = []
+
+            async def request():
+                async with controller.admit() as level:
+                    levels.append(level)
+                    await release.wait()
+
+            running = [asyncio.ensure_future(request()) for _ in range(3)]   # 2 run, 1 waits
+            await asyncio.sleep(0.01)
+            assert controller.stats()["in_flight"] == 2 and controller.stats()["queued"] == 1
+            with pytest.raises(Overloaded) as info:
+                await request()
+            release.set()
+            await asyncio.gather(*running)
+            return controller, levels, info.value
+
+        controller, levels, error = asyncio.run(main())
+        assert error.retry_after >= 1
+        assert (controller.admitted, controller.shed, controller.in_flight) == (3, 1, 0)
+        assert levels == [FULL, NO_LLM_INSIGHTS, FULL]   # the queued one ran after the rush
+
+    def test_queue_timeout_sheds(self):
+        async def main():
+            controller = _controller(max_in_flight=1, queue_timeout=0.02)
+            async with controller.admit():
+                with pytest.raises(Overloaded):
+                    async with controller.admit():
+                        pass
+            return controller
+
+        controller = asyncio.run(main())
+        assert controller.stats()["queued"] == 0 and controller.in_flight == 0
+
+    def test_slow_responses_degrade_new_requests(self):
+        async def main():
+            controller = _controller(max_in_flight=100, slo=0.02)
+            async with controller.admit():
+                await asyncio.sleep(0.04)          # twice the SLO
+            async with controller.admit() as level:
+                return level
+
+        assert asyncio.run(main()) == NO_OPTIONAL_WORK
+
+
+class TestAnalyzeEndpoint:
+    def _payload(self, **options) -> dict:
+        buffer = io.BytesIO()
+        Image.new("RGB", (8, 8)).save(buffer, format="PNG")
+        return {"image_base64": base64.b64encode(buffer.getvalue()).decode(), **options}
+
+    def test_overload_returns_429_with_retry_after(self, monkeypatch):
+        monkeypatch.setattr(api, "_admission", _controller(max_in_flight=1, max_queue=0))
+        api._admission.in_flight = 1          # a request is already running
+        response = TestClient(api.app).post("/api/analyze", json=self._payload())
+
+        assert response.status_code == 429
+        assert int(response.headers["retry-after"]) >= 1
+
+    def test_pressure_keeps_insights_local(self, monkeypatch):
+        calls = []
+
+        def run_analysis(image, aggressive, detect_duplicates, insights_mode, deadline_s=None):
+            calls.append((aggressive, insights_mode))
+            return _make_result()
+
+        monkeypatch.setattr(api, "_admission", _controller(max_in_flight=1))
+        monkeypatch.setattr(api, "run_analysis", run_analysis)
+        monkeypatch.setattr(api, "get_receipt_store", lambda: ReceiptStore(":memory:"))
+        response = TestClient(api.app).post(
+            "/api/analyze", json=self._payload(insights_mode="llm", aggressive_preprocessing=True)
+        )
+
+        assert response.status_code == 200
+        assert response.headers["x-degradation-level"] == "1"
+        assert calls == [(True, "local")]
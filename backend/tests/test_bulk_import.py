@@ -0,0 +1,112 @@
+"""Tests for the offline bulk-import CLI."""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import json
+import zipfile
+
+import pytest
+
+from bulk_import import Checkpoint, ReceiptSource, run_import
+from storage.receipt_store import ReceiptStore
+from tests.test_storage import _make_result
+
+
+def _write_receipts(folder, names):
+    for name in names:
+        path = folder / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(name.encode())
+
+
+class FakeAnalyze:
+    """Stands in for run_analysis; optionally fails on chosen payload contents."""
+
+    def __init__(self, fail_on=()):
+        self.calls = []
+        self.fail_on = set(fail_on)
+
+    def __call__(self, image_base64):
+        import base64
+
+        name = base64.b64decode(image_base64).decode()
+        self.calls.append(name)
+        if name in self.fail_on:
+            raise RuntimeError("unreadable")
+        return _make_result(store=name)
+
+
+class TestReceiptSource:
+    def test_directory_walk_filters_extensions(self, tmp_path):
+        _write_receipts(tmp_path, ["a.jpg", "sub/b.PNG", "c.pdf", "notes.txt"])
+        source = ReceiptSource(str(tmp_path))
+        assert source.keys == ["a.jpg", "c.pdf", os.path.join("sub", "b.PNG")]
+        assert source.read("a.jpg") == b"a.jpg"
+
+    def test_zip_archive(self, tmp_path):
+        archive = tmp_path / "scans.zip"
+        with zipfile.ZipFile(archive, "w") as z:
+            z.writestr("2023/r1.jpg", b"one")
+            z.writestr("readme.md", b"skip")
+        source = ReceiptSource(str(archive))
+        assert source.keys == ["2023/r1.jpg"]
+        assert source.read("2023/r1.jpg") == b"one"
+        source.close()
+
+    def test_rejects_plain_files(self, tmp_path):
+        path = tmp_path / "x.jpg"
+        path.write_bytes(b"x")
+        with pytest.raises(ValueError):
+            ReceiptSource(str(path))
+
+
+class TestRunImport:
+    def test_writes_jsonl_and_checkpoints(self, tmp_path):
+        scans = tmp_path / "scans"
+        _write_receipts(scans, [f"r{i}.jpg" for i in range(5)])
+        checkpoint = Checkpoint(str(tmp_path / "ckpt"))
+        analyze = FakeAnalyze()
+
+        progress = run_import(
+            ReceiptSource(str(scans)), analyze, checkpoint,
+            jsonl_path=str(tmp_path / "out.jsonl"), workers=2, batch_size=2,
+        )
+        checkpoint.close()
+
+        lines = [json.loads(l) for l in (tmp_path / "out.jsonl").read_text().splitlines()]
+        assert sorted(l["source"] for l in lines) == [f"r{i}.jpg" for i in range(5)]
+        assert (progress.done, progress.failed) == (5, 0)
+        assert len((tmp_path / "ckpt").read_text().splitlines()) == 5
+
+    def test_resume_skips_finished_and_retries_failed(self, tmp_path):
+        scans = tmp_path / "scans"
+        _write_receipts(scans, ["a.jpg", "b.jpg", "c.jpg"])
+        ckpt = str(tmp_path / "ckpt")
+
+        first = Checkpoint(ckpt)
+        progress = run_import(
+            ReceiptSource(str(scans)), FakeAnalyze(fail_on={"b.jpg"}), first,
+            jsonl_path=str(tmp_path / "out.jsonl"),
+        )
+        first.close()
+        assert progress.failed == 1
+
+        second = Checkpoint(ckpt)
+        analyze = FakeAnalyze()
+        run_import(ReceiptSource(str(scans)), analyze, second, jsonl_path=str(tmp_path / "out.jsonl"))
+        second.close()
+        assert analyze.calls == ["b.jpg"]
+
+    def test_store_ids_are_stable_across_reruns(self, tmp_path):
+        scans = tmp_path / "scans"
+        _write_receipts(scans, ["a.jpg", "b.jpg"])
+        store = ReceiptStore(":memory:")
+
+        for run in range(2):   # a lost checkpoint must not duplicate receipts
+            checkpoint = Checkpoint(str(tmp_path / f"ckpt{run}"))
+            run_import(ReceiptSource(str(scans)), FakeAnalyze(), checkpoint, store=store)
+            checkpoint.close()
+
+        assert store.count() == 2
+        store.close()
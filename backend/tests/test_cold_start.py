@@ -0,0 +1,47 @@
+"""Cold-start regression tests: importing the API must stay cheap."""
+import os
+import subprocess
+import sys
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Imported lazily on the first request that needs them, never at module load
+HEAVY_MODULES = ("openai", "PIL", "httpx", "numpy", "sqlite3")
+
+
+def _run(snippet: str) -> str:
+    return subprocess.run(
+        [sys.executable, "-c", snippet],
+        cwd=BACKEND, capture_output=True, text=True, check=True,
+    ).stdout.strip().splitlines()[-1]
+
+
+def test_api_import_skips_heavy_modules():
+    loaded = _run(
+        "import sys, api.index; "
+        f"print([m for m in {HEAVY_MODULES!r} if m in sys.modules])"
+    )
+    assert loaded == "[]"
+
+
+def test_health_check_builds_no_agents():
+    out = _run(
+        "import services\n"
+        "from fastapi.testclient import TestClient\n"
+        "from api.index import app\n"
+        "assert TestClient(app).get('/api/health').status_code == 200\n"
+        "print(sum(getattr(services, n).cache_info().currsize "
+        "for n in dir(services) if n.startswith('get_')))"
+    )
+    assert out == "0"
+
+
+def test_agents_share_one_client():
+    out = _run(
+        "from agents.ocr_agent import OCRAgent\n"
+        "from agents.llm_agent import LLMAgent\n"
+        "from agents.analysis_agent import AnalysisAgent\n"
+        "clients = {id(a.client) for a in (OCRAgent(), LLMAgent(), AnalysisAgent())}\n"
+        "print(len(clients))"
+    )
+    assert out == "1"
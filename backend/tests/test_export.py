@@ -0,0 +1,134 @@
+"""Tests for paged history export: CSV/NDJSON streaming and month-partitioned columnar files."""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import csv
+import io
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+import api.index as api
+import export_history
+from storage.export import iter_pages, month_bounds, stream_rows, write_columnar
+from storage.receipt_store import ReceiptStore
+from tests.test_storage import _make_result
+
+DATES = ["01/15/2026", "01/20/2026", "02/03/2026", "02/28/2026", "03/01/2026"]
+
+
+@pytest.fixture
+def store():
+    store = ReceiptStore(":memory:")
+    for n, date in enumerate(DATES):
+        store.save(_make_result(store="Walmart" if n % 2 else "Target", date=date))
+    yield store
+    store.close()
+
+
+class TestPaging:
+    def test_pages_cover_every_row_once_in_date_order(self, store):
+        pages = list(iter_pages(store, "items", page_size=4))
+        assert all(len(page) <= 4 for page in pages)
+        rows = [row for page in pages for row in page]
+        assert len(rows) == 3 * len(DATES)
+        assert len({(r["receipt_id"], r["position"]) for r in rows}) == len(rows)
+        assert [r["purchase_date"] for r in rows] == sorted(r["purchase_date"] for r in rows)
+
+    def test_date_range(self, store):
+        rows = [r for page in iter_pages(store, "receipts", "2026-02-01", "2026-02-28") for r in page]
+        assert [r["purchase_date"] for r in rows] == ["2026-02-03", "2026-02-28"]
+
+    def test_pages_seek_along_the_date_index(self, store):
+        for table in ("items", "receipts"):
+            plan = " ".join(
+                row["detail"] for row in store.query(
+                    f"EXPLAIN QUERY PLAN SELECT rowid, * FROM {table} "
+                    "WHERE (purchase_date, rowid) > ('2026-02-01', 3) ORDER BY purchase_date, rowid LIMIT 10"
+                )
+            )
+            assert "USING INDEX" in plan and "TEMP B-TREE" not in plan
+
+
+class TestStreaming:
+    def test_csv_has_one_header(self, store):
+        body = b"".join(stream_rows(iter_pages(store, "items", page_size=4), "items", "csv")).decode()
+        rows = list(csv.DictReader(io.StringIO(body)))
+        assert len(rows) == 3 * len(DATES)
+        assert rows[0]["category"] and float(rows[0]["total_price"]) > 0
+
+    def test_ndjson_and_empty_range(self, store):
+        lines = b"".join(stream_rows(iter_pages(store, "receipts"), "receipts", "ndjson")).splitlines()
+        assert [json.loads(line)["store_name"] for line in lines][:2] == ["Target", "Walmart"]
+        empty = b"".join(stream_rows(iter_pages(store, "items", "2030-01-01"), "items", "csv")).decode()
+        assert empty.startswith("receipt_id,") and empty.count("\n") == 1
+
+    def test_endpoint_streams_a_download(self, store, monkeypatch):
+        monkeypatch.setattr(api, "get_receipt_store", lambda: store)
+        client = TestClient(api.app)
+        response = client.get("/api/export/items", params={"format": "ndjson", "date_from": "2026-02-01"})
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        assert "items-2026-02-01.ndjson" in response.headers["content-disposition"]
+        assert len(response.text.splitlines()) == 9
+
+        assert client.get("/api/export/prices").status_code == 422
+        assert client.get("/api/export/items", params={"format": "xlsx"}).status_code == 422
+
+
+class TestColumnar:
+    @pytest.mark.parametrize("fmt", ["parquet", "arrow"])
+    def test_month_partitions_with_dictionary_columns(self, store, tmp_path, fmt):
+        pa = pytest.importorskip("pyarrow")
+        import pyarrow.dataset as ds
+
+        written = write_columnar(store, str(tmp_path), fmt=fmt, page_size=4)
+        assert written["items"]["rows"] == 15 and written["receipts"]["rows"] == 5
+        months = sorted(os.listdir(tmp_path / "items"))
+        assert months == ["month=2026-01", "month=2026-02", "month=2026-03"]
+
+        dataset = ds.dataset(str(tmp_path / "items"), format="ipc" if fmt == "arrow" else fmt, partitioning="hive")
+        table = dataset.to_table()
+        assert table.num_rows == 15
+        assert pa.types.is_dictionary(table.schema.field("category").type)
+        assert pa.types.is_dictionary(table.schema.field("store_name").type)
+        assert set(table.column("category").to_pylist()) == {"Dairy & Eggs", "Laundry"}
+        january = dataset.to_table(filter=ds.field("month") == "2026-01")
+        assert january.num_rows == 6
+
+    def test_month_bounds(self):
+        assert month_bounds("2026-02-15", "2024-02-03") == ("2026-02-01", "2024-02-29")
+        assert month_bounds(None, "2026-12-31") == (None, "2026-12-31")
+        with pytest.raises(ValueError):
+            month_bounds("02/15/2026", None)
+
+    def test_mid_month_bound_keeps_the_whole_month(self, store, tmp_path):
+        pq = pytest.importorskip("pyarrow.parquet")
+        write_columnar(store, str(tmp_path), tables=["items"])
+        january = tmp_path / "items" / "month=2026-01" / "part-0.parquet"
+        assert pq.read_table(january).num_rows == 6
+
+        written = write_columnar(store, str(tmp_path), tables=["items"], date_from="2026-01-18", date_to="2026-02-10")
+        assert written["items"]["rows"] == 12
+        assert pq.read_table(january).num_rows == 6
+        assert pq.read_table(tmp_path / "items" / "month=2026-02" / "part-0.parquet").num_rows == 6
+
+    def test_cli(self, tmp_path, capsys):
+        pytest.importorskip("pyarrow")
+        db = str(tmp_path / "receipts.db")
+        store = ReceiptStore(db)
+        store.save(_make_result())
+        store.close()
+
+        assert export_history.main([str(tmp_path / "out"), "--db", db, "--tables", "items"]) == 0
+        assert "items: 3 rows in 1 month files" in capsys.readouterr().out
+        assert not os.path.exists(tmp_path / "out" / "receipts")
+
+        assert export_history.main([str(tmp_path / "out"), "--db", db, "--from", "Feb 2026"]) == 1
+
+    def test_help_names_pyarrow(self, capsys):
+        with pytest.raises(SystemExit):
+            export_history.main(["--help"])
+        assert "pip install pyarrow" in capsys.readouterr().out
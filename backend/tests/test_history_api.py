@@ -0,0 +1,73 @@
+"""Tests for the receipt history endpoints."""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+import api.index as api
+from storage.aggregation import SpendingAggregator
+from storage.receipt_store import ReceiptStore
+from tests.test_storage import _make_result
+
+
+def _on_event_loop() -> bool:
+    try:
+        asyncio.get_running_loop()
+        return True
+    except RuntimeError:
+        return False
+
+
+class OffLoopCheck:
+    """Wraps a store or aggregator, recording whether each call ran on the event loop."""
+
+    def __init__(self, target):
+        self.target = target
+        self.on_loop = []
+
+    def __getattr__(self, name):
+        method = getattr(self.target, name)
+
+        def call(*args, **kwargs):
+            self.on_loop.append(_on_event_loop())
+            return method(*args, **kwargs)
+        return call
+
+
+@pytest.fixture
+def store():
+    store = ReceiptStore(":memory:")
+    store.save(_make_result())
+    yield store
+    store.close()
+
+
+class TestReceiptEndpoints:
+    def test_store_is_queried_off_the_event_loop(self, store, monkeypatch):
+        checked = OffLoopCheck(store)
+        monkeypatch.setattr(api, "get_receipt_store", lambda: checked)
+        client = TestClient(api.app)
+
+        listed = client.get("/api/receipts", params={"store": "Walmart"}).json()
+        assert listed["count"] == 1
+        receipt_id = listed["receipts"][0]["id"]
+        assert client.get(f"/api/receipts/{receipt_id}").json()["id"] == receipt_id
+        assert client.get("/api/receipts/nope").status_code == 404
+        assert checked.on_loop == [False, False, False]
+
+
+class TestHistoryEndpoints:
+    def test_aggregates_are_computed_off_the_event_loop(self, store, monkeypatch):
+        checked = OffLoopCheck(SpendingAggregator(store))
+        monkeypatch.setattr(api, "get_aggregator", lambda: checked)
+        client = TestClient(api.app)
+
+        trends = client.get("/api/history/trends").json()
+        assert trends[0]["total_spent"] > 0
+        assert client.get("/api/history/categories").json()
+        assert client.get("/api/history/stores").json()[0]["store_name"] == "Walmart"
+        assert checked.on_loop == [False, False, False]
@@ -0,0 +1,226 @@
+"""Tests for perceptual hashing and near-duplicate receipt lookup."""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import base64
+import io
+import random
+import sqlite3
+import time
+
+import pytest
+from PIL import Image, ImageEnhance
+
+import pipeline
+from agents.analysis_agent import AnalysisAgent
+from agents.llm_agent import LLMAgent
+from agents.local_insights import InsightRouter, LocalInsightEngine
+from agents.ocr_agent import OCRAgent
+from agents.parser_agent import ParserAgent
+from config import DUPLICATE_MAX_DISTANCE, DUPLICATE_REUSE_DISTANCE
+from storage.image_index import ImageIndex
+from storage.receipt_store import ReceiptStore
+from tests.fakes import FakeClient
+from tests.test_storage import _make_result
+from tests.test_store_templates import _vision
+from utils.image_processor import ImageProcessor
+from utils.phash_index import EXACT_RADIUS, HASH_BITS, HammingIndex, hamming
+from utils.sample_generator import SAMPLE_RECEIPTS, _create_receipt_image
+
+WALMART, WHOLE_FOODS, TARGET = SAMPLE_RECEIPTS
+
+
+def _receipt_image(sample: dict, items=None) -> Image.Image:
+    return _create_receipt_image(sample["store"], sample["date"], items or sample["items"], sample["tax_rate"])
+
+
+def _restocked(sample: dict, seed: int) -> list:
+    """Other items for the same store, as many as ``sample`` has: the same layout, other lines."""
+    rng = random.Random(seed)
+    names = ["Bananas", "Paper Towels 6pk", "Greek Yogurt", "Frozen Pizza", "Olive Oil 1L", "Dish Soap", "Bagels"]
+    return [(rng.choice(names), rng.randint(1, 3), round(rng.uniform(1, 15), 2)) for _ in sample["items"]]
+
+
+def _photographed(image: Image.Image, seed: int) -> Image.Image:
+    """``image`` re-taken: larger, slightly tilted, on a table, darker, recompressed."""
+    rng = random.Random(seed)
+    scale = rng.uniform(1.2, 1.8)
+    image = image.convert("RGB").resize((int(image.width * scale), int(image.height * scale)))
+    image = image.rotate(rng.uniform(-3, 3), expand=True, fillcolor=(255, 255, 255))
+    table = Image.new("RGB", (int(image.width * 1.3), int(image.height * 1.15)), (70, 60, 50))
+    table.paste(image, (int(image.width * 0.12), int(image.height * 0.07)))
+    return ImageEnhance.Brightness(table).enhance(rng.uniform(0.85, 1.1))
+
+
+def _to_base64(image: Image.Image, quality: int = 90) -> str:
+    buffer = io.BytesIO()
+    image.convert("RGB").save(buffer, format="JPEG", quality=quality)
+    return base64.b64encode(buffer.getvalue()).decode()
+
+
+def _hash(image: Image.Image, **kwargs) -> int:
+    return int(ImageProcessor().perceptual_hash(_to_base64(image, **kwargs)), 16)
+
+
+class TestPerceptualHash:
+    @pytest.mark.parametrize("seed", range(4))
+    def test_rephotographed_receipt_stays_close(self, seed):
+        original = _receipt_image(WALMART)
+        retaken = _photographed(original, seed)
+        assert hamming(_hash(original), _hash(retaken, quality=70)) <= DUPLICATE_MAX_DISTANCE
+
+    def test_same_picture_is_within_the_reuse_distance(self):
+        original = _receipt_image(WALMART)
+        smaller = original.resize((original.width * 3 // 4, original.height * 3 // 4))
+        assert hamming(_hash(original), _hash(original, quality=50)) <= DUPLICATE_REUSE_DISTANCE
+        assert hamming(_hash(original), _hash(smaller, quality=80)) <= DUPLICATE_REUSE_DISTANCE
+
+    def test_different_receipts_are_far_apart(self):
+        receipts = [_receipt_image(sample) for sample in SAMPLE_RECEIPTS]
+        receipts += [_receipt_image(WALMART, _restocked(WALMART, seed)) for seed in range(3)]
+        hashes = [_hash(image) for image in receipts]
+        distances = [hamming(a, b) for i, a in enumerate(hashes) for b in hashes[i + 1:]]
+        assert min(distances) > DUPLICATE_MAX_DISTANCE
+
+    def test_unreadable_input_returns_none(self):
+        assert ImageProcessor().perceptual_hash("bm90IGFuIGltYWdl") is None
+
+
+class TestHammingIndex:
+    def test_matches_brute_force(self):
+        rng = random.Random(7)
+        stored = [rng.getrandbits(HASH_BITS) for _ in range(2000)]
+        index = HammingIndex()
+        for i, value in enumerate(stored):
+            index.add(f"r{i}", value)
+
+        for i in range(0, 2000, 50):
+            query = stored[i]
+            for bit in rng.sample(range(HASH_BITS), 12):
+                query ^= 1 << bit
+            expected = sorted(
+                (hamming(query, v), f"r{j}") for j, v in enumerate(stored) if hamming(query, v) <= 16
+            )
+            assert index.search(query, 16) == expected
+
+    def test_lookup_at_duplicate_radius_stays_sub_millisecond(self):
+        rng = random.Random(3)
+        index = HammingIndex()
+        for i in range(250_000):
+            index.add(f"r{i}", rng.getrandbits(HASH_BITS))
+        queries = [rng.getrandbits(HASH_BITS) for _ in range(300)]
+
+        # One exact bucket per chunk: ~17 * n / 2**15 candidates, ~500 at a million
+        assert EXACT_RADIUS >= DUPLICATE_MAX_DISTANCE
+        assert max(len(index._candidates(q, DUPLICATE_MAX_DISTANCE)) for q in queries) < 250
+        samples = []
+        for query in queries:
+            start = time.perf_counter()
+            index.nearest(query, DUPLICATE_MAX_DISTANCE)
+            samples.append(time.perf_counter() - start)
+        assert sorted(samples)[int(len(samples) * 0.99)] < 0.001
+
+    def test_same_hash_under_several_keys(self):
+        index = HammingIndex()
+        index.add("a", 42)
+        index.add("b", 42)
+        index.add("a", 42)
+        assert len(index) == 1
+        assert index.search(42, 0) == [(0, "a"), (0, "b")]
+
+
+class TestImageIndex:
+    def setup_method(self):
+        self.store = ReceiptStore(":memory:")
+        self.index = ImageIndex(self.store, max_distance=4)
+
+    def teardown_method(self):
+        self.store.close()
+
+    def test_finds_receipts_saved_after_the_index_loaded(self):
+        assert self.index.find(f"{0xff:064x}") is None
+        result = _make_result()
+        result.image_hash = f"{0xff:064x}"
+        receipt_id = self.store.save(result)
+
+        assert self.index.find(f"{0xfe:064x}") == (receipt_id, 1)
+        assert self.index.find(f"{0xffff:064x}") is None
+
+    def test_hashes_of_another_width_are_skipped(self):
+        result = _make_result()
+        result.image_hash = "00000000000000ff"        # a 64-bit hash from before
+        self.store.save(result)
+        assert self.index.find("00000000000000ff") is None
+        assert len(self.index) == 0
+
+    def test_older_database_gains_the_column(self, tmp_path):
+        path = str(tmp_path / "old.db")
+        conn = sqlite3.connect(path)
+        conn.execute(
+            "CREATE TABLE receipts (id TEXT PRIMARY KEY, store_name TEXT, purchase_date TEXT, "
+            "subtotal REAL, tax REAL, total REAL, item_count INTEGER, top_category TEXT, "
+            "processed_at TEXT NOT NULL, payload TEXT NOT NULL)"
+        )
+        conn.close()
+
+        store = ReceiptStore(path)
+        columns = {r["name"] for r in store.query("PRAGMA table_info(receipts)")}
+        store.close()
+        assert "image_hash" in columns
+
+
+class TestDuplicatePipeline:
+    """The same picture is reused before OCR; look-alikes only when the OCR agrees."""
+
+    def _wire(self, monkeypatch, stored_sample: dict, read_sample: dict):
+        store = ReceiptStore(":memory:")
+        stored = _make_result(store=stored_sample["store"], date=stored_sample["date"])
+        stored.receipt = ParserAgent().parse(_vision(stored_sample))
+        stored.image_hash = ImageProcessor().perceptual_hash(_to_base64(_receipt_image(stored_sample)))
+        store.save(stored)
+
+        analysis_client = FakeClient({"Groceries": list(range(1, 10))})
+        monkeypatch.setattr(pipeline, "get_receipt_store", lambda: store)
+        # Every stored image counts as a candidate, however it looks
+        monkeypatch.setattr(pipeline, "get_image_index", lambda: ImageIndex(store, max_distance=HASH_BITS))
+        self.ocr_client = FakeClient(_vision(read_sample))
+        monkeypatch.setattr(pipeline, "get_ocr_agent", lambda: OCRAgent(client=self.ocr_client))
+        monkeypatch.setattr(pipeline, "get_parser_agent", ParserAgent)
+        monkeypatch.setattr(pipeline, "get_analysis_agent", lambda: AnalysisAgent(client=analysis_client))
+        router = InsightRouter(LocalInsightEngine(), lambda: LLMAgent(client=FakeClient({})))
+        monkeypatch.setattr(pipeline, "get_insight_router", lambda: router)
+        return stored, analysis_client
+
+    def test_look_alike_receipt_is_analyzed_not_substituted(self, monkeypatch):
+        stored, _ = self._wire(monkeypatch, WALMART, TARGET)
+        result = pipeline.run_analysis(_to_base64(_receipt_image(TARGET)), insights_mode="local")
+        assert result.duplicate_of is None
+        assert result.receipt.store_name == TARGET["store"]
+        assert result.id != stored.id
+
+    def test_same_picture_is_reused_without_ocr(self, monkeypatch):
+        stored, analysis_client = self._wire(monkeypatch, WALMART, WALMART)
+        result = pipeline.run_analysis(_to_base64(_receipt_image(WALMART), quality=70), insights_mode="local")
+        assert result.duplicate_of == stored.id
+        assert self.ocr_client.calls == [] and analysis_client.calls == []
+
+    def test_borderline_duplicate_is_confirmed_by_ocr(self, monkeypatch):
+        stored, analysis_client = self._wire(monkeypatch, WALMART, WALMART)
+        monkeypatch.setattr(pipeline, "DUPLICATE_REUSE_DISTANCE", 0)
+        retaken = _photographed(_receipt_image(WALMART), seed=0)
+        result = pipeline.run_analysis(_to_base64(retaken), insights_mode="local")
+        assert result.duplicate_of == stored.id
+        assert len(self.ocr_client.calls) == 1 and analysis_client.calls == []
+
+    def test_same_image_needs_a_close_hash(self):
+        stored = _make_result()
+        assert pipeline.same_image((stored, 0)).duplicate_of == stored.id
+        assert pipeline.same_image((stored, DUPLICATE_REUSE_DISTANCE + 1)) is None
+        assert pipeline.same_image(None) is None
+
+    def test_same_receipt_needs_matching_totals(self):
+        receipt = ParserAgent().parse(_vision(WALMART))
+        assert pipeline.same_receipt(receipt, receipt.model_copy())
+        assert not pipeline.same_receipt(receipt, receipt.model_copy(update={"total": receipt.total + 1}))
+        assert not pipeline.same_receipt(receipt, ParserAgent().parse(_vision(WALMART, _restocked(WALMART, 0))))
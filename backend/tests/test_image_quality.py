@@ -0,0 +1,88 @@
+"""Tests for the pre-OCR image quality gate."""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import base64
+import io
+
+import pytest
+from PIL import Image, ImageFilter
+
+from utils.image_processor import ImageProcessor
+from utils.image_quality import ImageQualityError, assess
+from utils.sample_generator import SAMPLE_RECEIPTS, _create_receipt_image
+
+
+def _receipt(index: int = 0) -> Image.Image:
+    r = SAMPLE_RECEIPTS[index]
+    return _create_receipt_image(r["store"], r["date"], r["items"], r["tax_rate"])
+
+
+def _to_base64(image: Image.Image) -> str:
+    buffer = io.BytesIO()
+    image.convert("RGB").save(buffer, format="JPEG", quality=90)
+    return base64.b64encode(buffer.getvalue()).decode()
+
+
+def _reason(image: Image.Image) -> str:
+    with pytest.raises(ImageQualityError) as info:
+        assess(image)
+    return info.value.reason
+
+
+class TestAssess:
+    @pytest.mark.parametrize("index", range(len(SAMPLE_RECEIPTS)))
+    def test_orientation_is_recovered(self, index):
+        image = _receipt(index)
+        for angle in (0, 90, 180, 270):
+            rotation, _ = assess(image.rotate(angle, expand=True))
+            assert (angle + rotation) % 360 == 0, f"photographed at {angle}°, rotated {rotation}°"
+
+    def test_sharp_receipt_passes(self):
+        _, metrics = assess(_receipt())
+        assert metrics["sharpness"] > 1000 and metrics["ink"] > 0.002
+
+    def test_mild_blur_passes_heavy_blur_is_rejected(self):
+        assess(_receipt().filter(ImageFilter.GaussianBlur(1)))
+        assert _reason(_receipt().filter(ImageFilter.GaussianBlur(3))) == "blurry"
+
+    def test_hopeless_images(self):
+        assert _reason(Image.new("RGB", (400, 600), (235, 235, 235))) == "blank"
+        assert _reason(Image.new("L", (120, 80), 255)) == "too_small"
+        dark = Image.eval(_receipt().convert("L"), lambda v: v // 8)
+        assert _reason(dark) == "too_dark"
+
+    def test_dark_background_is_not_rejected(self):
+        table = Image.new("RGB", (700, 800), (30, 25, 20))
+        table.paste(_receipt(), (150, 150))
+        assert assess(table)[0] == 0
+
+
+class TestImageProcessorGate:
+    def test_check_quality_returns_rotation(self):
+        processor = ImageProcessor()
+        assert processor.check_quality(_to_base64(_receipt().rotate(90, expand=True))) == 270
+
+    def test_rotation_is_applied_in_preprocess(self):
+        processor = ImageProcessor()
+        sideways = _to_base64(_receipt().rotate(90, expand=True))
+        out = processor.preprocess(sideways, rotation=270)
+        upright = Image.open(io.BytesIO(base64.b64decode(out)))
+        assert upright.size == _receipt().size
+
+    def test_undecodable_payload_is_left_to_later_steps(self):
+        assert ImageProcessor().check_quality("not_valid_base64") == 0
+
+
+class TestAnalyzeEndpoint:
+    def test_blank_photo_is_rejected_with_422(self):
+        from fastapi.testclient import TestClient
+        from api.index import app
+
+        blank = _to_base64(Image.new("RGB", (600, 800), (240, 240, 240)))
+        response = TestClient(app).post(
+            "/api/analyze", json={"image_base64": blank, "detect_duplicates": False}
+        )
+        assert response.status_code == 422
+        assert "blank" in response.json()["detail"]
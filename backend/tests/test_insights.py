@@ -0,0 +1,89 @@
+"""Tests for the local insights tier and LLM escalation."""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+from agents.llm_agent import LLMAgent
+from agents.local_insights import InsightRouter, LocalInsightEngine
+from models.data_models import ReceiptItem
+from storage.aggregation import SpendingAggregator
+from storage.receipt_store import ReceiptStore
+from tests.fakes import FakeClient
+from tests.test_storage import _make_result
+
+LLM_REPLY = {"summary": "From the model.", "recommendations": ["r"], "budget_tips": ["t"], "savings_potential": "$5"}
+
+
+def _router(reply=LLM_REPLY, aggregator=None):
+    llm = LLMAgent(client=FakeClient(reply))
+    return InsightRouter(LocalInsightEngine(aggregator), lambda: llm), llm
+
+
+class TestInsightRouter:
+    def test_small_receipt_is_answered_locally(self):
+        router, llm = _router()
+        result = _make_result()
+        insight = router.generate(result.spending_analysis, result.receipt, mode="auto")
+
+        assert insight.source == "local"
+        assert llm.client.calls == []
+        assert router.stats()["llm_calls_avoided"] == 1
+
+    def test_large_receipt_escalates(self):
+        router, llm = _router()
+        items = [ReceiptItem(name=f"Item {i}", unit_price=1.0, total_price=1.0, category="Pantry") for i in range(30)]
+        result = _make_result(items=items)
+        insight = router.generate(result.spending_analysis, result.receipt, mode="auto")
+
+        assert insight.source == "llm" and insight.summary == "From the model."
+        assert len(llm.client.calls) == 1
+
+    def test_price_jump_escalates(self):
+        router, _ = _router()
+        result = _make_result()
+        result.spending_analysis.anomalies = ["Whole Milk costs 40% more than usual ($4.89 vs $3.49 avg)"]
+        assert router.escalation_reason(result.spending_analysis, result.receipt, "auto") == "price anomaly"
+
+    def test_explicit_modes_override_the_policy(self):
+        router, llm = _router()
+        result = _make_result()
+        assert router.generate(result.spending_analysis, result.receipt, mode="llm").source == "llm"
+        big = _make_result(items=[ReceiptItem(name=f"I{i}", unit_price=9.0, total_price=9.0) for i in range(40)])
+        assert router.generate(big.spending_analysis, big.receipt, mode="local").source == "local"
+        assert router.stats() == {"local_answers": 1, "llm_calls": 1, "llm_calls_avoided": 1, "avoided_pct": 50.0}
+
+    def test_failed_llm_call_falls_back_to_the_local_engine(self):
+        router, _ = _router(reply="not json")
+        result = _make_result()
+        assert router.generate(result.spending_analysis, result.receipt, mode="llm").source == "local"
+
+    def test_unknown_mode_is_rejected(self):
+        router, _ = _router()
+        result = _make_result()
+        with pytest.raises(ValueError):
+            router.generate(result.spending_analysis, result.receipt, mode="fast")
+
+
+class TestLocalInsightEngine:
+    def test_without_history_names_real_items(self):
+        result = _make_result()
+        insight = LocalInsightEngine().generate(result.spending_analysis, result.receipt)
+
+        assert "$23.47" in insight.summary and "Walmart" in insight.summary
+        assert any("Tide Pods" in r for r in insight.recommendations)
+        assert len(insight.recommendations) == 3 and len(insight.budget_tips) == 2
+        assert insight.savings_potential.endswith("/month")
+
+    def test_history_compares_with_the_usual_basket(self):
+        store = ReceiptStore(":memory:")
+        cheap = [ReceiptItem(name="Bread", unit_price=5.0, total_price=5.0, category="Bakery")]
+        store.save_many([_make_result(items=cheap, date=f"01/{d:02d}/2026") for d in range(1, 4)])
+
+        result = _make_result()
+        insight = LocalInsightEngine(SpendingAggregator(store)).generate(result.spending_analysis, result.receipt)
+        store.close()
+
+        assert "above your usual $5.00 basket here" in insight.summary
+        assert insight.budget_tips[0].startswith("Your receipts average $15/month")
@@ -0,0 +1,69 @@
+"""Tests for the fast JSON response path and response compression."""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import base64
+import io
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+from PIL import Image
+
+import api.index as api
+from models.data_models import AnalyzeResponse
+from storage.receipt_store import ReceiptStore
+from tests.test_storage import _make_result
+from utils.json_response import COMPACT_EXCLUDE, FastJSONResponse
+
+
+def _response() -> AnalyzeResponse:
+    result = _make_result()
+    result.receipt.raw_ocr_text = "WALMART\nTIDE PODS 12.97\n" * 40
+    return AnalyzeResponse(success=True, data=result, processing_time=1.5)
+
+
+class TestFastJSONResponse:
+    def test_model_renders_like_pydantic(self):
+        response = _response()
+        assert json.loads(FastJSONResponse(response).body) == json.loads(response.model_dump_json())
+
+    def test_compact_drops_raw_text_and_item_lists(self):
+        body = json.loads(FastJSONResponse(_response(), exclude=COMPACT_EXCLUDE).body)
+        assert "raw_ocr_text" not in body["data"]["receipt"]
+        assert body["data"]["receipt"]["items"]
+        assert all("items" not in c for c in body["data"]["spending_analysis"]["category_breakdown"])
+
+    def test_plain_content(self):
+        assert json.loads(FastJSONResponse({"count": 2, 3: "x"}).body) == {"count": 2, "3": "x"}
+
+
+class TestAnalyzeEndpoint:
+    @pytest.fixture
+    def client(self, monkeypatch):
+        monkeypatch.setattr(api, "run_analysis", lambda *args: _response().data)
+        monkeypatch.setattr(api, "get_receipt_store", lambda: ReceiptStore(":memory:"))
+        return TestClient(api.app)
+
+    def _post(self, client, **options):
+        buffer = io.BytesIO()
+        Image.new("RGB", (8, 8)).save(buffer, format="PNG")
+        payload = {"image_base64": base64.b64encode(buffer.getvalue()).decode(), **options}
+        return client.post("/api/analyze", json=payload, headers={"Accept-Encoding": "gzip"})
+
+    def test_large_responses_are_gzipped(self, client):
+        response = self._post(client)
+        assert response.status_code == 200
+        assert response.headers["content-encoding"] == "gzip"
+        assert response.json()["data"]["receipt"]["raw_ocr_text"].startswith("WALMART")
+
+    def test_compact_request(self, client):
+        data = self._post(client, compact=True).json()["data"]
+        assert "raw_ocr_text" not in data["receipt"]
+        assert data["spending_analysis"]["category_breakdown"][0]["category"]
+
+    def test_small_responses_are_not_compressed(self, client):
+        response = client.get("/api/health", headers={"Accept-Encoding": "gzip"})
+        assert "content-encoding" not in response.headers
+        assert response.json()["status"] == "ok"
@@ -0,0 +1,100 @@
+"""Tests for structured logging, request correlation and sampling."""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import asyncio
+import io
+import json
+import logging
+
+import httpx
+
+from utils.logger import (
+    ALWAYS,
+    ContextFilter,
+    JSONFormatter,
+    bind_request,
+    current_request_id,
+    unbind_request,
+)
+
+
+def _capture(fmt=None):
+    """A logger writing synchronously through the production filter and formatter."""
+    stream = io.StringIO()
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(fmt or JSONFormatter())
+    handler.addFilter(ContextFilter())
+    logger = logging.getLogger(f"test.logging.{id(stream)}")
+    logger.handlers = [handler]
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    return logger, stream
+
+
+def _lines(stream):
+    return [json.loads(line) for line in stream.getvalue().splitlines()]
+
+
+class TestJSONFormatter:
+    def test_fields_and_extras(self):
+        logger, stream = _capture()
+        logger.info("Parsed %d items", 3, extra={"step": "parse"})
+
+        [entry] = _lines(stream)
+        assert entry["msg"] == "Parsed 3 items"
+        assert entry["level"] == "INFO"
+        assert entry["step"] == "parse"
+        assert "request_id" not in entry
+
+    def test_request_id_is_attached(self):
+        logger, stream = _capture()
+        tokens = bind_request("abc123", sample_rate=1.0)
+        try:
+            logger.info("inside")
+        finally:
+            unbind_request(tokens)
+        logger.info("outside")
+
+        inside, outside = _lines(stream)
+        assert inside["request_id"] == "abc123"
+        assert "request_id" not in outside
+        assert current_request_id() is None
+
+
+class TestSampling:
+    def test_unsampled_request_keeps_only_warnings_and_always_lines(self):
+        logger, stream = _capture()
+        tokens = bind_request("r1", sample_rate=0.0)
+        try:
+            logger.info("step line")
+            logger.info("summary", extra=ALWAYS)
+            logger.warning("something odd")
+        finally:
+            unbind_request(tokens)
+
+        assert [e["msg"] for e in _lines(stream)] == ["summary", "something odd"]
+
+    def test_lines_outside_a_request_are_never_sampled(self):
+        logger, stream = _capture()
+        logger.info("startup")
+        assert len(_lines(stream)) == 1
+
+
+class TestRequestIdMiddleware:
+    def _get(self, headers=None):
+        import api.index
+
+        async def main():
+            transport = httpx.ASGITransport(app=api.index.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+                return await http.get("/api/health", headers=headers or {})
+
+        return asyncio.run(main())
+
+    def test_generates_an_id(self):
+        assert len(self._get().headers["x-request-id"]) == 16
+
+    def test_echoes_the_caller_id(self):
+        assert self._get({"X-Request-ID": "trace-42"}).headers["x-request-id"] == "trace-42"
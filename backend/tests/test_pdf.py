@@ -0,0 +1,181 @@
+"""Tests for PDF receipt/invoice ingestion."""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import base64
+import io
+import threading
+import time
+
+from PIL import Image, ImageDraw
+
+import pipeline
+from agents.parser_agent import ParserAgent
+from models.data_models import ReceiptItem
+from utils.pdf_processor import PDFProcessor, is_pdf
+
+
+def _text_pdf(pages: list[list[str]]) -> bytes:
+    """A minimal PDF whose pages carry the given lines as a real text layer."""
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None, "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for lines in pages:
+        ops = ["BT", "/F1 11 Tf", "14 TL", "40 800 Td"]
+        for line in lines:
+            ops.append("(%s) Tj T*" % line.replace("(", r"\(").replace(")", r"\)"))
+        ops.append("ET")
+        stream = "\n".join(ops)
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>"
+        )
+        kids.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>"
+
+    out, offsets = io.BytesIO(), []
+    out.write(b"%PDF-1.4\n")
+    for number, body in enumerate(objects, start=1):
+        offsets.append(out.tell())
+        out.write(f"{number} 0 obj\n{body}\nendobj\n".encode())
+    xref = out.tell()
+    out.write(f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode())
+    for offset in offsets:
+        out.write(f"{offset:010d} 00000 n \n".encode())
+    out.write(f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode())
+    return out.getvalue()
+
+
+def _scanned_pdf(count: int, blank: tuple = ()) -> bytes:
+    """An image-only PDF (no text layer), as a scanner would produce.
+
+    Pages carry a few lines of printed text, except the (1-based) ``blank`` ones.
+    """
+    pages = []
+    for number in range(1, count + 1):
+        page = Image.new("RGB", (300, 500), (250, 250, 250))
+        if number not in blank:
+            draw = ImageDraw.Draw(page)
+            for row in range(12):
+                draw.text((30, 40 + row * 30), f"ITEM {row:02d} ........ {row + 1}.49", fill=(20, 20, 20))
+        pages.append(page)
+    buffer = io.BytesIO()
+    pages[0].save(buffer, format="PDF", save_all=True, append_images=pages[1:])
+    return buffer.getvalue()
+
+
+def _b64(data: bytes) -> str:
+    return base64.b64encode(data).decode()
+
+
+class FakeOCR:
+    """Returns one item per page and records how many calls overlap."""
+
+    def __init__(self):
+        self.calls = 0
+        self.active = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def extract_structured_data(self, image_base64):
+        with self._lock:
+            self.calls += 1
+            page = self.calls
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        time.sleep(0.05)
+        with self._lock:
+            self.active -= 1
+        return {"items": [{"name": f"Scanned {page}", "quantity": 1, "unit_price": 2.5, "total_price": 2.5}]}
+
+
+class TestDetection:
+    def test_pdf_payloads(self):
+        payload = _b64(_text_pdf([["hello"]]))
+        assert is_pdf(payload)
+        assert is_pdf("data:application/pdf;base64," + payload)
+
+    def test_images_are_not_pdfs(self):
+        buffer = io.BytesIO()
+        Image.new("RGB", (10, 10)).save(buffer, format="PNG")
+        assert not is_pdf(_b64(buffer.getvalue()))
+        assert not is_pdf("")
+
+
+class TestPDFProcessor:
+    def test_text_layer_pages_skip_rendering(self):
+        pdf = _text_pdf([["Corner Market", "Apples 3.49", "Bread 2.99"]])
+        [(number, text, image)] = list(PDFProcessor().iter_pages(_b64(pdf)))
+        assert number == 1 and image is None
+        assert "Apples 3.49" in text
+
+    def test_scanned_pages_are_rendered(self):
+        pages = list(PDFProcessor(dpi=72).iter_pages(_b64(_scanned_pdf(2))))
+        assert [(n, t) for n, t, _ in pages] == [(1, None), (2, None)]
+        assert all(image.size[0] > 0 for _, _, image in pages)
+
+    def test_page_limit(self):
+        assert len(list(PDFProcessor(max_pages=2, dpi=36).iter_pages(_b64(_scanned_pdf(5))))) == 2
+
+
+class TestMergePages:
+    def test_header_from_first_page_totals_from_last(self):
+        parser = ParserAgent()
+        pages = [
+            {"items": [ReceiptItem(name="A", unit_price=4.0, total_price=4.0)], "store_name": "Acme Supply",
+             "date": "01/02/2026", "raw_ocr_text": "p1"},
+            {"items": [ReceiptItem(name="B", unit_price=6.0, total_price=6.0)], "subtotal": 10.0,
+             "tax": 0.8, "total": 10.8, "store_name": "Page 2 Header", "raw_ocr_text": "p2"},
+        ]
+        receipt = parser.merge_pages(pages)
+        assert [i.name for i in receipt.items] == ["A", "B"]
+        assert receipt.store_name == "Acme Supply"
+        assert (receipt.subtotal, receipt.tax, receipt.total) == (10.0, 0.8, 10.8)
+
+    def test_missing_totals_fall_back_to_item_sum(self):
+        receipt = ParserAgent().merge_pages([
+            {"items": [ReceiptItem(name="A", unit_price=4.0, total_price=4.0)]},
+            {"items": [ReceiptItem(name="B", unit_price=6.0, total_price=6.0)]},
+        ])
+        assert receipt.total == 10.0
+
+
+class TestExtractPDFReceipt:
+    def test_text_pdf_needs_no_ocr(self, monkeypatch):
+        ocr = FakeOCR()
+        monkeypatch.setattr(pipeline, "get_ocr_agent", lambda: ocr)
+        monkeypatch.setattr(pipeline, "get_parser_agent", ParserAgent)
+        pdf = _text_pdf([
+            ["Corner Market", "01/15/2026", "Apples 3.49", "Bread 2.99"],
+            ["Milk 4.19", "Tax 0.85", "Total 11.52"],
+        ])
+        receipt = pipeline.extract_pdf_receipt(_b64(pdf))
+
+        assert ocr.calls == 0
+        assert [i.name for i in receipt.items] == ["Apples", "Bread", "Milk"]
+        assert receipt.store_name == "Corner Market"
+        assert receipt.total == 11.52
+
+    def test_scanned_pages_are_ocred_concurrently(self, monkeypatch):
+        ocr = FakeOCR()
+        monkeypatch.setattr(pipeline, "get_ocr_agent", lambda: ocr)
+        monkeypatch.setattr(pipeline, "get_parser_agent", ParserAgent)
+        monkeypatch.setattr(pipeline, "PDF_PAGE_CONCURRENCY", 3)
+        monkeypatch.setattr(pipeline, "get_pdf_processor", lambda: PDFProcessor(dpi=36))
+        receipt = pipeline.extract_pdf_receipt(_b64(_scanned_pdf(6)))
+
+        assert ocr.calls == 6
+        assert 1 < ocr.peak <= 3
+        assert sorted(i.name for i in receipt.items) == [f"Scanned {n}" for n in range(1, 7)]
+        assert receipt.total == 15.0
+
+    def test_blank_scanned_pages_are_skipped(self, monkeypatch):
+        ocr = FakeOCR()
+        monkeypatch.setattr(pipeline, "get_ocr_agent", lambda: ocr)
+        monkeypatch.setattr(pipeline, "get_parser_agent", ParserAgent)
+        monkeypatch.setattr(pipeline, "get_pdf_processor", lambda: PDFProcessor(dpi=72))
+        receipt = pipeline.extract_pdf_receipt(_b64(_scanned_pdf(3, blank=(2,))))
+
+        assert ocr.calls == 2
+        assert len(receipt.items) == 2
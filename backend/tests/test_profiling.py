@@ -0,0 +1,166 @@
+"""Tests for opt-in request profiling and the profile aggregation CLI."""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import base64
+import contextvars
+import io
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from fastapi.testclient import TestClient
+from PIL import Image
+
+import api.index as api
+import profile_report
+from storage.receipt_store import ReceiptStore
+from tests.test_storage import _make_result
+from utils import profiling
+
+INTERVAL = 0.001
+
+
+def _busy(seconds: float) -> None:
+    # CPU seconds of this thread, so a loaded machine cannot shrink the work
+    end = time.thread_time() + seconds
+    while time.thread_time() < end:
+        sum(range(100))
+
+
+def _profiled_run(label: str = "run") -> dict:
+    """A session with one CPU-bound and one blocked worker thread."""
+    release = threading.Event()
+    with profiling.session(label, INTERVAL) as profile:
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            waiting = pool.submit(contextvars.copy_context().run, profiling.traced("wait", release.wait), 1.0)
+            busy = pool.submit(contextvars.copy_context().run, profiling.traced("busy", _busy), 0.1)
+            busy.result()
+            release.set()
+            waiting.result()
+    return profile.report()
+
+
+class TestSession:
+    def test_outside_a_session_costs_nothing(self):
+        assert not profiling.active()
+        assert profiling.traced("stage", _busy) is _busy
+        with profiling.span("stage"):
+            pass
+
+    def test_spans_get_wall_cpu_and_buckets(self):
+        report = _profiled_run()
+        spans = {s["name"]: s for s in report["spans"]}
+        assert set(spans) == {"busy", "wait"}
+        assert spans["busy"]["cpu_s"] > 0.05
+        assert spans["wait"]["cpu_s"] < spans["busy"]["cpu_s"] / 2
+        assert report["breakdown_s"]["other_cpu"] > 0 and report["breakdown_s"]["waiting"] > 0
+        assert report["hot"][0]["frame"].endswith(("test_profiling.py:_busy", "threading.py:wait"))
+
+    def test_folded_stacks_start_with_the_span(self):
+        folded = _profiled_run()["folded"]
+        assert folded and all(stack.split(";")[0] in ("busy", "wait") for stack in folded)
+        assert any(stack.startswith("busy;") and stack.endswith("test_profiling.py:_busy") for stack in folded)
+
+    def test_time_outside_spans_counts_as_awaiting(self):
+        with profiling.session("await", INTERVAL) as profile:
+            time.sleep(0.05)
+            with profiling.span("work"):
+                _busy(0.01)
+        report = profile.report()
+        assert report["awaiting_s"] >= 0.04
+        assert report["cpu_s"] >= 0.005
+
+    def test_labels_are_safe_file_names(self, tmp_path):
+        assert "/" not in profiling.safe_label("../../etc/passwd")
+        with profiling.session("../escape", INTERVAL) as profile:
+            pass
+        path = profile.save(str(tmp_path))
+        assert os.path.dirname(path) == str(tmp_path)
+
+
+class TestProfiledRequests:
+    def _payload(self) -> dict:
+        buffer = io.BytesIO()
+        Image.new("RGB", (8, 8)).save(buffer, format="PNG")
+        return {"image_base64": base64.b64encode(buffer.getvalue()).decode()}
+
+    @pytest.fixture
+    def client(self, monkeypatch, tmp_path):
+        def run_analysis(image, aggressive, detect_duplicates, insights_mode, deadline_s=None):
+            _busy(0.02)
+            return _make_result()
+
+        monkeypatch.setattr(api, "PROFILE_TOKEN", "secret")
+        monkeypatch.setattr(api, "PROFILE_DIR", str(tmp_path))
+        monkeypatch.setattr(api, "run_analysis", run_analysis)
+        monkeypatch.setattr(api, "get_receipt_store", lambda: ReceiptStore(":memory:"))
+        return TestClient(api.app)
+
+    def test_token_header_profiles_the_request(self, client, tmp_path):
+        response = client.post("/api/analyze", json=self._payload(), headers={"X-Profile": "secret"})
+        assert response.status_code == 200
+        profile_id = response.headers["X-Profile-Id"]
+        assert profile_id == response.headers["X-Request-ID"]
+        assert "wall;dur=" in response.headers["Server-Timing"]
+
+        report = json.loads((tmp_path / f"{profile_id}.json").read_text())
+        assert [s["name"] for s in report["spans"]] == ["pipeline"]
+        assert report["spans"][0]["cpu_s"] > 0.01
+
+    def test_saved_profile_is_served_to_admins_only(self, client):
+        profile_id = client.post(
+            "/api/analyze", json=self._payload(), params={"profile": "secret"}
+        ).headers["X-Profile-Id"]
+
+        assert client.get(f"/api/profiles/{profile_id}").status_code == 403
+        report = client.get(f"/api/profiles/{profile_id}", headers={"X-Profile": "secret"}).json()
+        assert report["label"] == profile_id
+        folded = client.get(f"/api/profiles/{profile_id}", params={"profile": "secret", "format": "folded"})
+        assert all(line.startswith("pipeline;") for line in folded.text.splitlines())
+
+    def test_wrong_or_unset_token_is_ignored(self, client, monkeypatch):
+        response = client.post("/api/analyze", json=self._payload(), headers={"X-Profile": "guess"})
+        assert response.status_code == 200 and "X-Profile-Id" not in response.headers
+
+        monkeypatch.setattr(api, "PROFILE_TOKEN", "")
+        response = client.post("/api/analyze", json=self._payload(), headers={"X-Profile": ""})
+        assert "X-Profile-Id" not in response.headers
+        assert client.get("/api/profiles/anything", headers={"X-Profile": ""}).status_code == 403
+
+
+class TestAggregate:
+    def test_summary_across_profiles(self):
+        summary = profile_report.aggregate([_profiled_run("a"), _profiled_run("b")])
+        assert summary["profiles"] == 2
+        assert summary["stages"]["busy"]["count"] == 2
+        assert summary["buckets"]["other_cpu"]["share"] > 0
+        assert {label for label, _ in summary["slowest"]} == {"a", "b"}
+
+    def test_cli_reads_a_directory_and_writes_folded_stacks(self, tmp_path, capsys):
+        for label in ("a", "b"):
+            (tmp_path / f"{label}.json").write_text(json.dumps(_profiled_run(label)))
+        folded = tmp_path / "all.folded"
+
+        assert profile_report.main([str(tmp_path), "--folded", str(folded)]) == 0
+        assert "2 profiles" in capsys.readouterr().out
+        lines = folded.read_text().splitlines()
+        assert lines and all(line.rsplit(" ", 1)[1].isdigit() for line in lines)
+
+    def test_corpus_runs_are_profiled_one_file_each(self, tmp_path):
+        source = tmp_path / "scans"
+        source.mkdir()
+        for name in ("one.jpg", "two.jpg"):
+            (source / name).write_bytes(b"image")
+
+        from bulk_import import ReceiptSource
+
+        paths = profile_report.profile_corpus(
+            ReceiptSource(str(source)), str(tmp_path / "out"), lambda image: _busy(0.01), INTERVAL
+        )
+        reports = [profiling.load(p) for p in paths]
+        assert [r["label"] for r in reports] == ["one", "two"]
+        assert all(r["spans"][0]["name"] == "pipeline" for r in reports)
@@ -0,0 +1,78 @@
+"""Tests for prompt token budgeting and compact categorization prompts."""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.data_models import CategoryAnalysis, Receipt, ReceiptItem, SpendingAnalysis
+from agents.analysis_agent import AnalysisAgent
+from agents.llm_agent import LLMAgent
+from tests.fakes import FakeClient
+from utils.prompt_budget import (
+    INSIGHT_PROMPT_BUDGET,
+    categorization_max_tokens,
+    estimate_tokens,
+)
+
+
+def _big_receipt(n: int) -> tuple[Receipt, SpendingAnalysis]:
+    items = [
+        ReceiptItem(name=f"Grocery Item Number {i}", unit_price=1 + i % 7, total_price=1 + i % 7,
+                    category=f"Category {i % 5}")
+        for i in range(n)
+    ]
+    total = sum(i.total_price for i in items)
+    breakdown = []
+    for c in range(5):
+        cat_items = [i for i in items if i.category == f"Category {c}"]
+        spent = sum(i.total_price for i in cat_items)
+        breakdown.append(CategoryAnalysis(
+            category=f"Category {c}", total_spent=spent, percentage=spent / total * 100,
+            item_count=len(cat_items), items=[i.name for i in cat_items],
+        ))
+    return Receipt(items=items), SpendingAnalysis(total_spending=total, category_breakdown=breakdown)
+
+
+class TestTokenEstimates:
+    def test_estimate_is_in_the_right_range(self):
+        assert 8 <= estimate_tokens("Whole Milk 1 Gal [Dairy & Eggs]: $3.49") <= 16
+        assert estimate_tokens("") == 0
+
+    def test_max_tokens_scales_with_items(self):
+        assert categorization_max_tokens(5) < categorization_max_tokens(50) < categorization_max_tokens(200)
+        assert categorization_max_tokens(10_000) == 4000
+
+
+class TestInsightPrompt:
+    def test_items_listed_once(self):
+        receipt, analysis = _big_receipt(10)
+        prompt = LLMAgent(api_key="test")._build_prompt(analysis, receipt)
+        assert prompt.count("Grocery Item Number 3 ") == 1
+        assert "Every item purchased" not in prompt
+
+    def test_long_tail_is_summarized_within_budget(self):
+        receipt, analysis = _big_receipt(400)
+        prompt = LLMAgent(api_key="test")._build_prompt(analysis, receipt)
+        section = prompt.split("Spending by category (items with prices):")[1].split("Overspending")[0]
+        assert estimate_tokens(section) <= INSIGHT_PROMPT_BUDGET
+        assert "smaller items" in section
+
+
+class TestCompactCategorization:
+    def test_grouped_numbers_map_back_to_names(self):
+        client = FakeClient({"Dairy & Eggs": [1, 3], "Fresh Produce": [2]})
+        agent = AnalysisAgent(client=client)
+        items = [
+            ReceiptItem(name="Whole Milk", unit_price=3.49, total_price=3.49),
+            ReceiptItem(name="Bananas", unit_price=1.29, total_price=1.29),
+            ReceiptItem(name="Eggs", unit_price=4.99, total_price=4.99),
+            ReceiptItem(name="Whole Milk", unit_price=3.49, total_price=3.49),
+        ]
+        agent._ai_categorize(items)
+        assert [i.category for i in items] == ["Dairy & Eggs", "Fresh Produce", "Dairy & Eggs", "Dairy & Eggs"]
+        assert len(client.calls) == 1
+        assert client.calls[0]["max_tokens"] == categorization_max_tokens(3)
+        assert "4. Whole Milk" not in client.calls[0]["messages"][0]["content"]
+
+    def test_legacy_name_mapping_still_accepted(self):
+        agent = AnalysisAgent(client=FakeClient({"whole milk": "Dairy"}))
+        assert agent._request_categories(["Whole Milk"]) == {"Whole Milk": "Dairy"}
@@ -0,0 +1,174 @@
+"""Tests for re-analyzing a stored receipt after the user corrects it."""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from types import SimpleNamespace
+
+import pytest
+from fastapi.testclient import TestClient
+
+import api.index as api
+import pipeline
+from agents.analysis_agent import AnalysisAgent
+from agents.reanalysis import apply_edits, edited_receipt, item_changes, material_change
+from models.data_models import ItemEdit, LLMInsight, ReanalyzeRequest
+from storage.receipt_store import ReceiptStore
+from tests.fakes import FakeClient
+from tests.test_storage import _make_result
+
+MILK, CHEDDAR, TIDE = 0, 1, 2
+
+
+def _stored():
+    """The sample receipt with the analysis the pipeline would have stored."""
+    result = _make_result()
+    result.id = "r1"
+    result.spending_analysis = AnalysisAgent(client=FakeClient({})).summarize(result.receipt, [])
+    return result
+
+
+class TestApplyEdits:
+    def test_total_edit_sets_the_unit_price(self):
+        receipt, recategorize, picked = apply_edits(_stored().receipt, [ItemEdit(index=MILK, total_price=3.99)])
+        assert receipt.items[MILK].unit_price == 3.99 and receipt.items[MILK].total_price == 3.99
+        assert receipt.items[MILK].category == "Dairy & Eggs"
+        assert recategorize == [] and picked == []
+
+    def test_rename_without_category_is_recategorized(self):
+        _, recategorize, picked = apply_edits(_stored().receipt, [ItemEdit(index=CHEDDAR, name="Gouda")])
+        assert recategorize == [CHEDDAR] and picked == []
+        _, recategorize, picked = apply_edits(_stored().receipt, [ItemEdit(index=CHEDDAR, name="Gouda", category="Cheese")])
+        assert recategorize == [] and picked == [CHEDDAR]
+
+    def test_positions_follow_removals_and_additions(self):
+        stored = _stored().receipt
+        receipt, recategorize, _ = apply_edits(
+            stored, [ItemEdit(index=MILK, remove=True), ItemEdit(name="Bread", unit_price=2.5)]
+        )
+        assert [i.name for i in receipt.items] == ["Cheddar", "Tide Pods", "Bread"]
+        assert recategorize == [2]
+        assert len(stored.items) == 3                    # the stored receipt is left alone
+
+    @pytest.mark.parametrize("edits", [
+        [ItemEdit(index=7, name="x")],
+        [ItemEdit(index=MILK, name="a"), ItemEdit(index=MILK, name="b")],
+        [ItemEdit(name="Bread")],
+        [ItemEdit(remove=True)],
+    ])
+    def test_edits_that_do_not_fit_raise(self, edits):
+        with pytest.raises(ValueError):
+            apply_edits(_stored().receipt, edits)
+
+    def test_whole_receipt_with_a_carried_over_category(self):
+        stored = _stored().receipt
+        edited = stored.model_copy(deep=True)
+        edited.items[CHEDDAR].name = "Gouda"                   # category carried over from Cheddar
+        edited.items[TIDE].category = "Cleaning"               # user-picked
+        _, recategorize, picked = edited_receipt(stored, edited)
+        assert recategorize == [CHEDDAR] and picked == [TIDE]
+
+
+class TestIncrementalSummary:
+    @pytest.mark.parametrize("edits", [
+        [ItemEdit(index=MILK, total_price=3.99)],
+        [ItemEdit(index=TIDE, category="Dairy & Eggs")],
+        [ItemEdit(index=CHEDDAR, remove=True), ItemEdit(name="Bleach", unit_price=4.0, category="Laundry")],
+        [ItemEdit(index=MILK, remove=True), ItemEdit(index=CHEDDAR, remove=True)],
+    ])
+    def test_matches_a_full_summary(self, edits):
+        agent = AnalysisAgent(client=FakeClient({}))
+        stored = _stored()
+        receipt, _, _ = apply_edits(stored.receipt, edits)
+        removed, added = item_changes(stored.receipt.items, receipt.items)
+        anomalies = agent.price_anomalies(receipt)
+
+        updated = agent.update_summary(stored.spending_analysis, receipt, removed, added, anomalies)
+        full = agent.summarize(receipt, anomalies)
+        assert updated.total_spending == full.total_spending
+        assert updated.top_category == full.top_category
+        assert updated.overspending_categories == full.overspending_categories
+        assert updated.anomalies == full.anomalies
+        by_category = lambda a: {c.category: (c.total_spent, c.percentage, c.item_count, sorted(c.items))
+                                 for c in a.category_breakdown}
+        assert by_category(updated) == by_category(full)
+
+    def test_small_edit_is_not_material(self):
+        agent = AnalysisAgent(client=FakeClient({}))
+        stored = _stored()
+        receipt, _, _ = apply_edits(stored.receipt, [ItemEdit(index=MILK, total_price=3.59)])
+        updated = agent.update_summary(stored.spending_analysis, receipt, *item_changes(stored.receipt.items, receipt.items), [])
+        assert material_change(stored.spending_analysis, updated) is None
+        assert material_change(stored.spending_analysis, updated.model_copy(update={"top_category": "Dairy & Eggs"}))
+
+
+class TestReanalyze:
+    def _wire(self, monkeypatch, categories=None):
+        client = FakeClient(categories or {})
+        insights = []
+
+        def generate(analysis, receipt, mode=None):
+            insights.append(analysis)
+            return LLMInsight(summary="new", recommendations=[], budget_tips=[], savings_potential="$0", source="local")
+
+        monkeypatch.setattr(pipeline, "get_analysis_agent", lambda: AnalysisAgent(client=client))
+        monkeypatch.setattr(pipeline, "get_insight_router", lambda: SimpleNamespace(generate=generate))
+        return client, insights
+
+    def test_price_fix_keeps_the_insights(self, monkeypatch):
+        client, insights = self._wire(monkeypatch)
+        result, info = pipeline.reanalyze(_stored(), ReanalyzeRequest(edits=[ItemEdit(index=MILK, total_price=3.59)]))
+
+        assert result.id == "r1" and result.receipt.subtotal == 23.57
+        assert result.spending_analysis.total_spending == 23.57
+        assert info == {"recomputed": ["breakdown", "anomalies"], "categorized": 0, "insights_reason": None}
+        assert result.llm_insight.summary == "ok"
+        assert client.calls == [] and insights == []
+
+    def test_only_renamed_items_are_categorized(self, monkeypatch):
+        client, insights = self._wire(monkeypatch, {"Cheese": [1]})
+        result, info = pipeline.reanalyze(_stored(), ReanalyzeRequest(edits=[ItemEdit(index=CHEDDAR, name="Gouda")]))
+
+        assert len(client.calls) == 1
+        prompt = client.calls[0]["messages"][0]["content"]
+        assert "Gouda" in prompt and "Whole Milk" not in prompt and "Tide" not in prompt
+        assert result.receipt.items[CHEDDAR].category == "Cheese"
+        assert info["categorized"] == 1 and "insights" in info["recomputed"]
+        assert len(insights) == 1 and result.llm_insight.summary == "new"
+
+    def test_store_name_alone_changes_no_analysis(self, monkeypatch):
+        client, insights = self._wire(monkeypatch)
+        stored = _stored()
+        result, info = pipeline.reanalyze(stored, ReanalyzeRequest(store_name="Target"))
+        assert result.receipt.store_name == "Target"
+        assert result.spending_analysis == stored.spending_analysis
+        assert info["recomputed"] == [] and client.calls == [] and insights == []
+
+
+class TestReanalyzeEndpoint:
+    @pytest.fixture
+    def client(self, monkeypatch):
+        store = ReceiptStore(":memory:")
+        store.save(_stored())
+        monkeypatch.setattr(api, "get_receipt_store", lambda: store)
+        TestReanalyze()._wire(monkeypatch)
+        yield TestClient(api.app), store
+        store.close()
+
+    def test_edit_is_saved_under_the_same_id(self, client):
+        http, store = client
+        response = http.post("/api/receipts/r1/reanalyze", json={
+            "edits": [{"index": TIDE, "category": "Cleaning"}], "compact": True,
+        })
+        assert response.status_code == 200
+        body = response.json()
+        assert body["data"]["id"] == "r1"
+        assert body["recomputed"] == ["breakdown", "anomalies", "insights"]
+        assert body["insights_reason"] == "top category changed"
+        assert "items" not in body["data"]["spending_analysis"]["category_breakdown"][0]
+        assert store.get("r1").receipt.items[TIDE].category == "Cleaning"
+
+    def test_unknown_receipt_and_bad_edit(self, client):
+        http, _ = client
+        assert http.post("/api/receipts/nope/reanalyze", json={"edits": []}).status_code == 404
+        assert http.post("/api/receipts/r1/reanalyze", json={"edits": [{"index": 9}]}).status_code == 422
@@ -0,0 +1,62 @@
+"""Tests for receipt region detection, cropping and deskew."""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import base64
+import io
+
+import pytest
+from PIL import Image
+
+from tests.test_image_quality import _receipt, _to_base64
+from utils import image_processor
+from utils.receipt_roi import crop_to_receipt, locate_receipt
+
+
+def _photo(tilt: float = 0, background=(55, 50, 45), size=(1500, 2000)) -> Image.Image:
+    """The synthetic receipt (scaled up 2×) lying on a plain table."""
+    receipt = _receipt().convert("RGB")
+    receipt = receipt.resize((receipt.size[0] * 2, receipt.size[1] * 2))
+    sheet = receipt.rotate(tilt, expand=True, resample=Image.BICUBIC)
+    mask = Image.new("L", receipt.size, 255).rotate(tilt, expand=True)
+    frame = Image.new("RGB", size, background)
+    frame.paste(sheet, (300, 400), mask)
+    return frame
+
+
+class TestLocateReceipt:
+    def test_box_hugs_the_sheet(self):
+        (left, top, right, bottom), angle = locate_receipt(_photo())
+        assert angle == 0.0
+        assert 240 <= left <= 300 and 340 <= top <= 400
+        assert 1100 <= right <= 1160 and 1400 <= bottom <= 1460
+
+    @pytest.mark.parametrize("tilt", [-12, -5, 3, 8])
+    def test_skew_is_measured_from_the_text_lines(self, tilt):
+        _, angle = locate_receipt(_photo(tilt))
+        assert abs(angle + tilt) <= 1.0
+
+    def test_no_boundary_against_a_bright_background(self):
+        assert locate_receipt(_photo(background=(250, 250, 250))) is None
+
+    def test_receipt_filling_the_frame_is_left_alone(self):
+        assert locate_receipt(_receipt().convert("RGB")) is None
+
+
+class TestCropToReceipt:
+    def test_crop_and_deskew(self):
+        photo = _photo(6)
+        straight = crop_to_receipt(photo)
+        assert straight.size[0] * straight.size[1] < 0.35 * photo.size[0] * photo.size[1]
+        assert locate_receipt(straight.resize((straight.size[0] // 2, straight.size[1] // 2))) is None
+
+    def test_preprocess_sends_only_the_receipt(self, monkeypatch):
+        photo = _to_base64(_photo())
+        monkeypatch.setattr(image_processor, "RECEIPT_CROP", False)
+        full = image_processor.ImageProcessor().preprocess(photo)
+        monkeypatch.setattr(image_processor, "RECEIPT_CROP", True)
+        cropped = image_processor.ImageProcessor().preprocess(photo)
+
+        assert len(cropped) < len(full)
+        assert Image.open(io.BytesIO(base64.b64decode(cropped))).size[0] < 1000
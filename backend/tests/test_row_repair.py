@@ -0,0 +1,140 @@
+"""Tests for finding, cropping and re-reading the rows that keep a receipt from adding up."""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import base64
+import io
+
+import pytest
+from PIL import Image
+
+import pipeline
+from agents.parser_agent import ParserAgent
+from agents.row_repair import RowRepairAgent, discrepancy, find_suspects, patch_receipt
+from models.data_models import Receipt
+from tests.fakes import FakeClient
+from tests.test_image_quality import _to_base64
+from tests.test_store_templates import WALMART, _vision
+from utils.image_processor import ImageProcessor
+from utils.sample_generator import _create_receipt_image
+from utils.text_rows import MAX_CROP_WIDTH, MIN_CROP_HEIGHT
+
+TIDE_LINE, ROMA_LINE, SUBTOTAL_LINE, TAX_LINE, TOTAL_LINE = 11, 12, 15, 16, 17
+
+
+def _misread(item: str = None, **fields) -> Receipt:
+    """The Walmart sample as parsed when the model misread one value."""
+    data = _vision(WALMART)
+    for line in data["items"]:
+        if item and line["name"].startswith(item):
+            line.update(fields)
+    data.update({k: v for k, v in fields.items() if k in ("subtotal", "tax", "total")})
+    return ParserAgent().parse(data)
+
+
+def _by_line(suspects) -> dict:
+    return {s.line: s for s in suspects}
+
+
+class TestFindSuspects:
+    def test_receipt_that_adds_up_has_none(self):
+        assert find_suspects(_misread()) == []
+
+    def test_item_one_digit_from_the_gap(self):
+        suspects = _by_line(find_suspects(_misread("Tide", unit_price=12.47, total_price=12.47)))
+        assert TIDE_LINE in suspects
+        assert suspects[TIDE_LINE].kind == "item" and "gap" in suspects[TIDE_LINE].reason
+        assert SUBTOTAL_LINE not in suspects
+
+    def test_item_whose_amount_disagrees_with_qty_times_unit(self):
+        receipt = _misread("Roma", unit_price=2.77)
+        roma = next(i for i in receipt.items if i.name.startswith("Roma"))
+        assert roma.confidence < 0.6
+        suspects = _by_line(find_suspects(receipt))
+        assert suspects[ROMA_LINE].kind == "item"
+
+    def test_subtotal_when_items_match_total_minus_tax(self):
+        suspects = find_suspects(_misread(subtotal=57.86))
+        assert [(s.kind, s.line) for s in suspects] == [("subtotal", SUBTOTAL_LINE)]
+
+    def test_tax_and_total_when_items_match_subtotal(self):
+        suspects = find_suspects(_misread(tax=4.09))
+        assert [(s.kind, s.line) for s in suspects] == [("tax", TAX_LINE), ("total", TOTAL_LINE)]
+
+
+class TestPatch:
+    def test_correct_reading_reconciles(self):
+        receipt = _misread(subtotal=57.86)
+        patched = patch_receipt(receipt, find_suspects(receipt), [{"amount": 57.36}])
+        assert patched.subtotal == 57.36 and discrepancy(patched) == 0
+        assert receipt.subtotal == 57.86          # the input is left alone
+
+    def test_item_reading_replaces_the_item(self):
+        receipt = _misread("Tide", unit_price=12.47, total_price=12.47)
+        suspects = [s for s in find_suspects(receipt) if s.line == TIDE_LINE]
+        reading = {"name": "Tide Detergent 92oz", "quantity": 1, "unit_price": 12.97, "total_price": 12.97}
+        patched = patch_receipt(receipt, suspects, [reading])
+        assert patched.items[suspects[0].index].total_price == 12.97
+        assert discrepancy(patched) == 0
+
+    @pytest.mark.parametrize("reading", [{"amount": 57.96}, {"amount": "n/a"}, {}, None])
+    def test_unhelpful_reading_keeps_the_receipt(self, reading):
+        receipt = _misread(subtotal=57.86)
+        assert patch_receipt(receipt, find_suspects(receipt), [reading]) is receipt
+
+
+def _sample_image() -> str:
+    image = _create_receipt_image(WALMART["store"], WALMART["date"], WALMART["items"], WALMART["tax_rate"])
+    return _to_base64(image)
+
+
+class TestCropLines:
+    def test_strips_are_legible_height(self):
+        crops = ImageProcessor().crop_lines(_sample_image(), [TIDE_LINE, TOTAL_LINE], 19)
+        for crop in crops:
+            strip = Image.open(io.BytesIO(base64.b64decode(crop)))
+            assert strip.width > strip.height and strip.width <= MAX_CROP_WIDTH
+            assert strip.height >= MIN_CROP_HEIGHT or strip.width == MAX_CROP_WIDTH
+
+    def test_unplaceable_line_gives_none(self):
+        assert ImageProcessor().crop_lines(_sample_image(), [40], 19) == [None]
+
+
+class TestRepairReceipt:
+    def _wire(self, monkeypatch, reply):
+        client = FakeClient(reply)
+        monkeypatch.setattr(pipeline, "get_row_repair_agent", lambda: RowRepairAgent(client=client))
+        return client
+
+    def test_suspicious_rows_are_reread_and_patched(self, monkeypatch):
+        client = self._wire(monkeypatch, {"amount": 57.36})
+        receipt = _misread(subtotal=57.86)
+
+        repaired = pipeline.repair_receipt(receipt, _sample_image())
+        assert repaired.subtotal == 57.36
+        assert len(client.calls) == 1
+        image = client.calls[0]["messages"][0]["content"][0]["image_url"]
+        assert image["detail"] == "high"
+        assert client.calls[0]["max_tokens"] <= 100
+
+    def test_receipt_that_adds_up_costs_no_call(self, monkeypatch):
+        client = self._wire(monkeypatch, {"amount": 0})
+        receipt = _misread()
+        assert pipeline.repair_receipt(receipt, _sample_image()) is receipt
+        assert client.calls == []
+
+    def test_too_many_suspects_are_left_alone(self, monkeypatch):
+        client = self._wire(monkeypatch, {"amount": 0})
+        monkeypatch.setattr(pipeline, "ROW_REPAIR_MAX_ROWS", 1)
+        receipt = _misread(tax=4.09)
+        assert pipeline.repair_receipt(receipt, _sample_image()) is receipt
+        assert client.calls == []
+
+    def test_failed_rereads_keep_the_receipt(self, monkeypatch):
+        def reply(kwargs):
+            raise RuntimeError("model unavailable")
+
+        self._wire(monkeypatch, reply)
+        receipt = _misread(tax=4.09)
+        assert pipeline.repair_receipt(receipt, _sample_image()) is receipt
@@ -0,0 +1,145 @@
+"""Tests for in-flight request coalescing."""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import asyncio
+
+import pytest
+
+from utils.micro_batcher import MicroBatcher
+from utils.single_flight import SingleFlight, request_digest
+
+
+class TestRequestDigest:
+    def test_data_uri_prefix_is_ignored(self):
+        assert request_digest("data:image/png;base64,QUJD") == request_digest("QUJD")
+
+    def test_options_change_the_key(self):
+        assert request_digest("QUJD", aggressive=True) != request_digest("QUJD", aggressive=False)
+        assert request_digest("QUJD", a=1, b=2) == request_digest("QUJD", b=2, a=1)
+
+
+class TestSingleFlight:
+    def test_concurrent_identical_calls_share_one_run(self):
+        calls = []
+
+        async def work():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return "result"
+
+        async def main():
+            flights = SingleFlight("test")
+            outcomes = await asyncio.gather(*(flights.do("k", work) for _ in range(5)))
+            return flights, outcomes
+
+        flights, outcomes = asyncio.run(main())
+        assert len(calls) == 1
+        assert [r for r, _ in outcomes] == ["result"] * 5
+        assert sorted(shared for _, shared in outcomes) == [False, True, True, True, True]
+        assert flights.coalesced == 4 and len(flights) == 0
+
+    def test_different_keys_run_separately(self):
+        calls = []
+
+        async def work():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return len(calls)
+
+        async def main():
+            flights = SingleFlight("test")
+            return await asyncio.gather(flights.do("a", work), flights.do("b", work))
+
+        asyncio.run(main())
+        assert len(calls) == 2
+
+    def test_errors_reach_every_waiter_and_clear_the_key(self):
+        async def boom():
+            await asyncio.sleep(0.01)
+            raise RuntimeError("model unavailable")
+
+        async def main():
+            flights = SingleFlight("test")
+            results = await asyncio.gather(
+                flights.do("k", boom), flights.do("k", boom), return_exceptions=True
+            )
+            return flights, results
+
+        flights, results = asyncio.run(main())
+        assert all(isinstance(r, RuntimeError) for r in results)
+        assert len(flights) == 0
+
+    def test_cancelled_leader_does_not_cancel_followers(self):
+        async def work():
+            await asyncio.sleep(0.05)
+            return "done"
+
+        async def main():
+            flights = SingleFlight("test")
+            leader = asyncio.ensure_future(flights.do("k", work))
+            await asyncio.sleep(0)
+            follower = asyncio.ensure_future(flights.do("k", work))
+            await asyncio.sleep(0)
+            leader.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await leader
+            return await follower
+
+        assert asyncio.run(main()) == ("done", True)
+
+
+class TestMicroBatcher:
+    def test_requests_within_window_share_one_call(self):
+        batches = []
+
+        def resolve(keys):
+            batches.append(sorted(keys))
+            return {k: k.upper() for k in keys}
+
+        async def main():
+            batcher = MicroBatcher("test", resolve, window_ms=10)
+            return await asyncio.gather(*(batcher.submit(k) for k in ["a", "b", "a", "c"]))
+
+        assert asyncio.run(main()) == ["A", "B", "A", "C"]
+        assert batches == [["a", "b", "c"]]
+
+    def test_max_batch_flushes_early(self):
+        batches = []
+
+        def resolve(keys):
+            batches.append(len(keys))
+            return {k: k for k in keys}
+
+        async def main():
+            batcher = MicroBatcher("test", resolve, window_ms=1000, max_batch=2)
+            return await asyncio.wait_for(
+                asyncio.gather(*(batcher.submit(k) for k in ["a", "b"])), timeout=0.5
+            )
+
+        assert asyncio.run(main()) == ["a", "b"]
+        assert batches == [2]
+
+    def test_missing_and_failing_keys_raise(self):
+        async def main():
+            batcher = MicroBatcher("test", lambda keys: {}, window_ms=1)
+            with pytest.raises(KeyError):
+                await batcher.submit("x")
+            failing = MicroBatcher("test", lambda keys: 1 / 0, window_ms=1)
+            with pytest.raises(ZeroDivisionError):
+                await failing.submit("y")
+
+        asyncio.run(main())
+
+    def test_running_batches_are_referenced_until_done(self):
+        async def main():
+            batcher = MicroBatcher("test", lambda keys: {k: k for k in keys}, window_ms=1)
+            submitted = asyncio.ensure_future(batcher.submit("a"))
+            while not batcher._tasks:
+                await asyncio.sleep(0.001)
+            assert await submitted == "a"
+            await asyncio.sleep(0)
+            return batcher._tasks
+
+        assert asyncio.run(main()) == set()
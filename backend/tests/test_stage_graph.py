@@ -0,0 +1,203 @@
+"""Tests for the stage-graph executor, request deadlines and the staged pipeline."""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import pipeline
+from agents.analysis_agent import DEFAULT_CATEGORY, AnalysisAgent
+from agents.llm_agent import LLMAgent
+from agents.local_insights import InsightRouter, LocalInsightEngine
+from agents.ocr_agent import OCRAgent
+from agents.parser_agent import ParserAgent
+from models.data_models import ReceiptItem
+from storage.price_baseline import MIN_CATEGORY_SAMPLES, PriceBaseline
+from storage.receipt_store import ReceiptStore
+from tests.fakes import FakeClient
+from tests.test_image_quality import _receipt, _to_base64
+from tests.test_pipeline import SAMPLE_STRUCTURED
+from tests.test_storage import _make_result
+from utils.deadline import DeadlineExceeded, deadline, remaining, timeout_kwargs
+from utils.stage_graph import Stage, StageGraph
+
+
+@pytest.fixture
+def pool():
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        yield executor
+
+
+def _sleep(seconds: float, value=None):
+    def fn(results):
+        time.sleep(seconds)
+        return value
+    return fn
+
+
+class TestDeadline:
+    def test_no_budget_means_no_timeout(self):
+        assert remaining() is None
+        assert timeout_kwargs() == {}
+
+    def test_model_calls_get_the_time_left(self):
+        with deadline(30):
+            assert 29 < timeout_kwargs()["timeout"] <= 30
+        assert remaining() is None
+
+    def test_nested_deadline_never_extends(self):
+        with deadline(5):
+            with deadline(60):
+                assert remaining() <= 5
+
+    def test_timed_out_call_is_not_retried_past_the_budget(self):
+        httpx = pytest.importorskip("httpx")
+        openai = pytest.importorskip("openai")
+        attempts = []
+
+        def hang(request):
+            # A server that never answers: the transport gives up after the read timeout
+            attempts.append(request)
+            time.sleep(request.extensions["timeout"]["read"])
+            raise httpx.ReadTimeout("timed out", request=request)
+
+        client = openai.OpenAI(api_key="test", http_client=httpx.Client(transport=httpx.MockTransport(hang)))
+        start = time.monotonic()
+        with deadline(1.2), pytest.raises(openai.APITimeoutError):
+            OCRAgent(client=client).extract_text("image")
+        assert len(attempts) == 1
+        assert time.monotonic() - start < 1.5
+
+    def test_spent_budget_refuses_model_calls(self):
+        with deadline(0.5):
+            with pytest.raises(DeadlineExceeded):
+                timeout_kwargs()
+
+
+class TestStageGraph:
+    def test_independent_stages_run_concurrently(self, pool):
+        graph = StageGraph([
+            Stage("a", _sleep(0.2, 1)),
+            Stage("b", _sleep(0.2, 2)),
+            Stage("sum", lambda r: r["a"] + r["b"], deps=("a", "b")),
+        ])
+        start = time.monotonic()
+        run = graph.run(pool)
+        assert run.results["sum"] == 3
+        assert time.monotonic() - start < 0.35
+        assert set(run.timings) == {"a", "b", "sum"}
+
+    def test_dependencies_must_come_first(self):
+        with pytest.raises(ValueError):
+            StageGraph([Stage("b", _sleep(0), deps=("a",)), Stage("a", _sleep(0))])
+
+    def test_short_circuit_skips_dependents_and_outranks_errors(self, pool):
+        def fail(results):
+            raise RuntimeError("bad photo")
+
+        ran = []
+        run = StageGraph([
+            Stage("duplicate", _sleep(0.1, "stored"), short_circuit=True),
+            Stage("quality", fail),
+            Stage("ocr", lambda r: ran.append("ocr"), deps=("duplicate", "quality")),
+        ]).run(pool)
+        assert (run.stopped_by, run.result, ran) == ("duplicate", "stored", [])
+
+    def test_errors_propagate(self, pool):
+        def fail(results):
+            raise RuntimeError("boom")
+
+        with pytest.raises(RuntimeError):
+            StageGraph([Stage("a", fail), Stage("b", _sleep(0), deps=("a",))]).run(pool)
+
+    def test_deadline_uses_fallbacks_and_keeps_going(self, pool):
+        graph = StageGraph([
+            Stage("fast", _sleep(0, "read")),
+            Stage("slow", _sleep(2, "model"), deps=("fast",), fallback=lambda r: "local"),
+            Stage("final", lambda r: f"{r['fast']}+{r['slow']}", deps=("slow",)),
+        ])
+        start = time.monotonic()
+        with deadline(0.2):
+            run = graph.run(pool)
+        assert time.monotonic() - start < 1
+        assert run.results["final"] == "read+local"
+        assert run.fell_back == ["slow"]
+
+    def test_model_call_past_the_deadline_fails_the_run(self, pool):
+        def ocr(results):
+            time.sleep(0.2)
+            return timeout_kwargs()       # where the model call would be made
+
+        with deadline(0.1):
+            with pytest.raises(DeadlineExceeded):
+                StageGraph([Stage("preprocess", _sleep(0)), Stage("ocr", ocr, deps=("preprocess",))]).run(pool)
+
+
+class TestStagedPipeline:
+    def setup_method(self):
+        self.release = threading.Event()
+
+    def teardown_method(self):
+        # Let an abandoned categorization finish before the test's log capture closes
+        self.release.set()
+        time.sleep(0.2)
+
+    def _wire(self, monkeypatch, categorize_seconds: float, baseline=None):
+        ocr_client = FakeClient(SAMPLE_STRUCTURED)
+
+        def slow_categories(kwargs):
+            self.release.wait(categorize_seconds)
+            return {"Groceries": list(range(1, 10))}
+
+        analysis_client = FakeClient(slow_categories)
+        monkeypatch.setattr(pipeline, "get_ocr_agent", lambda: OCRAgent(client=ocr_client))
+        monkeypatch.setattr(pipeline, "get_parser_agent", ParserAgent)
+        monkeypatch.setattr(
+            pipeline, "get_analysis_agent", lambda: AnalysisAgent(client=analysis_client, baseline=baseline)
+        )
+        router = InsightRouter(LocalInsightEngine(), lambda: LLMAgent(client=FakeClient({})))
+        monkeypatch.setattr(pipeline, "get_insight_router", lambda: router)
+        return ocr_client, analysis_client
+
+    def test_model_calls_carry_the_deadline(self, monkeypatch):
+        ocr_client, analysis_client = self._wire(monkeypatch, categorize_seconds=0)
+        result = pipeline.run_analysis(
+            _to_base64(_receipt()), detect_duplicates=False, insights_mode="local", deadline_s=30
+        )
+        assert {i.category for i in result.receipt.items} == {"Groceries"}
+        assert 0 < ocr_client.calls[0]["timeout"] <= 30
+        assert 0 < analysis_client.calls[0]["timeout"] <= 30
+
+    def test_slow_categorization_falls_back_at_the_deadline(self, monkeypatch):
+        self._wire(monkeypatch, categorize_seconds=5)
+        start = time.time()
+        result = pipeline.run_analysis(
+            _to_base64(_receipt()), detect_duplicates=False, insights_mode="local", deadline_s=2.5
+        )
+        assert time.time() - start < 4
+        assert {i.category for i in result.receipt.items} == {DEFAULT_CATEGORY}
+        assert result.spending_analysis.total_spending == pytest.approx(47.44)
+        assert result.llm_insight.source == "local"
+
+    def test_price_anomalies_match_analyze(self, monkeypatch):
+        # Only category history: none of the receipt's items has been seen before
+        store = ReceiptStore(":memory:")
+        store.save(_make_result(items=[
+            ReceiptItem(name=f"Staple {n}", unit_price=price, total_price=price, category="Groceries")
+            for n, price in enumerate([1.8, 2.0, 2.2] * (MIN_CATEGORY_SAMPLES // 3 + 1))
+        ]))
+        baseline = PriceBaseline(store)
+        self._wire(monkeypatch, categorize_seconds=0, baseline=baseline)
+        result = pipeline.run_analysis(
+            _to_base64(_receipt()), detect_duplicates=False, insights_mode="local", deadline_s=30
+        )
+        agent = AnalysisAgent(client=FakeClient({"Groceries": list(range(1, 10))}), baseline=baseline)
+        expected = agent.analyze(ParserAgent().parse(SAMPLE_STRUCTURED))
+        store.close()
+
+        assert any("more than typical for Groceries" in a for a in expected.anomalies)
+        assert result.spending_analysis.anomalies == expected.anomalies
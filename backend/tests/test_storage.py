@@ -0,0 +1,248 @@
+"""Tests for the SQLite receipt store."""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import statistics
+
+import pytest
+from models.data_models import (
+    AnalysisResult, CategoryAnalysis, LLMInsight,
+    Receipt, ReceiptItem, SpendingAnalysis,
+)
+from agents.analysis_agent import AnalysisAgent
+from storage.aggregation import SpendingAggregator
+from storage.price_baseline import PriceBaseline
+from storage.receipt_store import ReceiptStore, normalize_date
+
+
+def _make_result(store="Walmart", date="02/10/2026", items=None) -> AnalysisResult:
+    items = items or [
+        ReceiptItem(name="Whole Milk", unit_price=3.49, total_price=3.49, category="Dairy & Eggs"),
+        ReceiptItem(name="Cheddar", unit_price=5.99, total_price=5.99, category="Dairy & Eggs"),
+        ReceiptItem(name="Tide Pods", unit_price=13.99, total_price=13.99, category="Laundry"),
+    ]
+    total = round(sum(i.total_price for i in items), 2)
+    buckets: dict[str, list[ReceiptItem]] = {}
+    for item in items:
+        buckets.setdefault(item.category, []).append(item)
+    breakdown = [
+        CategoryAnalysis(
+            category=cat,
+            total_spent=round(sum(i.total_price for i in cat_items), 2),
+            percentage=round(sum(i.total_price for i in cat_items) / total * 100, 1),
+            item_count=len(cat_items),
+            items=[i.name for i in cat_items],
+        )
+        for cat, cat_items in buckets.items()
+    ]
+    return AnalysisResult(
+        receipt=Receipt(items=items, store_name=store, date=date),
+        spending_analysis=SpendingAnalysis(
+            total_spending=total, category_breakdown=breakdown, top_category=breakdown[0].category,
+        ),
+        llm_insight=LLMInsight(summary="ok", recommendations=[], budget_tips=[], savings_potential="$0"),
+    )
+
+
+class TestReceiptStore:
+    def setup_method(self):
+        self.store = ReceiptStore(":memory:")
+
+    def teardown_method(self):
+        self.store.close()
+
+    def test_save_assigns_id_and_round_trips(self):
+        result = _make_result()
+        receipt_id = self.store.save(result)
+        assert receipt_id and result.id == receipt_id
+        loaded = self.store.get(receipt_id)
+        assert loaded is not None
+        assert loaded.receipt.total == pytest.approx(result.receipt.total)
+        assert [i.name for i in loaded.receipt.items] == ["Whole Milk", "Cheddar", "Tide Pods"]
+
+    def test_get_missing_returns_none(self):
+        assert self.store.get("does-not-exist") is None
+
+    def test_save_many_is_one_batch(self):
+        ids = self.store.save_many([_make_result(date=f"02/{d:02d}/2026") for d in range(1, 11)])
+        assert len(set(ids)) == 10
+        assert self.store.count() == 10
+
+    def test_resave_replaces_items(self):
+        result = _make_result()
+        self.store.save(result)
+        self.store.save(result)
+        rows = self.store._conn.execute(
+            "SELECT COUNT(*) FROM items WHERE receipt_id = ?", (result.id,)
+        ).fetchone()[0]
+        assert rows == 3
+
+    def test_list_filters(self):
+        self.store.save(_make_result(store="Walmart", date="02/10/2026"))
+        self.store.save(_make_result(store="Target", date="03/01/2026"))
+        assert [r.store_name for r in self.store.list_receipts()] == ["Target", "Walmart"]
+        assert len(self.store.list_receipts(store="Walmart")) == 1
+        assert len(self.store.list_receipts(date_from="2026-03-01")) == 1
+        assert len(self.store.list_receipts(category="Laundry")) == 2
+        assert self.store.list_receipts(category="Frozen") == []
+
+    def test_indexes_exist(self):
+        names = {
+            row[0] for row in self.store._conn.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'index'"
+            )
+        }
+        assert {"idx_receipts_date", "idx_receipts_store", "idx_items_category"} <= names
+
+
+class TestNormalizeDate:
+    def test_common_formats(self):
+        assert normalize_date("02/10/2026") == "2026-02-10"
+        assert normalize_date("2026-02-10") == "2026-02-10"
+        assert normalize_date("Feb 10, 2026") == "2026-02-10"
+
+    def test_unparseable_uses_fallback(self):
+        assert normalize_date("yesterday", "2026-05-01T10:00:00") == "2026-05-01"
+        assert normalize_date(None) is None
+
+
+class TestSpendingAggregator:
+    def setup_method(self):
+        self.store = ReceiptStore(":memory:")
+        self.agg = SpendingAggregator(self.store)
+        self.store.save_many([
+            _make_result(store="Walmart", date="01/05/2026"),
+            _make_result(store="Walmart", date="01/20/2026"),
+            _make_result(store="Target", date="02/03/2026"),
+            _make_result(store="Target", date="03/15/2026"),
+        ])
+
+    def teardown_method(self):
+        self.store.close()
+
+    def test_monthly_trend_with_rolling_total(self):
+        points = self.agg.trends(grain="month", window=2)
+        assert [p.bucket for p in points] == ["2026-01", "2026-02", "2026-03"]
+        assert points[0].total_spent == pytest.approx(2 * 23.47)
+        assert points[0].receipt_count == 2
+        assert points[1].rolling_total == pytest.approx(3 * 23.47)
+        assert points[2].rolling_total == pytest.approx(2 * 23.47)
+
+    def test_category_and_store_filters(self):
+        dairy = self.agg.trends(grain="day", category="Dairy & Eggs", store_name="Target")
+        assert [p.bucket for p in dairy] == ["2026-02-03", "2026-03-15"]
+        assert all(p.total_spent == pytest.approx(9.48) for p in dairy)
+
+    def test_category_shares(self):
+        shares = self.agg.category_shares(date_from="2026-02-01")
+        assert [s.category for s in shares] == ["Laundry", "Dairy & Eggs"]
+        assert sum(s.percentage for s in shares) == pytest.approx(100.0, abs=0.2)
+
+    def test_store_comparison(self):
+        stores = {s.store_name: s for s in self.agg.store_comparison()}
+        assert stores["Walmart"].receipt_count == 2
+        assert stores["Walmart"].average_receipt == pytest.approx(23.47)
+
+    def test_resave_keeps_rollups_consistent(self):
+        result = _make_result(store="Costco", date="04/01/2026")
+        self.store.save(result)
+        result.receipt.store_name = "Costco Wholesale"
+        self.store.save(result)
+        stores = {s.store_name for s in self.agg.store_comparison()}
+        assert "Costco" not in stores and "Costco Wholesale" in stores
+
+        before = [p.model_dump() for p in self.agg.trends(grain="day")]
+        self.store.rebuild_rollups()
+        assert [p.model_dump() for p in self.agg.trends(grain="day")] == before
+
+    def test_invalid_grain(self):
+        with pytest.raises(ValueError):
+            self.agg.trends(grain="week")
+
+
+class TestPriceBaseline:
+    MILK_PRICES = [3.49, 3.59, 3.45, 3.52, 3.49, 3.55, 3.50]
+
+    def setup_method(self):
+        self.store = ReceiptStore(":memory:")
+        self.baseline = PriceBaseline(self.store)
+        for price in self.MILK_PRICES:
+            self.store.save(_make_result(items=[
+                ReceiptItem(name="Whole  Milk", unit_price=price, total_price=price, category="Dairy"),
+                ReceiptItem(name="Bread", unit_price=2.99, total_price=2.99, category="Bakery"),
+            ]))
+
+    def teardown_method(self):
+        self.store.close()
+
+    def test_running_stats_match_batch_stats(self):
+        count, mean, std = self.baseline.stats_for(
+            [ReceiptItem(name="whole milk", unit_price=1, total_price=1, category="Dairy")]
+        )[("item", "whole milk")]
+        assert count == len(self.MILK_PRICES)
+        assert mean == pytest.approx(statistics.mean(self.MILK_PRICES))
+        assert std == pytest.approx(statistics.stdev(self.MILK_PRICES))
+
+    def test_rebuild_matches_incremental(self):
+        before = self.store.query("SELECT * FROM price_stats ORDER BY kind, key")
+        self.store.rebuild_price_stats()
+        after = self.store.query("SELECT * FROM price_stats ORDER BY kind, key")
+        for old, new in zip(before, after):
+            assert old["count"] == new["count"]
+            assert old["mean"] == pytest.approx(new["mean"])
+            assert old["m2"] == pytest.approx(new["m2"], abs=1e-9)
+
+    def test_flags_price_jump_against_history(self):
+        items = [
+            ReceiptItem(name="Whole Milk", unit_price=4.59, total_price=4.59, category="Dairy"),
+            ReceiptItem(name="Bread", unit_price=2.99, total_price=2.99, category="Bakery"),
+        ]
+        anomalies, covered = self.baseline.find_anomalies(items)
+        assert covered == {"Whole Milk", "Bread"}
+        assert len(anomalies) == 1 and "Whole Milk costs 31% more" in anomalies[0]
+
+    def test_resave_does_not_double_count(self):
+        result = _make_result(items=[
+            ReceiptItem(name="Eggs", unit_price=4.0, total_price=4.0, category="Dairy"),
+        ])
+        self.store.save(result)
+        self.store.save(result)
+        count = self.store.query("SELECT count FROM price_stats WHERE key = 'eggs'")[0]["count"]
+        assert count == 1
+
+    def test_corrected_price_replaces_the_misread_one(self):
+        before = self.store.query("SELECT * FROM price_stats ORDER BY kind, key")
+        result = _make_result(items=[
+            ReceiptItem(name="Whole Milk", unit_price=35.9, total_price=35.9, category="Dairy"),
+            ReceiptItem(name="Oat Milk", unit_price=4.29, total_price=4.29, category="Dairy"),
+        ])
+        self.store.save(result)
+        result.receipt.items[0].unit_price = result.receipt.items[0].total_price = 3.59
+        result.receipt.items = result.receipt.items[:1]
+        self.store.save(result)
+
+        count, mean, _ = self.baseline.stats_for(result.receipt.items)[("item", "whole milk")]
+        assert count == len(self.MILK_PRICES) + 1
+        assert mean == pytest.approx(statistics.mean(self.MILK_PRICES + [3.59]))
+        assert not self.store.query("SELECT * FROM price_stats WHERE key = 'oat milk'")
+        after = self.store.query("SELECT * FROM price_stats ORDER BY kind, key")
+        self.store.rebuild_price_stats()
+        rebuilt = self.store.query("SELECT * FROM price_stats ORDER BY kind, key")
+        keys = lambda rows: [(r["kind"], r["key"], r["count"]) for r in rows]
+        assert keys(after) == keys(rebuilt)
+        for incremental, batch in zip(after, rebuilt):
+            assert incremental["mean"] == pytest.approx(batch["mean"])
+            assert incremental["m2"] == pytest.approx(batch["m2"], abs=1e-9)
+        assert len(after) == len(before)
+
+    def test_analysis_agent_uses_baseline(self):
+        agent = AnalysisAgent(api_key="test", baseline=self.baseline)
+        items = [
+            ReceiptItem(name="Whole Milk", unit_price=3.50, total_price=3.50, category="Dairy"),
+            ReceiptItem(name="Bread", unit_price=2.99, total_price=2.99, category="Bakery"),
+            ReceiptItem(name="Wagyu Steak", unit_price=40.0, total_price=40.0, category="Meat"),
+        ]
+        anomalies = agent._find_anomalies(items, 46.49)
+        # Normal milk price is not flagged; unseen steak falls back to the per-receipt rule
+        assert anomalies == ["Wagyu Steak is unusually expensive ($40.00)"]
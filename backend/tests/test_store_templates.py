@@ -0,0 +1,167 @@
+"""Tests for learned per-store receipt templates and the text-first OCR path."""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pipeline
+from agents.ocr_agent import OCRAgent
+from agents.parser_agent import ParserAgent
+from agents.store_templates import MIN_HIT_RATE, MIN_OBSERVATIONS, PROBE_EVERY, StoreTemplates
+from storage.receipt_store import ReceiptStore
+from tests.fakes import FakeClient
+from tests.test_storage import _make_result
+from utils.sample_generator import SAMPLE_RECEIPTS, receipt_text
+
+WALMART = SAMPLE_RECEIPTS[0]
+
+
+def _vision(sample: dict, items=None) -> dict:
+    """What the structured vision call returns for a sample receipt."""
+    items = items or sample["items"]
+    lines = [
+        {"name": name, "quantity": qty, "unit_price": price, "total_price": round(qty * price, 2)}
+        for name, qty, price in items
+    ]
+    subtotal = round(sum(line["total_price"] for line in lines), 2)
+    tax = round(subtotal * sample["tax_rate"], 2)
+    return {
+        "store_name": sample["store"],
+        "date": sample["date"],
+        "items": lines,
+        "subtotal": subtotal,
+        "tax": tax,
+        "total": round(subtotal + tax, 2),
+        "raw_text": receipt_text(sample["store"], sample["date"], items, sample["tax_rate"]),
+    }
+
+
+def _trained(*samples) -> ParserAgent:
+    parser = ParserAgent(templates=StoreTemplates())
+    for sample in samples:
+        for _ in range(MIN_OBSERVATIONS):
+            parser.parse(_vision(sample))
+    return parser
+
+
+class TestLearning:
+    def test_template_needs_repeated_validated_receipts(self):
+        parser = ParserAgent(templates=StoreTemplates())
+        parser.parse(_vision(WALMART))
+        assert len(parser.templates) == 0
+        parser.parse(_vision(WALMART))
+        assert len(parser.templates) == 1
+        learned = parser.templates.stats()["templates"][0]
+        assert learned["shapes"] == ["qty_column"]
+        assert {"subtotal", "tax", "total"} <= set(learned["skip"])
+
+    def test_inconsistent_vision_result_is_not_learned(self):
+        data = _vision(WALMART)
+        data["items"] = data["items"][:-1]         # the model missed a line
+        templates = StoreTemplates()
+        assert not templates.learn(ParserAgent().parse(data))
+
+    def test_relearned_from_history(self):
+        store = ReceiptStore(":memory:")
+        for _ in range(MIN_OBSERVATIONS):
+            result = _make_result()
+            result.receipt = ParserAgent().parse(_vision(WALMART))
+            store.save(result)
+        assert len(StoreTemplates.from_store(store)) == 1
+
+
+class TestTemplateParsing:
+    def test_new_receipt_from_known_store_matches_vision(self):
+        parser = _trained(WALMART, SAMPLE_RECEIPTS[2])
+        items = [("Paper Plates 50ct", 1, 4.49), ("Gatorade 8pk", 2, 6.99), ("Pasta Sauce", 3, 2.19)]
+        expected = ParserAgent().parse(_vision(WALMART, items))
+
+        text = receipt_text(WALMART["store"], "03/01/2026", items, WALMART["tax_rate"])
+        assert parser.templates.parse(text) is not None
+        receipt = parser.parse(text)
+        assert [(i.name, i.quantity, i.total_price) for i in receipt.items] == [
+            (i.name, i.quantity, i.total_price) for i in expected.items
+        ]
+        assert (receipt.store_name, receipt.subtotal, receipt.total) == (
+            expected.store_name, expected.subtotal, expected.total
+        )
+        assert receipt.date == "03/01/2026"
+
+    def test_unknown_store_is_not_parsed(self):
+        parser = _trained(WALMART)
+        sample = SAMPLE_RECEIPTS[1]
+        assert parser.templates.parse(receipt_text(sample["store"], sample["date"], sample["items"], 0.08)) is None
+
+    def test_layout_change_fails_validation(self):
+        parser = _trained(WALMART)
+        text = receipt_text(WALMART["store"], WALMART["date"], WALMART["items"], WALMART["tax_rate"])
+        # A dropped line no longer adds up to the printed subtotal
+        text = "\n".join(line for line in text.splitlines() if not line.startswith("Banana"))
+        assert parser.templates.parse(text) is None
+        assert len(parser.parse(text).items) > 0        # the generic parser still answers
+
+
+class TestTextFirstOCR:
+    def _wire(self, monkeypatch, parser: ParserAgent, text: str):
+        def reply(kwargs):
+            return _vision(WALMART) if "response_format" in kwargs else text
+
+        client = FakeClient(reply)
+        monkeypatch.setattr(pipeline, "get_ocr_agent", lambda: OCRAgent(client=client))
+        monkeypatch.setattr(pipeline, "get_parser_agent", lambda: parser)
+        return client
+
+    def test_known_store_skips_the_structured_call(self, monkeypatch):
+        parser = _trained(WALMART)
+        text = receipt_text(WALMART["store"], "03/01/2026", WALMART["items"][:4], WALMART["tax_rate"])
+        client = self._wire(monkeypatch, parser, text)
+        template_parses = []
+        parse = parser.templates.parse
+        monkeypatch.setattr(parser.templates, "parse", lambda t: template_parses.append(t) or parse(t))
+
+        receipt = parser.parse(pipeline.ocr_image("image"))
+        assert len(client.calls) == 1 and "response_format" not in client.calls[0]
+        assert len(template_parses) == 1                # the pipeline's reading is passed on
+        assert len(receipt.items) == 4 and receipt.store_name == WALMART["store"]
+        assert parser.templates.hits == 1
+
+    def test_miss_falls_back_to_structured(self, monkeypatch):
+        parser = _trained(WALMART)
+        sample = SAMPLE_RECEIPTS[1]
+        client = self._wire(monkeypatch, parser, receipt_text(sample["store"], sample["date"], sample["items"], 0.08))
+
+        receipt = parser.parse(pipeline.ocr_image("image"))
+        assert len(client.calls) == 2 and "response_format" in client.calls[1]
+        assert len(receipt.items) == len(WALMART["items"])
+        assert parser.templates.misses == 1
+
+    def test_no_templates_means_no_text_first_call(self, monkeypatch):
+        client = self._wire(monkeypatch, ParserAgent(templates=StoreTemplates()), "")
+        pipeline.ocr_image("image")
+        assert len(client.calls) == 1 and "response_format" in client.calls[0]
+
+    def test_repeated_misses_stop_text_first_except_probes(self):
+        templates = _trained(WALMART).templates
+        text = receipt_text(WALMART["store"], WALMART["date"], WALMART["items"], WALMART["tax_rate"])
+        changed = "\n".join(line for line in text.splitlines() if not line.startswith("Banana"))
+        while templates.hit_rate >= MIN_HIT_RATE:
+            templates.record(changed, False)
+        assert templates.stats()["templates"][0]["hit_rate"] < MIN_HIT_RATE
+        tries = [templates.worth_trying() for _ in range(PROBE_EVERY * 3)]
+        assert sum(tries) == 3
+
+    def test_uploads_from_stores_without_a_template_skip_text_first(self, monkeypatch):
+        parser = _trained(WALMART)
+        other = SAMPLE_RECEIPTS[1]
+        unlearnable = _vision(other)
+        unlearnable["items"] = unlearnable["items"][:-1]
+        while parser.templates.hit_rate >= MIN_HIT_RATE:
+            parser.parse(unlearnable)                 # the structured path sees every upload's store
+        assert len(parser.templates) == 1
+        client = self._wire(monkeypatch, parser, receipt_text(other["store"], other["date"], other["items"], 0.08))
+        pipeline.ocr_image("image")
+        assert len(client.calls) == 1 and "response_format" in client.calls[0]
+        assert parser.templates.misses == 0
+
+        for _ in range(20):                          # Walmart uploads are back
+            parser.parse(_vision(WALMART))
+        assert parser.templates.hit_rate >= MIN_HIT_RATE
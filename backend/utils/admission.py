@@ -0,0 +1,157 @@
+import asyncio
+import math
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Degradation levels, by pressure (1.0 = at capacity or at the latency SLO)
+FULL, NO_LLM_INSIGHTS, NO_OPTIONAL_WORK = 0, 1, 2
+LEVEL_AT = {NO_LLM_INSIGHTS: 1.0, NO_OPTIONAL_WORK: 1.5}
+LATENCY_ALPHA = 0.2          # weight of the newest sample in the latency EWMA
+MAX_RETRY_AFTER_S = 60
+
+_model_calls = 0
+_model_lock = threading.Lock()
+
+
+@contextmanager
+def track_model_call():
+    """Count a blocking model call as in flight (any thread) while the block runs."""
+    global _model_calls
+    with _model_lock:
+        _model_calls += 1
+    try:
+        yield
+    finally:
+        with _model_lock:
+            _model_calls -= 1
+
+
+def model_calls_in_flight() -> int:
+    return _model_calls
+
+
+class Overloaded(Exception):
+    """Raised instead of admitting a request; ``retry_after`` is in seconds."""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Server is busy; retry in {retry_after}s")
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """Bounds concurrent pipeline runs and sheds or degrades work under overload.
+
+    Up to ``max_in_flight`` requests run at once; up to ``max_queue`` more wait
+    in FIFO order for at most ``queue_timeout`` seconds. Anything beyond that
+    raises ``Overloaded`` straight away rather than joining a queue that would
+    miss its deadline anyway.
+
+    Admitted requests get a degradation level from the current pressure: the
+    larger of load (running + waiting over capacity), model calls in flight
+    over capacity, and the latency EWMA over the ``slo`` target. Single event
+    loop only; model calls are counted from any thread via track_model_call.
+    """
+
+    def __init__(self, max_in_flight: int, max_queue: int, queue_timeout: float, slo: float):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.slo = slo
+        self.in_flight = 0
+        self.latency = None
+        self.admitted = 0
+        self.shed = 0
+        self.degraded = 0
+        self._waiters: deque = deque()
+
+    def pressure(self) -> float:
+        load = (self.in_flight + len(self._waiters)) / self.max_in_flight
+        models = model_calls_in_flight() / self.max_in_flight
+        latency = (self.latency or 0.0) / self.slo
+        return max(load, models, latency)
+
+    def level(self) -> int:
+        pressure = self.pressure()
+        return max((lvl for lvl, at in LEVEL_AT.items() if pressure >= at), default=FULL)
+
+    def retry_after(self) -> int:
+        """Seconds until a slot is likely free: queue drain time at the recent latency."""
+        per_request = self.latency if self.latency is not None else self.slo / 4
+        waves = (len(self._waiters) + 1) / self.max_in_flight
+        return max(1, min(MAX_RETRY_AFTER_S, math.ceil(per_request * waves)))
+
+    @asynccontextmanager
+    async def admit(self):
+        """Hold a slot for the block; yields the degradation level to run at."""
+        if self.in_flight >= self.max_in_flight:
+            await self._wait_for_slot()
+        else:
+            self.in_flight += 1
+        self.admitted += 1
+        level = self.level()
+        if level > FULL:
+            self.degraded += 1
+            logger.warning("⚠️ Under pressure (%.2f), degrading to level %d", self.pressure(), level)
+        start = time.monotonic()
+        try:
+            yield level
+        finally:
+            elapsed = time.monotonic() - start
+            self.latency = elapsed if self.latency is None else (
+                LATENCY_ALPHA * elapsed + (1 - LATENCY_ALPHA) * self.latency
+            )
+            self._release()
+
+    async def _wait_for_slot(self) -> None:
+        if len(self._waiters) >= self.max_queue:
+            self._shed("queue full")
+        slot = asyncio.get_running_loop().create_future()
+        self._waiters.append(slot)
+        try:
+            await asyncio.wait({slot}, timeout=self.queue_timeout)
+        except asyncio.CancelledError:
+            # The client went away; hand a slot we were just given to the next waiter
+            if slot.done():
+                self._release()
+            else:
+                slot.cancel()
+                self._waiters.remove(slot)
+            raise
+        if not slot.done():
+            slot.cancel()
+            self._waiters.remove(slot)
+            self._shed("queue timeout")
+        # The releasing request handed its slot over; in_flight is unchanged
+
+    def _release(self) -> None:
+        while self._waiters:
+            slot = self._waiters.popleft()
+            if not slot.done():
+                slot.set_result(None)
+                return
+        self.in_flight -= 1
+
+    def _shed(self, reason: str):
+        self.shed += 1
+        retry_after = self.retry_after()
+        logger.warning("🚦 Shedding request (%s), retry after %ds", reason, retry_after)
+        raise Overloaded(retry_after)
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": self.in_flight,
+            "queued": len(self._waiters),
+            "model_calls": model_calls_in_flight(),
+            "pressure": round(self.pressure(), 2),
+            "level": self.level(),
+            "latency_ewma_s": round(self.latency, 2) if self.latency is not None else None,
+            "admitted": self.admitted,
+            "shed": self.shed,
+            "degraded": self.degraded,
+        }
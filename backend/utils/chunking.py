@@ -0,0 +1,60 @@
+import threading
+
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+CALL_OVERHEAD_SECONDS = 0.8      # network + time-to-first-token for a small mini-model call
+
+
+class AdaptiveChunker:
+    """Splits work into chunks sized so each model call finishes near a target latency.
+
+    Observed (items, seconds) pairs feed an exponentially weighted estimate of
+    the marginal cost per item (after a fixed per-call overhead); the chunk
+    size is whatever fits ``target_seconds`` under that estimate.
+    """
+
+    def __init__(
+        self,
+        initial: int = 40,
+        minimum: int = 10,
+        maximum: int = 120,
+        target_seconds: float = 4.0,
+        alpha: float = 0.3,
+    ):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.target_seconds = target_seconds
+        self.alpha = alpha
+        self._size = initial
+        self._per_item: float | None = None
+        self._overhead = CALL_OVERHEAD_SECONDS
+        self._lock = threading.Lock()
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    def split(self, seq: list) -> list[list]:
+        """Even, order-preserving chunks no larger than the current size."""
+        if not seq:
+            return []
+        count = -(-len(seq) // self._size)
+        step = -(-len(seq) // count)
+        return [seq[i:i + step] for i in range(0, len(seq), step)]
+
+    def observe(self, items: int, seconds: float) -> None:
+        if items <= 0 or seconds <= 0:
+            return
+        with self._lock:
+            per_item = max(seconds - self._overhead, seconds * 0.2) / items
+            if self._per_item is None:
+                self._per_item = per_item
+            else:
+                self._per_item += self.alpha * (per_item - self._per_item)
+            budget = max(self.target_seconds - self._overhead, 0.1)
+            new_size = int(min(self.maximum, max(self.minimum, budget / self._per_item)))
+            if new_size != self._size:
+                logger.info("📏 Chunk size %d → %d (%.0f ms/item)", self._size, new_size, self._per_item * 1000)
+                self._size = new_size
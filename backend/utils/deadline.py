@@ -0,0 +1,76 @@
+"""Per-request time budgets.
+
+``run_analysis`` opens a ``deadline`` for the request. It lives in a context
+variable, so it follows the request into worker threads started with
+``contextvars.copy_context().run``. Every model call passes
+``**timeout_kwargs()`` on a ``budgeted(client)``: the call's HTTP timeout
+becomes the time left, the SDK's automatic retries (each with that same
+timeout) are switched off, and once too little is left the call is not made
+at all. A fallback chain (structured OCR, then raw text) therefore cannot run
+past the budget.
+"""
+import contextvars
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+MIN_CALL_S = 1.0      # don't start a model call with less time than this left
+
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("deadline", default=None)
+
+
+class DeadlineExceeded(TimeoutError):
+    """The request's time budget ran out before a required step could finish."""
+
+
+@contextmanager
+def deadline(seconds: Optional[float]):
+    """Give the block (and threads it starts with a copied context) ``seconds`` to finish.
+
+    ``None`` means no budget. A nested deadline never extends an outer one.
+    """
+    at = None if seconds is None else time.monotonic() + seconds
+    outer = _deadline.get()
+    if outer is not None and (at is None or outer < at):
+        at = outer
+    token = _deadline.set(at)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining() -> Optional[float]:
+    """Seconds left in the current budget, or None when there is none."""
+    at = _deadline.get()
+    return None if at is None else at - time.monotonic()
+
+
+def expired() -> bool:
+    left = remaining()
+    return left is not None and left <= 0
+
+
+def timeout_kwargs() -> dict:
+    """``timeout=`` for a model call under the current budget; ``{}`` without one.
+
+    Raises DeadlineExceeded when less than MIN_CALL_S is left.
+    """
+    left = remaining()
+    if left is None:
+        return {}
+    if left < MIN_CALL_S:
+        raise DeadlineExceeded(f"Time budget exhausted ({max(left, 0):.1f}s left)")
+    return {"timeout": left}
+
+
+def budgeted(client):
+    """``client`` for one model call under the current budget; ``client`` itself without one.
+
+    The SDK retries a timed-out request with the same timeout (twice by
+    default), so one call could take three times the time left. Under a
+    budget the call is made once and the caller's fallback takes over.
+    """
+    if remaining() is None:
+        return client
+    return client.with_options(max_retries=0)
@@ -1,29 +1,155 @@
+from __future__ import annotations
+
 import base64
 import io
-from PIL import Image, ImageEnhance, ImageFilter
+from typing import TYPE_CHECKING
 
-from config import MAX_IMAGE_WIDTH, IMAGE_QUALITY
+from config import IMAGE_QUALITY, MAX_IMAGE_WIDTH, RECEIPT_CROP, RECEIPT_DESKEW
 from utils.logger import get_logger
 
+if TYPE_CHECKING:
+    from PIL import Image
+
 logger = get_logger(__name__)
 
+HASH_ANALYSIS_SIDE = 1024    # px; uploads are decoded at about this size for hashing
+HASH_SIDE = 64               # px; the print area is hashed at this size
+HASH_SHEET_INSET = 0.01      # share of the frame side cut inside the sheet's edges
+
 
 class ImageProcessor:
-    def preprocess(self, image_base64: str, aggressive: bool = False) -> str:
-        """Preprocess a base64-encoded image for optimal OCR results."""
+    def check_quality(self, image_base64: str) -> int:
+        """Run the quality gate on an upload; returns the rotation that makes it upright.
+
+        Raises ``ImageQualityError`` for images not worth an OCR call. JPEGs
+        are decoded at reduced scale, so this takes milliseconds. Undecodable
+        payloads pass through (rotation 0) and fail later as before.
+        """
+        from utils.image_quality import ANALYSIS_SIDE, ImageQualityError, assess
+
         try:
-            logger.info("📸 Starting image preprocessing (aggressive=%s)", aggressive)
+            from PIL import ImageOps
+
             image = self._base64_to_pil(image_base64)
-            image = self._resize(image)
-            image = self._enhance(image, aggressive)
-            result = self._pil_to_base64(image)
+            image.draft("L", (ANALYSIS_SIDE, ANALYSIS_SIDE))
+            rotation, metrics = assess(ImageOps.exif_transpose(image))
+        except ImageQualityError as e:
+            logger.warning("🚫 Image rejected by quality gate: %s", e.reason, extra={"reason": e.reason})
+            raise
+        except Exception as e:
+            logger.warning("Quality check skipped: %s", e)
+            return 0
+        logger.info("🔍 Image quality ok", extra={"quality": metrics})
+        return rotation
+
+    def preprocess(self, image_base64: str, aggressive: bool = False, rotation: int = 0) -> str:
+        """Preprocess a base64-encoded image for optimal OCR results.
+
+        The image is turned upright from its EXIF orientation, rotated
+        counter-clockwise by ``rotation`` degrees (see ``check_quality``) and
+        cropped to the receipt, so the model is not billed for the table.
+        """
+        try:
+            from PIL import ImageOps
+
+            logger.info("📸 Starting image preprocessing (aggressive=%s)", aggressive)
+            image = ImageOps.exif_transpose(self._base64_to_pil(image_base64))
+            if rotation:
+                image = image.rotate(rotation, expand=True)
+                logger.info("🔄 Rotated %d°", rotation)
+            if RECEIPT_CROP:
+                image = self._crop(image)
+            result = self.preprocess_image(image, aggressive)
             logger.info("✅ Image preprocessing complete")
             return result
         except Exception as e:
             logger.error("❌ Image preprocessing failed: %s", e)
             return image_base64  # return original on failure
 
+    def preprocess_image(self, image: Image.Image, aggressive: bool = False) -> str:
+        """Resize, enhance and encode an already decoded image (e.g. a rendered PDF page)."""
+        image = self._resize(image)
+        image = self._enhance(image, aggressive)
+        return self._pil_to_base64(image)
+
+    def crop_lines(self, image_base64: str, lines: list[int], line_count: int) -> list[str | None]:
+        """Base64 JPEG strips holding the given text lines (of ``line_count``), for re-reading.
+
+        ``image_base64`` is the preprocessed image the model read, so its text
+        lines are in the same order as the model's raw text. Strips are scaled
+        to fit two vision tiles, small ones upscaled so their print stays
+        legible. A line that cannot be placed gives None.
+        """
+        from PIL import Image
+
+        from utils.text_rows import MAX_CROP_WIDTH, MIN_CROP_HEIGHT, find_text_rows, line_band
+
+        image = self._base64_to_pil(image_base64)
+        rows = find_text_rows(image)
+        crops = []
+        for line in lines:
+            band = line_band(rows, line, line_count, image.height)
+            if band is None:
+                crops.append(None)
+                continue
+            strip = image.crop((0, band[0], image.width, band[1]))
+            scale = min(max(MIN_CROP_HEIGHT / strip.height, 1), MAX_CROP_WIDTH / strip.width)
+            if scale != 1:
+                strip = strip.resize((round(strip.width * scale), round(strip.height * scale)), Image.LANCZOS)
+            crops.append(self._pil_to_base64(strip))
+        return crops
+
+    def perceptual_hash(self, image_base64: str) -> str | None:
+        """256-bit DCT hash (pHash) of the receipt's print area, as 64 hex digits.
+
+        The raw upload (before enhancement) is cut to the sheet, straightened
+        and trimmed to its print, so margins and tilt of a re-taken photo do
+        not move the hash. The lowest 16×16 DCT frequencies of a 64×64 copy
+        are compared with their median: enough resolution to tell receipts of
+        the same layout apart by their line lengths. Beyond the distance of
+        a re-taken photo, look-alikes are told apart after OCR (see
+        pipeline.same_image and pipeline.confirm_duplicate).
+        """
+        try:
+            import numpy as np
+            from PIL import Image, ImageOps
+
+            from utils.phash_index import HASH_BITS
+            from utils.receipt_roi import crop_to_receipt, trim_to_print
+
+            image = self._base64_to_pil(image_base64)
+            image.draft("L", (HASH_ANALYSIS_SIDE, HASH_ANALYSIS_SIDE))
+            image = ImageOps.exif_transpose(image).convert("L")
+            image.thumbnail((HASH_ANALYSIS_SIDE, HASH_ANALYSIS_SIDE))
+            # Cut strictly inside the sheet, so no table is left to trim around
+            image = trim_to_print(crop_to_receipt(image, deskew=True, margin=-HASH_SHEET_INSET))
+            pixels = np.asarray(image.resize((HASH_SIDE, HASH_SIDE), Image.LANCZOS), dtype=np.float64)
+
+            freqs = int(HASH_BITS ** 0.5)
+            k = np.arange(HASH_SIDE)
+            basis = np.cos(np.pi * (2 * k[None, :] + 1) * k[:, None] / (2 * HASH_SIDE))
+            low = (basis @ pixels @ basis.T)[:freqs, :freqs].ravel()
+            bits = low > np.median(low[1:])        # the DC term only tracks brightness
+            return f"{int(''.join('1' if b else '0' for b in bits), 2):0{HASH_BITS // 4}x}"
+        except Exception as e:
+            logger.warning("Perceptual hash failed: %s", e)
+            return None
+
+    def _crop(self, image: Image.Image) -> Image.Image:
+        from utils.receipt_roi import crop_to_receipt
+
+        try:
+            cropped = crop_to_receipt(image, deskew=RECEIPT_DESKEW)
+        except Exception as e:
+            logger.warning("Receipt crop skipped: %s", e)
+            return image
+        if cropped is not image:
+            logger.info("✂️ Cropped to receipt %s → %s", image.size, cropped.size)
+        return cropped
+
     def _resize(self, image: Image.Image) -> Image.Image:
+        from PIL import Image
+
         width, height = image.size
         if width > MAX_IMAGE_WIDTH:
             ratio = MAX_IMAGE_WIDTH / width
@@ -33,6 +159,8 @@ class ImageProcessor:
         return image
 
     def _enhance(self, image: Image.Image, aggressive: bool) -> Image.Image:
+        from PIL import ImageEnhance, ImageFilter
+
         # Convert to RGB if needed
         if image.mode not in ("RGB", "L"):
             image = image.convert("RGB")
@@ -58,6 +186,8 @@ class ImageProcessor:
         return image
 
     def _base64_to_pil(self, base64_str: str) -> Image.Image:
+        from PIL import Image
+
         # Strip data URI prefix if present
         if "," in base64_str:
             base64_str = base64_str.split(",", 1)[1]
@@ -0,0 +1,137 @@
+"""Cheap pre-OCR quality gate for receipt photos.
+
+Runs on a grayscale copy downsampled to ``ANALYSIS_SIDE`` pixels, so it costs
+a few milliseconds next to a multi-second vision call. It rejects uploads the
+model cannot read (too small, too dark, blank, badly blurred, no text) and detects
+receipts photographed sideways or upside down so they can be rotated first.
+
+Orientation is estimated without OCR:
+
+* sideways — horizontal text lines leave empty rows between them, while
+  columns are almost never empty; the axis with more empty lines is vertical.
+* upside down — prices put small isolated marks (decimal points, commas) at
+  the bottom of a text line; rotated 180° they sit at the top.
+
+numpy is imported on first use, never at API import time.
+"""
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import numpy as np
+    from PIL import Image
+
+ANALYSIS_SIDE = 1024
+MIN_SIDE = 200               # px on the original; smaller uploads cannot carry readable text
+MIN_BRIGHTNESS = 40.0        # mean gray level of an underexposed photo
+MIN_CONTRAST = 8.0           # grayscale std below this is a blank page
+MIN_INK = 0.002              # share of dark pixels below which there is no text
+MIN_SHARPNESS = 20.0         # variance of the Laplacian; text blurred past reading scores lower
+SIDEWAYS_MARGIN = 0.15       # required lead of empty rows over empty columns (or vice versa)
+MIN_FLIP_MARKS = 3           # baseline marks needed before trusting an upside-down call
+
+
+class ImageQualityError(ValueError):
+    """The upload is unusable; ``reason`` is a short machine-readable code."""
+
+    def __init__(self, reason: str, message: str):
+        super().__init__(message)
+        self.reason = reason
+
+
+def assess(image: Image.Image) -> tuple[int, dict]:
+    """Check an (EXIF-transposed) image; returns ``(rotation, metrics)``.
+
+    ``rotation`` is the counter-clockwise angle (0, 90, 180 or 270) that
+    brings the text upright, as accepted by ``Image.rotate``. Raises
+    ImageQualityError when the image is not worth sending to OCR.
+    """
+    import numpy as np
+
+    if min(image.size) < MIN_SIDE:
+        raise ImageQualityError(
+            "too_small", f"Image is {image.size[0]}×{image.size[1]}px; upload at least {MIN_SIDE}px per side."
+        )
+
+    from utils.receipt_roi import locate_receipt
+
+    # Judge the receipt, not the table it lies on
+    found = locate_receipt(image, deskew=False, margin=-0.01)
+    if found is not None:
+        image = image.crop(found[0])
+    gray = image.convert("L")
+    gray.thumbnail((ANALYSIS_SIDE, ANALYSIS_SIDE))
+    a = np.asarray(gray, dtype=np.float32)
+
+    mean, std = float(a.mean()), float(a.std())
+    metrics = {"brightness": round(mean, 1), "contrast": round(std, 1)}
+    if mean < MIN_BRIGHTNESS:
+        raise ImageQualityError("too_dark", "The image is too dark to read; retake it in better light.")
+    if std < MIN_CONTRAST:
+        raise ImageQualityError("blank", "The image looks blank; make sure the receipt is in frame.")
+
+    metrics["sharpness"] = round(_laplacian_variance(a), 1)
+    if metrics["sharpness"] < MIN_SHARPNESS:
+        raise ImageQualityError("blurry", "The image is too blurry to read; hold the camera steady and retake it.")
+
+    ink = a < min(mean - 0.5 * std, 128.0)
+    metrics["ink"] = round(float(ink.mean()), 4)
+    if metrics["ink"] < MIN_INK:
+        raise ImageQualityError("no_text", "No printed text found; make sure the receipt is in frame.")
+
+    rotation = 0
+    row_gaps, col_gaps = _gap_fraction(ink.sum(axis=1)), _gap_fraction(ink.sum(axis=0))
+    if col_gaps > row_gaps + SIDEWAYS_MARGIN:
+        ink = np.rot90(ink)
+        rotation = 90
+    low, high = _baseline_marks(ink)
+    if high >= MIN_FLIP_MARKS and high > 2 * low:
+        rotation = (rotation + 180) % 360
+    metrics["rotation"] = rotation
+    return rotation, metrics
+
+
+def _laplacian_variance(a: np.ndarray) -> float:
+    lap = a[1:-1, :-2] + a[1:-1, 2:] + a[:-2, 1:-1] + a[2:, 1:-1] - 4 * a[1:-1, 1:-1]
+    return float(lap.var())
+
+
+def _gap_fraction(profile: np.ndarray) -> float:
+    """Share of (near-)empty lines within the inked extent of a projection profile."""
+    import numpy as np
+
+    inked = np.flatnonzero(profile)
+    if len(inked) == 0:
+        return 0.0
+    span = profile[inked[0]:inked[-1] + 1]
+    return float((span <= 0.005 * span.max()).mean())
+
+
+def true_runs(on: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Start and end (exclusive) indices of the True runs in a 1-D mask."""
+    import numpy as np
+
+    edges = np.diff(np.concatenate(([0], on.astype(np.int8), [0])))
+    return np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+
+
+def _baseline_marks(ink: np.ndarray) -> tuple[int, int]:
+    """Count small marks sitting at the bottom vs the top of upright text lines."""
+    low = high = 0
+    for top, bottom in zip(*true_runs(ink.any(axis=1))):
+        height = bottom - top
+        if height < 6:
+            continue
+        band = ink[top:bottom]
+        for left, right in zip(*true_runs(band.any(axis=0))):
+            if right - left > max(2, height // 4):
+                continue
+            rows = band[:, left:right].any(axis=1).nonzero()[0]
+            if rows[-1] - rows[0] + 1 > 0.35 * height:
+                continue
+            if rows[0] >= 0.6 * height:
+                low += 1
+            elif rows[-1] <= 0.4 * height:
+                high += 1
+    return low, high
@@ -0,0 +1,34 @@
+"""Fast JSON responses.
+
+FastAPI's default path validates a returned model against ``response_model``,
+converts it to plain Python objects and only then runs ``json.dumps``.
+``FastJSONResponse`` skips that work. Pydantic models are written straight to
+bytes by pydantic-core's serializer, and any other content goes through
+orjson. Endpoints that build the response themselves hand it a model and,
+optionally, fields to leave out.
+"""
+from typing import Any, Optional
+
+import orjson
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+# ``compact`` analyze responses drop the raw OCR dump and the per-category item
+# name lists, which repeat names already in ``receipt.items``
+COMPACT_EXCLUDE = {
+    "data": {
+        "receipt": {"raw_ocr_text"},
+        "spending_analysis": {"category_breakdown": {"__all__": {"items"}}},
+    }
+}
+
+
+class FastJSONResponse(JSONResponse):
+    def __init__(self, content: Any, *args, exclude: Optional[dict] = None, **kwargs):
+        self.exclude = exclude
+        super().__init__(content, *args, **kwargs)
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, BaseModel):
+            return content.model_dump_json(exclude=self.exclude).encode("utf-8")
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
@@ -1,17 +1,135 @@
+"""Application logging: one background writer, JSON or text lines, per-request context.
+
+Every module logger hands records to a ``QueueHandler``; a single
+``QueueListener`` thread formats and writes them, so request threads never
+block on stdout. Records carry the current request id (set by the API
+middleware via ``bind_request``). INFO-level step lines inside a request
+are kept or dropped per request according to ``LOG_SAMPLE_RATE``; warnings,
+errors and records logged with ``extra=ALWAYS`` are always kept.
+"""
+import atexit
+import contextvars
+import json
 import logging
+import logging.handlers
+import queue
+import random
 import sys
+import threading
+from datetime import datetime, timezone
+
+from config import LOG_FORMAT, LOG_LEVEL, LOG_SAMPLE_RATE
+
+ALWAYS = {"always": True}
+
+_request_id: contextvars.ContextVar[str | None] = contextvars.ContextVar("request_id", default=None)
+_sampled: contextvars.ContextVar[bool] = contextvars.ContextVar("log_sampled", default=True)
+
+_STANDARD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+_queue_handler: logging.Handler | None = None
+_setup_lock = threading.Lock()
+
+
+def bind_request(request_id: str, sample_rate: float = None) -> tuple:
+    """Attach ``request_id`` (and a sampling decision) to the current context."""
+    rate = LOG_SAMPLE_RATE if sample_rate is None else sample_rate
+    return (_request_id.set(request_id), _sampled.set(random.random() < rate))
+
+
+def unbind_request(tokens: tuple) -> None:
+    _request_id.reset(tokens[0])
+    _sampled.reset(tokens[1])
+
+
+def current_request_id() -> str | None:
+    return _request_id.get()
+
+
+class ContextFilter(logging.Filter):
+    """Stamps the request id on each record and applies per-request sampling."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = _request_id.get()
+        if record.levelno >= logging.WARNING or getattr(record, "always", False):
+            return True
+        return record.request_id is None or _sampled.get()
+
+
+class JSONFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        if getattr(record, "request_id", None):
+            entry["request_id"] = record.request_id
+        for key, value in vars(record).items():
+            if key not in _STANDARD_ATTRS and key not in ("request_id", "always"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__(
+            "%(asctime)s | %(levelname)s | %(name)s | %(request_tag)s%(message)s",
+            datefmt="%Y-%m-%d %H:%M:%S",
+        )
+
+    def format(self, record: logging.LogRecord) -> str:
+        request_id = getattr(record, "request_id", None)
+        record.request_tag = f"[{request_id}] " if request_id else ""
+        return super().format(record)
+
+
+class _PreformattedQueueHandler(logging.handlers.QueueHandler):
+    """Hands the record over as-is; formatting happens on the listener thread."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Resolve the message now (args may be mutated later), but leave the
+        # expensive structured formatting to the writer thread.
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def build_stream_handler(stream=None, fmt: str = None) -> logging.Handler:
+    handler = logging.StreamHandler(stream or sys.stdout)
+    handler.setFormatter(JSONFormatter() if (fmt or LOG_FORMAT) == "json" else TextFormatter())
+    return handler
+
+
+def _shared_queue_handler() -> logging.Handler:
+    global _queue_handler
+    if _queue_handler is None:
+        with _setup_lock:
+            if _queue_handler is None:
+                log_queue: queue.SimpleQueue = queue.SimpleQueue()
+                listener = logging.handlers.QueueListener(
+                    log_queue, build_stream_handler(), respect_handler_level=False
+                )
+                listener.start()
+                atexit.register(listener.stop)
+                handler = _PreformattedQueueHandler(log_queue)
+                handler.addFilter(ContextFilter())
+                _queue_handler = handler
+    return _queue_handler
 
 
 def get_logger(name: str) -> logging.Logger:
     logger = logging.getLogger(name)
     if not logger.handlers:
-        handler = logging.StreamHandler(sys.stdout)
-        handler.setFormatter(
-            logging.Formatter(
-                "%(asctime)s | %(levelname)s | %(name)s | %(message)s",
-                datefmt="%Y-%m-%d %H:%M:%S",
-            )
-        )
-        logger.addHandler(handler)
-        logger.setLevel(logging.INFO)
+        logger.addHandler(_shared_queue_handler())
+        logger.setLevel(LOG_LEVEL)
+        logger.propagate = False
     return logger
@@ -0,0 +1,78 @@
+import asyncio
+from typing import Any, Callable, Hashable
+
+from starlette.concurrency import run_in_threadpool
+
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class MicroBatcher:
+    """Collects keys submitted within a short window and resolves them in one call.
+
+    ``batch_fn`` is a blocking function taking a list of keys and returning a
+    ``{key: value}`` dict; it runs in the threadpool. A key already waiting or
+    in flight is never submitted twice — later callers share its future.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        batch_fn: Callable[[list], dict],
+        window_ms: float = 20.0,
+        max_batch: int = 100,
+    ):
+        self.name = name
+        self.batch_fn = batch_fn
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self.batches = 0
+        self._pending: dict[Hashable, asyncio.Future] = {}
+        self._inflight: dict[Hashable, asyncio.Future] = {}
+        self._timer: asyncio.TimerHandle | None = None
+        self._tasks: set[asyncio.Task] = set()     # the loop only keeps weak references
+
+    async def submit(self, key: Hashable) -> Any:
+        future = self._inflight.get(key) or self._pending.get(key)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = self._pending[key] = loop.create_future()
+            if len(self._pending) >= self.max_batch:
+                self._flush()
+            elif self._timer is None:
+                self._timer = loop.call_later(self.window, self._flush)
+        return await asyncio.shield(future)
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, {}
+        if batch:
+            self._inflight.update(batch)
+            task = asyncio.ensure_future(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: dict[Hashable, asyncio.Future]) -> None:
+        self.batches += 1
+        logger.info("📦 %s batch of %d", self.name, len(batch))
+        try:
+            results = await run_in_threadpool(self.batch_fn, list(batch))
+            for key, future in batch.items():
+                if not future.done():
+                    if key in results:
+                        future.set_result(results[key])
+                    else:
+                        future.set_exception(KeyError(key))
+        except Exception as e:
+            for future in batch.values():
+                if not future.done():
+                    future.set_exception(e)
+        finally:
+            for key, future in batch.items():
+                if self._inflight.get(key) is future:
+                    del self._inflight[key]
+                if future.done() and not future.cancelled():
+                    future.exception()  # mark retrieved if every waiter went away
@@ -0,0 +1,47 @@
+import threading
+
+from config import OPENAI_API_KEY
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+_clients: dict[str, object] = {}
+_lock = threading.Lock()
+
+
+def get_client(api_key: str = None):
+    """Return the process-wide OpenAI client for ``api_key``.
+
+    The ``openai`` SDK (and its httpx/pydantic type tree) is imported on first
+    use rather than at module import, which keeps serverless cold starts short.
+    All agents share one client and therefore one HTTP connection pool.
+    """
+    key = api_key or OPENAI_API_KEY
+    client = _clients.get(key)
+    if client is None:
+        with _lock:
+            client = _clients.get(key)
+            if client is None:
+                from openai import OpenAI
+
+                client = _clients[key] = OpenAI(api_key=key)
+                logger.info("🔌 OpenAI client initialized")
+    return client
+
+
+class ClientMixin:
+    """Gives an agent a lazily resolved ``client`` attribute backed by get_client."""
+
+    def _init_client(self, api_key: str = None, client=None) -> None:
+        self._api_key = api_key
+        self._client = client
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = get_client(self._api_key)
+        return self._client
+
+    @client.setter
+    def client(self, value) -> None:
+        self._client = value
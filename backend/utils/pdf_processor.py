@@ -0,0 +1,85 @@
+from __future__ import annotations
+
+import base64
+import re
+from typing import TYPE_CHECKING, Iterator, Optional
+
+from config import PDF_MAX_PAGES, PDF_RENDER_DPI
+from utils.logger import get_logger
+
+if TYPE_CHECKING:
+    from PIL import Image
+
+logger = get_logger(__name__)
+
+# A page whose text layer has at least this much text and a price is parsed
+# directly; anything less (scans, image-only pages) is rasterized for OCR.
+MIN_TEXT_CHARS = 20
+PRICE_HINT_RE = re.compile(r"\d+[.,]\d{2}\b")
+
+
+def _strip_data_uri(payload: str) -> str:
+    if payload.startswith("data:") and "," in payload:
+        return payload.split(",", 1)[1]
+    return payload
+
+
+def is_pdf(payload_base64: str) -> bool:
+    """True for a (base64, optionally data-URI) payload that is a PDF document."""
+    if payload_base64.startswith("data:application/pdf"):
+        return True
+    head = _strip_data_uri(payload_base64)[:8]
+    try:
+        return base64.b64decode(head + "=" * (-len(head) % 4)).startswith(b"%PDF")
+    except ValueError:
+        return False
+
+
+class PDFProcessor:
+    """Splits a PDF into pages, preferring the embedded text layer over OCR.
+
+    ``iter_pages`` yields ``(number, text, image)`` per page: ``text`` is the
+    embedded text layer when usable, otherwise ``image`` is the rendered page.
+    Pages are produced lazily and only rasterized when they have no text
+    layer, so a caller consuming pages as it goes holds at most the pages it
+    has in flight. pdfium is not thread-safe, so all document access stays
+    on the thread iterating the generator.
+    """
+
+    def __init__(self, max_pages: int = None, dpi: int = None):
+        self.max_pages = max_pages or PDF_MAX_PAGES
+        self.scale = (dpi or PDF_RENDER_DPI) / 72
+
+    def iter_pages(
+        self, pdf_base64: str
+    ) -> Iterator[tuple[int, Optional[str], Optional[Image.Image]]]:
+        import pypdfium2 as pdfium
+
+        data = base64.b64decode(_strip_data_uri(pdf_base64))
+        document = pdfium.PdfDocument(data)
+        try:
+            total = len(document)
+            if total > self.max_pages:
+                logger.warning("PDF has %d pages, processing the first %d", total, self.max_pages)
+            for index in range(min(total, self.max_pages)):
+                page = document[index]
+                try:
+                    text = self._text_layer(page)
+                    if text is not None:
+                        yield index + 1, text, None
+                    else:
+                        yield index + 1, None, page.render(scale=self.scale).to_pil()
+                finally:
+                    page.close()
+        finally:
+            document.close()
+
+    def _text_layer(self, page) -> Optional[str]:
+        textpage = page.get_textpage()
+        try:
+            text = textpage.get_text_range().replace("\r\n", "\n").replace("\r", "\n")
+        finally:
+            textpage.close()
+        if len(text.strip()) >= MIN_TEXT_CHARS and PRICE_HINT_RE.search(text):
+            return text
+        return None
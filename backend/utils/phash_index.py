@@ -0,0 +1,89 @@
+import threading
+from functools import lru_cache
+from itertools import combinations
+
+HASH_BITS = 256
+# One more chunk than the largest radius searched with exact chunk probes only
+# (pigeonhole: 16 differing bits cannot touch all 17 chunks)
+CHUNKS = 17
+EXACT_RADIUS = CHUNKS - 1
+# (shift, mask) per chunk; widths differ by at most one bit
+CHUNK_LAYOUT = tuple(
+    (HASH_BITS * i // CHUNKS, (1 << (HASH_BITS * (i + 1) // CHUNKS - HASH_BITS * i // CHUNKS)) - 1)
+    for i in range(CHUNKS)
+)
+
+
+def hamming(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+@lru_cache(maxsize=None)
+def _flip_masks(radius: int, width: int) -> tuple[int, ...]:
+    """XOR masks reaching every ``width``-bit value within ``radius`` flips."""
+    masks = [0]
+    for r in range(1, radius + 1):
+        for bits in combinations(range(width), r):
+            masks.append(sum(1 << bit for bit in bits))
+    return tuple(masks)
+
+
+class HammingIndex:
+    """Multi-index hashing over 256-bit perceptual hashes.
+
+    Each hash is split into seventeen 15- or 16-bit chunks, each with its own
+    table of buckets. If two hashes are within distance ``r``, at least one
+    chunk is within ``r // 17`` of its counterpart (pigeonhole). Up to
+    EXACT_RADIUS that is an exact match, so a query probes one bucket per
+    chunk and verifies those candidates: about 500 popcounts at a million
+    entries, well under a millisecond, instead of a scan of every stored
+    hash. Larger radii also probe the neighbouring buckets and cost more.
+    """
+
+    def __init__(self):
+        self._tables: list[dict[int, list[int]]] = [{} for _ in range(CHUNKS)]
+        self._keys: dict[int, list[str]] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def add(self, key: str, value: int) -> None:
+        with self._lock:
+            keys = self._keys.get(value)
+            if keys is not None:
+                if key not in keys:
+                    keys.append(key)
+                return
+            self._keys[value] = [key]
+            for table, (shift, mask) in zip(self._tables, CHUNK_LAYOUT):
+                table.setdefault((value >> shift) & mask, []).append(value)
+
+    def search(self, value: int, radius: int) -> list[tuple[int, str]]:
+        """``(distance, key)`` pairs within ``radius`` bits, nearest first."""
+        with self._lock:
+            candidates = self._candidates(value, radius)
+            hits = [
+                (distance, key)
+                for candidate in candidates
+                if (distance := (value ^ candidate).bit_count()) <= radius
+                for key in self._keys[candidate]
+            ]
+        hits.sort()
+        return hits
+
+    def _candidates(self, value: int, radius: int) -> set[int]:
+        """Stored hashes sharing a chunk (within ``radius // CHUNKS`` bits) with ``value``."""
+        flips = radius // CHUNKS
+        candidates: set[int] = set()
+        for table, (shift, mask) in zip(self._tables, CHUNK_LAYOUT):
+            chunk = (value >> shift) & mask
+            for flip in _flip_masks(flips, mask.bit_length()):
+                bucket = table.get(chunk ^ flip)
+                if bucket:
+                    candidates.update(bucket)
+        return candidates
+
+    def nearest(self, value: int, radius: int) -> tuple[int, str] | None:
+        hits = self.search(value, radius)
+        return hits[0] if hits else None
@@ -0,0 +1,238 @@
+"""Opt-in sampling profiler for single requests.
+
+A ``session`` covers one request. It starts a sampler thread that snapshots
+the stacks of that request's threads every few milliseconds. Threads take
+part through ``span(name)`` (or functions wrapped with ``traced``), which also
+measures their CPU time. The session is held in a ContextVar, so it follows
+the request into thread pools that copy the context. Outside a session,
+``span`` and ``traced`` cost one ContextVar lookup.
+
+Stacks are cut where ``traced`` entered, leaving out thread pool plumbing.
+Each sample is charged to one bucket, found by walking its stack from the
+innermost frame outwards: network (sockets, TLS, HTTP client), waiting
+(blocked on another thread), image (PIL, numpy), validation (pydantic), json,
+parsing (regexes and the parsers), or other CPU. The report gives
+thread-seconds per bucket, wall and CPU time per span, time spent awaiting
+outside any span (e.g. the admission queue), the hottest frames, and folded
+stacks (``span;outer;...;inner count``) for flamegraph.pl or speedscope.
+
+Only the standard library is used, so the API can import this at cold start.
+"""
+import contextvars
+import json
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Callable, Optional
+
+DEFAULT_INTERVAL_S = 0.005
+MAX_DEPTH = 64               # frames kept per sample, innermost first
+HOT_FRAMES = 25
+
+# First match walking out from the innermost frame wins
+BUCKETS = (
+    ("network", ("/ssl.py", "/socket.py", "/selectors.py", "/httpcore/", "/httpx/", "/h11/", "/openai/")),
+    ("waiting", ("/threading.py", "/concurrent/futures/", "/queue.py")),
+    ("image", ("/PIL/", "/numpy/")),
+    ("validation", ("/pydantic/", "/pydantic_core/")),
+    ("json", ("/json/", "/orjson")),
+    ("parsing", ("/re/", "/re.py", "/sre_", "parser_agent.py", "store_templates.py")),
+)
+BUCKET_NAMES = [name for name, _ in BUCKETS] + ["other_cpu"]
+
+_session: contextvars.ContextVar[Optional["ProfileSession"]] = contextvars.ContextVar(
+    "profile_session", default=None
+)
+
+
+def safe_label(label: str) -> str:
+    """``label`` made safe to use as a file name (request ids come from clients)."""
+    return re.sub(r"[^A-Za-z0-9_.-]", "_", label)[:64] or "profile"
+
+
+def _frame_label(code) -> str:
+    path = code.co_filename.replace(os.sep, "/")
+    return f"{'/'.join(path.rsplit('/', 2)[-2:])}:{code.co_name}"
+
+
+def _bucket(paths: list[str]) -> str:
+    for path in paths:
+        for name, markers in BUCKETS:
+            if any(marker in path for marker in markers):
+                return name
+    return "other_cpu"
+
+
+class ProfileSession:
+    """Samples the threads working for one request; see the module docstring."""
+
+    def __init__(self, label: str, interval: float = DEFAULT_INTERVAL_S):
+        self.label = label
+        self.interval = interval
+        self.samples = 0
+        self.buckets: Counter = Counter()
+        self.hot: Counter = Counter()             # innermost frame -> samples
+        self.folded: Counter = Counter()          # span;outer;...;inner -> samples
+        self.spans: list[dict] = []
+        self.wall_s = 0.0
+        self._threads: dict[int, list[str]] = {}  # thread id -> names of the spans it is in
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._sampler: Optional[threading.Thread] = None
+        self._start = 0.0
+
+    def start(self) -> None:
+        self._start = time.perf_counter()
+        self._sampler = threading.Thread(target=self._run, name="profiler", daemon=True)
+        self._sampler.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._sampler is not None:
+            self._sampler.join()
+        self.wall_s = time.perf_counter() - self._start
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def _sample(self) -> None:
+        with self._lock:
+            threads = {ident: names[-1] for ident, names in self._threads.items() if names}
+        frames = sys._current_frames()
+        for ident, span_name in threads.items():
+            frame = frames.get(ident)
+            if frame is None:
+                continue
+            codes = []
+            # Frames outside the traced call (thread pool plumbing) are left out
+            while frame is not None and len(codes) < MAX_DEPTH and frame.f_code.co_filename != __file__:
+                codes.append(frame.f_code)
+                frame = frame.f_back
+            if not codes:
+                continue
+            self.samples += 1
+            self.buckets[_bucket([c.co_filename.replace(os.sep, "/") for c in codes])] += 1
+            labels = [_frame_label(c) for c in codes]
+            self.hot[labels[0]] += 1
+            self.folded[";".join([span_name] + labels[::-1])] += 1
+
+    @contextmanager
+    def _span(self, name: str):
+        ident = threading.get_ident()
+        with self._lock:
+            names = self._threads.setdefault(ident, [])
+            names.append(name)
+            depth = len(names) - 1
+        start, cpu = time.perf_counter(), time.thread_time()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            with self._lock:
+                names.pop()
+                if not names:
+                    del self._threads[ident]
+                self.spans.append({
+                    "name": name,
+                    "thread": threading.current_thread().name,
+                    "depth": depth,
+                    "start_s": round(start - self._start, 4),
+                    "wall_s": round(end - start, 4),
+                    "cpu_s": round(time.thread_time() - cpu, 4),
+                })
+
+    def report(self) -> dict:
+        """The profile as a JSON-ready dict (call after ``stop``)."""
+        outer = [s for s in self.spans if s["depth"] == 0]
+        # Wall time covered by at least one span; the rest was spent awaiting
+        covered, reach = 0.0, 0.0
+        for span in sorted(outer, key=lambda s: s["start_s"]):
+            end = span["start_s"] + span["wall_s"]
+            covered += max(end - max(span["start_s"], reach), 0.0)
+            reach = max(reach, end)
+        total = self.samples or 1
+        return {
+            "label": self.label,
+            "wall_s": round(self.wall_s, 4),
+            "cpu_s": round(sum(s["cpu_s"] for s in outer), 4),
+            "awaiting_s": round(max(self.wall_s - covered, 0.0), 4),
+            "interval_ms": self.interval * 1000,
+            "samples": self.samples,
+            "breakdown_s": {name: round(self.buckets[name] * self.interval, 4) for name in BUCKET_NAMES},
+            "spans": sorted(self.spans, key=lambda s: s["start_s"]),
+            "hot": [
+                {"frame": frame, "samples": n, "share": round(n / total, 3)}
+                for frame, n in self.hot.most_common(HOT_FRAMES)
+            ],
+            "folded": dict(self.folded),
+        }
+
+    def server_timing(self, report: dict) -> str:
+        """A Server-Timing header value (ms), shown by browser dev tools."""
+        parts = [f"wall;dur={report['wall_s'] * 1000:.1f}", f"cpu;dur={report['cpu_s'] * 1000:.1f}",
+                 f"await;dur={report['awaiting_s'] * 1000:.1f}"]
+        parts += [f"{name};dur={seconds * 1000:.1f}" for name, seconds in report["breakdown_s"].items() if seconds]
+        return ", ".join(parts)
+
+    def save(self, directory: str, report: dict = None) -> str:
+        """Write the report to ``<directory>/<label>.json``; returns the path."""
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{safe_label(self.label)}.json")
+        tmp = f"{path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(report or self.report(), f)
+        os.replace(tmp, path)
+        return path
+
+
+@contextmanager
+def session(label: str, interval: float = DEFAULT_INTERVAL_S):
+    """Profile everything run in ``span``s under this context until the block exits."""
+    profile = ProfileSession(label, interval)
+    token = _session.set(profile)
+    profile.start()
+    try:
+        yield profile
+    finally:
+        profile.stop()
+        _session.reset(token)
+
+
+def active() -> bool:
+    return _session.get() is not None
+
+
+@contextmanager
+def span(name: str):
+    """Sample this thread as ``name`` while the block runs, if a session is active."""
+    profile = _session.get()
+    if profile is None:
+        yield
+        return
+    with profile._span(name):
+        yield
+
+
+def traced(name: str, fn: Callable) -> Callable:
+    """``fn`` run inside ``span(name)`` when called, or ``fn`` itself outside a session.
+
+    Decided when ``traced`` is called, so wrap at submit time in the caller's context.
+    """
+    if _session.get() is None:
+        return fn
+
+    def run(*args, **kwargs):
+        with span(name):
+            return fn(*args, **kwargs)
+
+    return run
+
+
+def load(path: str) -> dict:
+    with open(path) as f:
+        return json.load(f)
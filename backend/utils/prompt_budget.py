@@ -0,0 +1,52 @@
+import math
+import re
+
+from models.data_models import ReceiptItem
+
+# Rough BPE approximation: words, numbers and punctuation are ~1 token each,
+# long words split roughly every 6 characters. Good to ~15% on receipt text.
+_TOKEN_RE = re.compile(r"[A-Za-z]+|\d+|[^\sA-Za-z\d]")
+
+INSIGHT_PROMPT_BUDGET = 900       # tokens for the receipt data section of the insights prompt
+MIN_ITEMS_PER_CATEGORY = 2
+MAX_OUTPUT_TOKENS = 4000
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap local token estimate — no tokenizer download or network call."""
+    return sum(max(1, math.ceil(len(t) / 6)) for t in _TOKEN_RE.findall(text))
+
+
+def categorization_max_tokens(item_count: int) -> int:
+    """Output budget for a grouped ``{"Category": [item numbers]}`` response.
+
+    Each item costs a number and a separator; each category name ~8 tokens.
+    Categories grow sub-linearly, so cap their share instead of scaling it.
+    """
+    categories = min(item_count, 12 + item_count // 10)
+    return min(MAX_OUTPUT_TOKENS, 32 + 3 * item_count + 10 * categories)
+
+
+def summarize_items(items: list[ReceiptItem], keep: int) -> str:
+    """List the ``keep`` most expensive items and fold the rest into one tail entry."""
+    ranked = sorted(items, key=lambda i: i.total_price, reverse=True)
+    head = ", ".join(f"{i.name} ${i.total_price:.2f}" for i in ranked[:keep])
+    tail = ranked[keep:]
+    if tail:
+        head += f", +{len(tail)} smaller items ${sum(i.total_price for i in tail):.2f}"
+    return head
+
+
+def fit_breakdown_lines(groups: list[tuple[str, list[ReceiptItem]]], budget: int = INSIGHT_PROMPT_BUDGET) -> list[str]:
+    """Category lines with item detail trimmed until the whole block fits ``budget``.
+
+    ``groups`` is ``(header, items)`` per category, largest first. Every item
+    is listed when it fits; otherwise each category keeps progressively fewer
+    of its priciest items and summarizes the long tail.
+    """
+    keep = max((len(items) for _, items in groups), default=0)
+    while True:
+        lines = [f"  - {header} — {summarize_items(items, keep)}" for header, items in groups]
+        if keep <= MIN_ITEMS_PER_CATEGORY or estimate_tokens("\n".join(lines)) <= budget:
+            return lines
+        keep = max(MIN_ITEMS_PER_CATEGORY, keep * 2 // 3)
@@ -0,0 +1,194 @@
+"""Find the receipt inside a phone photo, crop to it and straighten it.
+
+A receipt is a bright, elongated sheet on a darker background. On a grayscale
+copy downsampled to ``ANALYSIS_SIDE`` pixels the sheet is separated from the
+table with Otsu's threshold, smoothed into coarse blocks, and bounded by the
+longest run of paper rows and columns (so stray bright spots elsewhere in the
+frame are ignored). The tilt is the angle at which the dark (printed) pixels
+inside the sheet line up into the sharpest row profile. When the background
+is as bright as the paper there is no boundary to find, and the image is left
+alone.
+
+numpy is imported on first use, never at API import time.
+"""
+from __future__ import annotations
+
+import math
+from typing import TYPE_CHECKING, Optional
+
+from utils.logger import get_logger
+
+if TYPE_CHECKING:
+    import numpy as np
+    from PIL import Image
+
+logger = get_logger(__name__)
+
+ANALYSIS_SIDE = 512
+MIN_RANGE = 32               # gray levels; flatter frames have no sheet to find
+BLOCK = 8                    # px per coarse block at analysis scale
+MIN_PAPER_SHARE = 0.05       # less than this is not a receipt...
+MAX_PAPER_SHARE = 0.85       # ...more means there is no background to remove
+MAX_CROP_AREA = 0.85         # crops keeping more of the frame are not worth a re-encode
+MARGIN = 0.02                # padding around the sheet, as a share of the frame side
+MIN_SKEW_DEG = 1.0
+MAX_SKEW_DEG = 20.0
+MAX_SKEW_POINTS = 20000      # text pixels sampled for the skew search
+MIN_PRINT_SHARE = 0.002      # share of a row/column that must be ink for trim_to_print
+
+
+def crop_to_receipt(image: Image.Image, deskew: bool = True, margin: float = MARGIN) -> Image.Image:
+    """The receipt cut out of ``image`` (straightened if ``deskew``), or ``image`` unchanged.
+
+    ``margin`` pads the cut as in ``locate_receipt``.
+    """
+    found = locate_receipt(image, deskew, margin)
+    if found is None:
+        return image
+    box, angle = found
+    cropped = image.crop(box)
+    if not deskew or abs(angle) < MIN_SKEW_DEG:
+        return cropped
+
+    from PIL import Image
+
+    straight = cropped.rotate(
+        angle, resample=Image.BILINEAR, expand=True, fillcolor=_background(image, box)
+    )
+    refound = locate_receipt(straight, deskew=False, margin=margin)
+    return straight.crop(refound[0]) if refound else straight
+
+
+def trim_to_print(image: Image.Image) -> Image.Image:
+    """``image`` cut to the box around its printed (dark) pixels, or unchanged if it has none.
+
+    Whatever margin of paper or table a photo kept, the box is the same, so
+    two photos of one receipt trim to the same frame.
+    """
+    import numpy as np
+
+    a = np.asarray(image.convert("L"), dtype=np.uint8)
+    if int(a.max()) - int(a.min()) < MIN_RANGE:
+        return image
+    ink = a < otsu_threshold(a)
+    rows = np.flatnonzero(ink.mean(axis=1) > MIN_PRINT_SHARE)
+    cols = np.flatnonzero(ink.mean(axis=0) > MIN_PRINT_SHARE)
+    if len(rows) == 0 or len(cols) == 0:
+        return image
+    return image.crop((int(cols[0]), int(rows[0]), int(cols[-1]) + 1, int(rows[-1]) + 1))
+
+
+def locate_receipt(
+    image: Image.Image, deskew: bool = True, margin: float = MARGIN
+) -> Optional[tuple[tuple[int, int, int, int], float]]:
+    """``(box, angle)`` of the sheet in ``image`` pixels, or None when neither crop nor deskew would help.
+
+    The box is padded by ``margin`` of the longer frame side (negative values
+    shrink it to strictly inside the sheet). ``angle`` is the counter-clockwise rotation in degrees (as taken by
+    ``Image.rotate``) that levels the printed lines; 0 unless ``deskew``.
+    """
+    import numpy as np
+
+    gray = image.convert("L")
+    gray.thumbnail((ANALYSIS_SIDE, ANALYSIS_SIDE))
+    a = np.asarray(gray, dtype=np.uint8)
+    scale = image.size[0] / a.shape[1]
+    if int(a.max()) - int(a.min()) < MIN_RANGE:
+        return None
+
+    paper = a > otsu_threshold(a)
+    share = float(paper.mean())
+    if not MIN_PAPER_SHARE <= share <= MAX_PAPER_SHARE:
+        return None
+
+    # Block means close the gaps that printed text leaves in the paper mask
+    rows, cols = a.shape[0] // BLOCK, a.shape[1] // BLOCK
+    blocks = paper[:rows * BLOCK, :cols * BLOCK].reshape(rows, BLOCK, cols, BLOCK).mean(axis=(1, 3)) > 0.5
+    top, bottom = _longest_run(blocks.sum(axis=1) >= 2)
+    left, right = _longest_run(blocks[top:bottom].sum(axis=0) >= 2)
+    if bottom <= top or right <= left:
+        return None
+
+    pad = margin * max(a.shape)
+    box = (
+        max(0, int((left * BLOCK - pad) * scale)),
+        max(0, int((top * BLOCK - pad) * scale)),
+        min(image.size[0], int(math.ceil((right * BLOCK + pad) * scale))),
+        min(image.size[1], int(math.ceil((bottom * BLOCK + pad) * scale))),
+    )
+    area = (box[2] - box[0]) * (box[3] - box[1]) / (image.size[0] * image.size[1])
+    sheet = np.zeros_like(blocks)
+    sheet[top:bottom, left:right] = blocks[top:bottom, left:right]
+    angle = _skew(paper, sheet) if deskew else 0.0
+    if area > MAX_CROP_AREA and abs(angle) < MIN_SKEW_DEG:
+        return None
+    return box, angle
+
+
+def otsu_threshold(a: np.ndarray) -> int:
+    """Otsu's threshold of an 8-bit image: maximizes between-class variance."""
+    import numpy as np
+
+    hist = np.bincount(a.ravel(), minlength=256).astype(np.float64)
+    weight = np.cumsum(hist)
+    mass = np.cumsum(hist * np.arange(256))
+    total, total_mass = weight[-1], mass[-1]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        between = (total_mass * weight - mass * total) ** 2 / (weight * (total - weight))
+    return int(np.nanargmax(between[:-1]))
+
+
+def _longest_run(on: np.ndarray) -> tuple[int, int]:
+    """Start and end (exclusive) of the longest True run in a 1-D mask; (0, 0) if none."""
+    import numpy as np
+
+    edges = np.diff(np.concatenate(([0], on.astype(np.int8), [0])))
+    starts, ends = np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+    if len(starts) == 0:
+        return 0, 0
+    longest = int(np.argmax(ends - starts))
+    return int(starts[longest]), int(ends[longest])
+
+
+def _skew(paper: np.ndarray, blocks: np.ndarray) -> float:
+    """Tilt of the printed lines, found as the angle that makes the row profile peakiest.
+
+    Text pixels (dark pixels well inside the sheet) are projected onto rows
+    at candidate angles; horizontal lines give the highest-variance profile.
+    """
+    import numpy as np
+
+    inner = blocks.copy()
+    inner[1:] &= blocks[:-1]
+    inner[:-1] &= blocks[1:]
+    inner[:, 1:] &= blocks[:, :-1]
+    inner[:, :-1] &= blocks[:, 1:]
+    inside = np.kron(inner, np.ones((BLOCK, BLOCK), dtype=bool))
+    ys, xs = np.nonzero(inside & ~paper[:inside.shape[0], :inside.shape[1]])
+    if len(xs) < 200:
+        return 0.0
+    if len(xs) > MAX_SKEW_POINTS:
+        keep = np.random.default_rng(0).choice(len(xs), MAX_SKEW_POINTS, replace=False)
+        xs, ys = xs[keep], ys[keep]
+    xs, ys = xs - xs.mean(), ys - ys.astype(np.float64).mean()
+
+    def peakiness(degrees: np.ndarray) -> np.ndarray:
+        theta = np.radians(degrees)[:, None]
+        rows = np.rint(ys * np.cos(theta) - xs * np.sin(theta)).astype(np.int64)
+        rows -= rows.min(axis=1, keepdims=True)
+        return np.array([np.square(np.bincount(r)).sum() for r in rows], dtype=np.float64)
+
+    coarse = np.arange(-MAX_SKEW_DEG, MAX_SKEW_DEG + 0.5, 1.0)
+    best = coarse[np.argmax(peakiness(coarse))]
+    fine = np.arange(best - 1.0, best + 1.01, 0.2)
+    scores = peakiness(fine)
+    if scores.max() < 1.05 * peakiness(np.array([0.0]))[0]:
+        return 0.0     # no angle beats the photo as taken by enough to be worth a resample
+    # Lines at +θ in image coordinates are straightened by turning them back by θ
+    angle = float(fine[np.argmax(scores)])
+    return round(angle, 1) if abs(angle) >= MIN_SKEW_DEG else 0.0
+
+
+def _background(image: Image.Image, box: tuple[int, int, int, int]):
+    """Colour of the frame just outside the sheet, to fill corners exposed by rotation."""
+    return image.getpixel((box[0], box[1]))
@@ -114,6 +114,26 @@ def _create_receipt_image(store: str, date: str, items: list, tax_rate: float) -
     return img
 
 
+def receipt_text(store: str, date: str, items: list, tax_rate: float) -> str:
+    """The same receipt as plain text, line by line, as a text OCR pass reads it."""
+    lines = [store, f"Date: {date}", "-" * 45, f"{'ITEM':<24} {'QTY':>3} {'PRICE':>8}", "-" * 45]
+    subtotal = 0.0
+    for name, qty, price in items:
+        total = round(qty * price, 2)
+        subtotal += total
+        lines.append(f"{name[:22]:<22} {qty:>3}   ${total:>6.2f}")
+    tax = round(subtotal * tax_rate, 2)
+    lines += [
+        "-" * 45,
+        f"Subtotal:              ${subtotal:>8.2f}",
+        f"Tax ({tax_rate*100:.1f}%):             ${tax:>8.2f}",
+        f"TOTAL:                 ${round(subtotal + tax, 2):>8.2f}",
+        "",
+        "Thank you for shopping!",
+    ]
+    return "\n".join(lines)
+
+
 def generate_sample_receipts(output_path: str = None) -> list[dict]:
     """Generate sample receipts and return as list of dicts with base64 images."""
     results = []
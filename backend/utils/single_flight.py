@@ -0,0 +1,53 @@
+import asyncio
+import hashlib
+from typing import Any, Awaitable, Callable
+
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+def request_digest(payload: str, **options) -> str:
+    """Stable key for a request: SHA-256 of the payload plus its sorted options."""
+    if payload.startswith("data:") and "," in payload:
+        payload = payload.split(",", 1)[1]   # same image with or without a data URI prefix
+    digest = hashlib.sha256(payload.encode())
+    for name in sorted(options):
+        digest.update(f"|{name}={options[name]!r}".encode())
+    return digest.hexdigest()
+
+
+class SingleFlight:
+    """Coalesces concurrent calls with the same key into one computation.
+
+    The first caller starts the work as an independent task; callers arriving
+    while it is in flight await the same task. The task is shielded, so a
+    client disconnecting does not cancel the work other callers are waiting on.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.coalesced = 0
+        self._inflight: dict[str, asyncio.Task] = {}
+
+    def __len__(self) -> int:
+        return len(self._inflight)
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> tuple[Any, bool]:
+        """Return ``(result, shared)``; ``shared`` is True for callers that joined."""
+        task = self._inflight.get(key)
+        shared = task is not None
+        if shared:
+            self.coalesced += 1
+            logger.info("🔗 Joined in-flight %s (%s…)", self.name, key[:12])
+        else:
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._finish(key, t))
+        return await asyncio.shield(task), shared
+
+    def _finish(self, key: str, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            task.exception()  # mark retrieved even if every waiter went away
@@ -0,0 +1,141 @@
+"""A small executor for pipelines expressed as a graph of stages.
+
+Each ``Stage`` names the stages it depends on. A stage starts on the thread
+pool as soon as all of its dependencies have finished, so independent stages
+run at the same time. Every stage gets the results so far (a dict keyed by
+stage name) and runs in a copy of the caller's context, which carries the
+request id and the deadline from utils.deadline.
+
+When the deadline passes, stages with a ``fallback`` (a cheap, local way to
+get a usable result) that have not finished use it, and their dependents
+carry on from there. Stages without one still run: local work completes, and
+their model calls raise DeadlineExceeded (see utils.deadline), which fails
+the run. Threads cannot be interrupted, so a stage that misses the deadline
+is abandoned and finishes in the background; it must not mutate shared inputs.
+
+A ``short_circuit`` stage ends the run early when it returns anything other
+than None (e.g. a stored result for a duplicate upload).
+"""
+import contextvars
+import time
+from concurrent.futures import FIRST_COMPLETED, Executor, wait
+from dataclasses import dataclass, field
+from typing import Any, Callable, Optional
+
+from utils.deadline import DeadlineExceeded, expired, remaining
+from utils.logger import get_logger
+from utils.profiling import traced
+
+logger = get_logger(__name__)
+
+
+@dataclass
+class Stage:
+    name: str
+    fn: Callable[[dict], Any]
+    deps: tuple[str, ...] = ()
+    fallback: Optional[Callable[[dict], Any]] = None
+    short_circuit: bool = False
+
+
+@dataclass
+class GraphRun:
+    results: dict = field(default_factory=dict)
+    timings: dict = field(default_factory=dict)       # stage name -> seconds
+    fell_back: list = field(default_factory=list)     # stages that used their fallback
+    stopped_by: Optional[str] = None                  # short-circuit stage that ended the run
+
+    @property
+    def result(self) -> Any:
+        """The short-circuit result, if a stage ended the run early."""
+        return self.results[self.stopped_by] if self.stopped_by else None
+
+
+class StageGraph:
+    def __init__(self, stages: list[Stage]):
+        names = set()
+        for stage in stages:
+            if stage.name in names:
+                raise ValueError(f"Duplicate stage '{stage.name}'")
+            # Dependencies must come earlier in the list, which rules out cycles
+            missing = [d for d in stage.deps if d not in names]
+            if missing:
+                raise ValueError(f"Stage '{stage.name}' depends on unknown or later stages {missing}")
+            names.add(stage.name)
+        self.stages = stages
+
+    def run(self, executor: Executor) -> GraphRun:
+        """Run every stage on ``executor``; blocks until done, the deadline, or a short circuit.
+
+        The first stage error is re-raised, unless a short-circuit stage still
+        in flight ends the run instead.
+        """
+        run = GraphRun()
+        pending = list(self.stages)
+        running: dict = {}         # future -> (stage, start)
+        error: Optional[BaseException] = None
+
+        def finish(stage: Stage, value: Any, began: float) -> None:
+            run.results[stage.name] = value
+            run.timings[stage.name] = round(time.monotonic() - began, 3)
+            logger.info("Stage %s done in %.3fs", stage.name, run.timings[stage.name], extra={"step": stage.name})
+            if stage.short_circuit and value is not None and run.stopped_by is None:
+                run.stopped_by = stage.name
+
+        def fall_back(stage: Stage, began: float) -> None:
+            nonlocal error
+            if stage.fallback is None:
+                error = error or DeadlineExceeded(f"Time budget ran out before stage '{stage.name}'")
+                return
+            logger.warning("⏱️ Deadline reached, stage '%s' falls back", stage.name)
+            run.fell_back.append(stage.name)
+            try:
+                finish(stage, stage.fallback(run.results), began)
+            except Exception as e:
+                error = error or e
+
+        while (pending or running) and error is None and run.stopped_by is None:
+            for stage in [s for s in pending if all(d in run.results for d in s.deps)]:
+                pending.remove(stage)
+                if expired() and stage.fallback is not None:
+                    fall_back(stage, time.monotonic())
+                    continue
+                future = executor.submit(contextvars.copy_context().run, traced(stage.name, stage.fn), run.results)
+                running[future] = (stage, time.monotonic())
+            if not running:
+                continue
+
+            # Only stages with a fallback stop being waited for at the deadline
+            left = remaining()
+            timeout = None
+            if left is not None and any(stage.fallback for stage, _ in running.values()):
+                timeout = max(left, 0)
+            done, _ = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                for future, (stage, began) in list(running.items()):
+                    if stage.fallback is not None:
+                        del running[future]
+                        fall_back(stage, began)
+                continue
+            for future in done:
+                stage, began = running.pop(future)
+                try:
+                    finish(stage, future.result(), began)
+                except DeadlineExceeded:
+                    fall_back(stage, began)
+                except Exception as e:
+                    error = error or e
+
+        if error is not None:
+            # A short circuit still in flight (the duplicate lookup) outranks the error
+            for future, (stage, began) in running.items():
+                if stage.short_circuit:
+                    try:
+                        finish(stage, future.result(timeout=remaining()), began)
+                    except Exception:
+                        pass
+            if run.stopped_by is None:
+                raise error
+        for future in running:
+            future.cancel()        # drops queued stages; ones already running are abandoned
+        return run
@@ -0,0 +1,58 @@
+"""Locate printed text lines in a receipt image, to crop single lines for re-reading.
+
+Dark pixels are separated from the paper with Otsu's threshold and projected
+onto the vertical axis; each run of inked rows is one text line. The model's
+raw text lists the same lines top to bottom, so line ``i`` of that text is
+normally the ``i``-th run. When the counts differ (a logo, a faint line), the
+line is placed proportionally and its neighbours are cropped with it.
+
+numpy is imported on first use, never at API import time.
+"""
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Optional
+
+if TYPE_CHECKING:
+    from PIL import Image
+
+MIN_ROW_INK = 0.003          # share of a pixel row that must be ink to belong to a line
+MAX_GAP = 2                  # px; runs closer than this are one line (dots, accents)
+MIN_LINE_HEIGHT = 1          # px; dashed separators are thin but still lines
+PAD = 0.35                   # padding above and below a band, as a share of the line height
+MIN_CROP_HEIGHT = 64         # px; shorter crops are upscaled so small print stays legible
+MAX_CROP_WIDTH = 1024        # px; wider crops are shrunk to two 512px high-detail vision tiles
+
+
+def find_text_rows(image: Image.Image) -> list[tuple[int, int]]:
+    """(top, bottom) pixel rows of each text line, top to bottom; [] for a flat image."""
+    import numpy as np
+
+    from utils.image_quality import true_runs
+    from utils.receipt_roi import MIN_RANGE, otsu_threshold
+
+    gray = np.asarray(image.convert("L"), dtype=np.uint8)
+    if int(gray.max()) - int(gray.min()) < MIN_RANGE:
+        return []
+    ink = gray < otsu_threshold(gray)
+    starts, ends = true_runs(ink.mean(axis=1) > MIN_ROW_INK)
+    rows: list[tuple[int, int]] = []
+    for top, bottom in zip(starts.tolist(), ends.tolist()):
+        if rows and top - rows[-1][1] < MAX_GAP:
+            rows[-1] = (rows[-1][0], bottom)
+        else:
+            rows.append((top, bottom))
+    return [(top, bottom) for top, bottom in rows if bottom - top >= MIN_LINE_HEIGHT]
+
+
+def line_band(rows: list[tuple[int, int]], line: int, line_count: int, height: int) -> Optional[tuple[int, int]]:
+    """Padded (top, bottom) pixel band holding text line ``line`` of ``line_count``."""
+    if not rows or not 0 <= line < line_count:
+        return None
+    if len(rows) == line_count:
+        first = last = line
+    else:
+        centre = round(line * (len(rows) - 1) / max(line_count - 1, 1))
+        first, last = max(centre - 1, 0), min(centre + 1, len(rows) - 1)
+    top, bottom = rows[first][0], rows[last][1]
+    pad = round(PAD * max(bottom - top, 1) / (last - first + 1))
+    return max(top - pad, 0), min(bottom + pad, height)
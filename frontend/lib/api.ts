@@ -50,6 +50,14 @@ export async function categorizeItem(name: string): Promise<string> {
   return data.category;
 }
 
+export async function categorizeItems(names: string[]): Promise<Record<string, string>> {
+  const { data } = await client.post<{ items: { name: string; category: string }[] }>(
+    "/api/categorize-item",
+    { names }
+  );
+  return Object.fromEntries(data.items.map((i) => [i.name, i.category]));
+}
+
 export async function fetchCategories(): Promise<Record<string, string[]>> {
   const { data } = await client.get("/api/categories");
   return data;
@@ -42,6 +42,7 @@ export interface LLMInsight {
   recommendations: string[];
   budget_tips: string[];
   savings_potential: string;
+  source?: "llm" | "local" | "fallback";
 }
 
 export interface AnalysisResult {
@@ -49,6 +50,9 @@ export interface AnalysisResult {
   spending_analysis: SpendingAnalysis;
   llm_insight: LLMInsight;
   processed_at: string;
+  id?: string;
+  image_hash?: string;
+  duplicate_of?: string; // set when the upload matched a receipt already in history
 }
 
 export interface AnalyzeResponse {